@@ -0,0 +1,405 @@
+import time
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from CRAWL_SCHEDULER import MAX_RETRIES
+from HTTP_CACHE import storable
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 32  # requests in flight across all hosts
+DEFAULT_PER_HOST = 6  # connections per host
+DEFAULT_TIMEOUT_S = 20.0  # whole request, including reading the body
+CONNECT_TIMEOUT_S = 8.0
+MAX_BODY_BYTES = 5 * 1024 * 1024  # bodies are streamed and cut off here
+CHUNK_SIZE = 64 * 1024
+PAGE_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "")
+USER_AGENT = "Mozilla/5.0 (compatible; GEORGE-crawler/1.0)"
+
+
+class CrawlEngine:
+    """
+    Fetches many pages concurrently with aiohttp.
+
+    A semaphore bounds the requests in flight; the connector additionally caps connections per
+    host. Bodies are streamed in chunks and cut off at max_bytes, and only HTML/text responses
+    are read at all (an image or a video linked from a page costs a HEAD-sized request, not a
+    download). Every request has a connect and a total timeout.
+
+    With a scheduler (a CRAWL_SCHEDULER.HostScheduler) requests additionally honor robots.txt
+    and are paced per host, and 429/503 responses are retried after the host's backoff. With a
+    cache (an HTTP_CACHE.HttpCache) fresh pages are served from disk without a request, stale
+    ones are revalidated with their ETag/Last-Modified, and complete 200 pages are stored.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST,
+                 timeout_s: float = DEFAULT_TIMEOUT_S, max_bytes: int = MAX_BODY_BYTES, scheduler=None, cache=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.scheduler = scheduler
+        self.cache = cache
+        self.timeout = aiohttp.ClientTimeout(total=timeout_s, connect=CONNECT_TIMEOUT_S)
+        self.max_bytes = max_bytes
+        self.counters = {"fetched": 0, "errors": 0, "bytes": 0, "skipped_content": 0}
+
+    def open_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300)
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers={"User-Agent": USER_AGENT})
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+        """
+        Fetches one page; never raises for network errors.
+
+        Returns:
+            dict: url, final_url (after redirects), status, content_type, charset (from the header, if any), body (bytes), bytes, truncated,
+            elapsed_s, retry_after (seconds, from a 429/503 response), cache ("hit", "revalidated",
+            "stored" or None) and error (None on success).
+        """
+        start = time.perf_counter()
+        result = new_result(url)
+        stale = self.cache.lookup(url) if self.cache is not None else None
+        try:
+            headers = self.cache.conditional_headers(stale) if self.cache is not None else None
+            async with session.get(url, allow_redirects=True, headers=headers) as response:
+                result["final_url"] = str(response.url)
+                result["status"] = response.status
+                if response.status in (429, 503):
+                    result["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
+                result["content_type"] = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                result["charset"] = response.charset
+                if response.status == 304 and stale is not None:
+                    result = cached_result(url, self.cache.revalidated(url, stale, response.headers), "revalidated")
+                elif result["content_type"] not in PAGE_CONTENT_TYPES:
+                    self.counters["skipped_content"] += 1
+                else:
+                    chunks = []
+                    size = 0
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        chunks.append(chunk)
+                        size += len(chunk)
+                        if size >= self.max_bytes:
+                            result["truncated"] = True
+                            break
+                    result["body"] = b"".join(chunks)[:self.max_bytes]
+                    result["bytes"] = len(result["body"])
+                    self.counters["bytes"] += size
+                    if self.cache is not None:
+                        self.cache.miss()
+                        if storable(response.status, response.headers) and not result["truncated"]:
+                            self.cache.store(url, response.headers, [result["body"]], final_url=result["final_url"],
+                                             content_type=result["content_type"], charset=result["charset"])
+                            result["cache"] = "stored"
+            self.counters["fetched"] += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            result["error"] = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            self.counters["errors"] += 1
+        result["elapsed_s"] = time.perf_counter() - start
+        return result
+
+    async def fetch_scheduled(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, url: str) -> Dict[str, Any]:
+        """
+        Fetches one page within the global `semaphore` and, with a scheduler, after its robots.txt
+        check and its host's turn. Waiting for the host does not take a global slot. Fresh cached
+        pages are returned right away.
+        """
+        if self.cache is not None:
+            entry = self.cache.fresh_entry(url)
+            if entry is not None:
+                return cached_result(url, entry, "hit")
+        if self.scheduler is None:
+            async with semaphore:
+                return await self.fetch(session, url)
+        if not await self.scheduler.allowed(session, url):
+            result = new_result(url)
+            result["error"] = "Disallowed by robots.txt"
+            return result
+        host = self.scheduler.host(url)
+        async with host.slots:
+            retries = 0
+            while True:
+                await self.scheduler.wait_turn(host)
+                async with semaphore:
+                    result = await self.fetch(session, url)
+                if not self.scheduler.observe(host, result) or retries >= MAX_RETRIES:
+                    return result
+                retries += 1
+                self.scheduler.counters["retries"] += 1
+
+    async def fetch_all_async(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Fetches all urls (at most `concurrency` at a time) and returns the results in the same order."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        if self.scheduler is not None:
+            self.scheduler.reset_loop()
+        async with self.open_session() as session:
+            return await asyncio.gather(*(self.fetch_scheduled(session, semaphore, url) for url in urls))
+
+    async def fetch_and_parse_stream(self, urls: List[str], parser,
+                                     buffer: Optional[int] = None) -> AsyncIterator[Tuple[Dict[str, Any], Optional[Any]]]:
+        """
+        Two stage pipeline: fetched pages go through a bounded queue to the parse stage
+        (parser.parse, a CRAWL_PARSER.ParsePool), so parsing overlaps fetching and a slow parse
+        stage holds the fetchers back instead of piling up bodies. Bodies are dropped once parsed.
+
+        Yields (fetch result, parse result or None if the fetch or parse failed) as pages finish.
+        At most `buffer` parsed pages wait for the consumer; beyond that the stages pause, and at
+        most 2 * concurrency pages are admitted into the pipeline at any time. Closing the
+        generator early (break, aclose) cancels the pages still in flight.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        admitted = asyncio.Semaphore(self.concurrency * 2)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        out: asyncio.Queue = asyncio.Queue(maxsize=buffer or self.concurrency)
+        failure: List[BaseException] = []
+        parser.reset_loop()
+        if self.scheduler is not None:
+            self.scheduler.reset_loop()
+
+        async with self.open_session() as session:
+            async def fetch_stage(url: str):
+                async with admitted:  # released once the parse stage has handed the page on
+                    page = await self.fetch_scheduled(session, semaphore, url)
+                    done = asyncio.get_running_loop().create_future()
+                    await queue.put((page, done))  # waits while the parse stage is behind
+                    await done
+
+            async def parse_stage():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    page, done = item
+                    parsed = None
+                    if not page["error"]:
+                        try:
+                            parsed = await parser.parse(page)
+                        except Exception as e:
+                            page["error"] = f"Parse failed: {type(e).__name__}: {e}"
+                    page["body"] = b""
+                    await out.put((page, parsed))  # waits while the consumer is behind
+                    done.set_result(None)
+
+            async def run():
+                parsers = [asyncio.create_task(parse_stage()) for _ in range(parser.max_pending)]
+                try:
+                    await asyncio.gather(*(fetch_stage(url) for url in urls))
+                    for _ in parsers:
+                        await queue.put(None)
+                    await asyncio.gather(*parsers)
+                except Exception as e:
+                    failure.append(e)
+                finally:
+                    for task in parsers:
+                        task.cancel()
+                await out.put(None)
+
+            producer = asyncio.create_task(run())
+            try:
+                while True:
+                    item = await out.get()
+                    if item is None:
+                        break
+                    yield item
+                if failure:
+                    raise failure[0]
+            finally:
+                if not producer.done():
+                    producer.cancel()
+                    try:
+                        await producer
+                    except asyncio.CancelledError:
+                        pass
+
+    async def fetch_and_parse_async(self, urls: List[str], parser) -> Dict[str, Tuple[Dict[str, Any], Optional[Any]]]:
+        """
+        All pages of fetch_and_parse_stream at once.
+
+        Returns:
+            dict: {url: (fetch result, parse result or None if the fetch or parse failed)}
+        """
+        return {page["url"]: (page, parsed) async for page, parsed in self.fetch_and_parse_stream(urls, parser)}
+
+    def fetch_all(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Synchronous wrapper for tools; runs the event loop in a helper thread if one is already running."""
+        if not urls:
+            return []
+        return run_sync(lambda: self.fetch_all_async(urls))
+
+    def fetch_and_parse_all(self, urls: List[str], parser) -> Dict[str, Tuple[Dict[str, Any], Optional[Any]]]:
+        """Synchronous wrapper of fetch_and_parse_async."""
+        if not urls:
+            return {}
+        return run_sync(lambda: self.fetch_and_parse_async(urls, parser))
+
+
+def new_result(url: str) -> Dict[str, Any]:
+    return {"url": url, "final_url": url, "status": None, "content_type": "", "charset": None, "body": b"",
+            "bytes": 0, "truncated": False, "elapsed_s": 0.0, "retry_after": None, "cache": None, "error": None}
+
+
+def cached_result(url: str, entry: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """A fetch result for a page served from the HTTP cache."""
+    with open(entry["path"], "rb") as f:
+        body = f.read()
+    result = new_result(url)
+    result.update({"final_url": entry["final_url"], "status": 200, "content_type": entry["content_type"],
+                   "charset": entry["charset"], "body": body, "bytes": len(body), "cache": source})
+    return result
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or an HTTP date), None if missing or invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def run_sync(make_coroutine):
+    """Runs a coroutine to completion from sync code, in a helper thread if an event loop is already running."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(make_coroutine())
+    results = []
+    thread = threading.Thread(target=lambda: results.append(asyncio.run(make_coroutine())))
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+def serve_synthetic_site(pages: int = 500, links_per_page: int = 10, latency_s: float = 0.02,
+                         images_per_page: int = 3, filler_bytes: int = 2000,
+                         robots_txt: Optional[str] = None, rate_limit_per_s: Optional[float] = None,
+                         validators: bool = False, max_age_s: Optional[int] = None):
+    """
+    Starts a local threaded http.server with a synthetic site for benchmarks: /p/<n> links to
+    pages n*links_per_page+1.. (a tree, absolute links) plus relative links back near the root,
+    and each response is delayed by latency_s to stand in for network round trips.
+
+    robots_txt is served as /robots.txt (404 otherwise); with rate_limit_per_s, page requests
+    beyond that many in the last second get a 429 with "Retry-After: 1". validators adds an ETag
+    and Last-Modified to pages and answers a matching If-None-Match with 304; max_age_s sends
+    "Cache-Control: max-age=...".
+
+    Returns:
+        tuple: (server, base_url, fetch_counts); fetch_counts maps a path to how often it was served.
+        server.request_times holds the time.monotonic() of every page request.
+    """
+    import sys
+    import hashlib
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    fetch_counts: Dict[str, int] = {}
+    counts_lock = threading.Lock()
+    request_times: List[float] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like real servers
+        disable_nagle_algorithm = True
+
+        def send_empty(self, status: int, headers: Tuple[Tuple[str, str], ...] = ()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_GET(self):
+            if self.path == "/robots.txt":
+                if robots_txt is None:
+                    return self.send_empty(404)
+                body = robots_txt.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            with counts_lock:
+                fetch_counts[self.path] = fetch_counts.get(self.path, 0) + 1
+                now = time.monotonic()
+                request_times.append(now)
+                limited = rate_limit_per_s is not None and sum(1 for t in request_times[-int(rate_limit_per_s) - 1:]
+                                                               if now - t < 1.0) > rate_limit_per_s
+            if limited:
+                return self.send_empty(429, (("Retry-After", "1"),))
+            time.sleep(latency_s)
+            try:
+                n = int(self.path.rstrip("/").rsplit("/", 1)[-1])
+            except ValueError:
+                return self.send_empty(404)
+            children = [n * links_per_page + i for i in range(1, links_per_page + 1) if n * links_per_page + i < pages]
+            links = "".join(f'<li><a href="http://{self.headers["Host"]}/p/{child}">page {child}</a></li>' for child in children)
+            links += f'<li><a href="/p/{n // 2}">up</a></li><li><a href="/p/0#top">home</a></li>'
+            images = "".join(f'<img src="/img/{n}-{i}.png" alt="image {i} of page {n}">' for i in range(images_per_page))
+            body = (f"<html><head><title>Page {n}</title></head><body><h1>Page {n}</h1>"
+                    f"<p>{'lorem ipsum ' * (filler_bytes // 12)}</p><ul>{links}</ul>{images}</body></html>").encode()
+            headers = []
+            if validators:
+                etag = f'"{hashlib.md5(body).hexdigest()[:16]}"'
+                headers += [("ETag", etag), ("Last-Modified", "Mon, 05 Jan 2026 10:00:00 GMT")]
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send_empty(304, tuple(headers))
+            if max_age_s is not None:
+                headers.append(("Cache-Control", f"max-age={max_age_s}"))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 256
+
+        def handle_error(self, request, client_address):
+            if not isinstance(sys.exc_info()[1], ConnectionError):  # clients closing early is expected
+                super().handle_error(request, client_address)
+
+    server = Server(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.request_times = request_times
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", fetch_counts
+
+
+def main():
+    """Pages/sec against the local synthetic site (20 ms per response) at growing concurrency."""
+    import requests
+
+    server, base_url, _ = serve_synthetic_site(pages=400, latency_s=0.02)
+    urls = [f"{base_url}/p/{n}" for n in range(400)]
+    try:
+        t0 = time.perf_counter()
+        for url in urls[:50]:
+            requests.get(url)
+        print(f"requests.get one at a time: {50 / (time.perf_counter() - t0):.0f} pages/s")
+
+        for concurrency in (1, 4, 16, 64):
+            engine = CrawlEngine(concurrency=concurrency, per_host=concurrency)
+            t0 = time.perf_counter()
+            results = engine.fetch_all(urls)
+            elapsed = time.perf_counter() - t0
+            ok = sum(1 for result in results if result["status"] == 200)
+            print(f"concurrency {concurrency:3d}: {len(urls) / elapsed:5.0f} pages/s ({ok}/{len(urls)} ok)")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+import os
+import math
+import heapq
+import sqlite3
+import hashlib
+import logging
+import tempfile
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urljoin, urlsplit, urlunsplit
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "yclid", "dclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "ref_src"}
+TRACKING_PREFIXES = ("utm_",)
+
+BLOOM_INITIAL_CAPACITY = 100_000
+BLOOM_ERROR_RATE = 0.001  # false positives only cost a lookup in the exact set
+BLOOM_GROWTH = 2  # each new filter holds twice as many URLs as the previous one
+BLOOM_TIGHTENING = 0.5  # ...with half the error rate, so the total stays below 2x BLOOM_ERROR_RATE
+SEEN_COMMIT_EVERY = 5000  # new URLs buffered before they are written to the exact set
+
+
+def canonicalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    The canonical form of a URL, so variants of one page dedupe to one entry.
+
+    Lower-cases scheme and host, drops default ports, fragments, tracking parameters
+    (utm_*, gclid, fbclid, ...) and trailing slashes (except the root), resolves "." and ".."
+    path segments, sorts the query and normalizes percent-encoding.
+
+    Returns:
+        str or None: The canonical URL, or None if it is not an http(s) URL.
+    """
+    url = url.strip()
+    if base is not None:
+        url = urljoin(base, url)
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower().rstrip(".")
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    if parts.username:
+        host = f"{parts.username}@{host}"
+
+    segments: List[str] = []
+    for segment in parts.path.split("/"):
+        if segment == "..":
+            if segments:
+                segments.pop()
+        elif segment not in ("", "."):
+            segments.append(quote(unquote(segment), safe="!$&'()*+,;=:@~-._"))
+    path = "/" + "/".join(segments)
+
+    query_items = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)]
+    query = urlencode(sorted(query_items))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def url_host(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+def url_digest(url: str) -> bytes:
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Fixed size Bloom filter over 128 bit digests (double hashing of the two 64 bit halves)."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+    def add(self, digest: bytes):
+        bits = self.bits
+        for p in self._positions(digest):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows: when the current filter is full a larger one with a tighter error
+    rate is added, so memory follows the number of URLs instead of being sized up front.
+    """
+
+    def __init__(self, initial_capacity: int = BLOOM_INITIAL_CAPACITY, error_rate: float = BLOOM_ERROR_RATE):
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - BLOOM_TIGHTENING))]
+
+    def __contains__(self, digest: bytes) -> bool:
+        return any(digest in f for f in self.filters)
+
+    def add(self, digest: bytes):
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            current = BloomFilter(current.capacity * BLOOM_GROWTH, current.error_rate * BLOOM_TIGHTENING)
+            self.filters.append(current)
+        current.add(digest)
+
+    def __len__(self) -> int:
+        return sum(f.count for f in self.filters)
+
+    def nbytes(self) -> int:
+        return sum(len(f.bits) for f in self.filters)
+
+
+class SeenSet:
+    """
+    Exact set of URL digests in SQLite, consulted only when the Bloom filter says "maybe seen".
+    New digests are buffered in memory and written in batches (with autoflush=False only when the
+    owner calls flush(), so they reach the disk in the same transaction as the owner's state).
+    """
+
+    def __init__(self, db_path: str, autoflush: bool = True):
+        self.db_path = db_path
+        self.autoflush = autoflush
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.pending: set = set()
+        self.lookups = 0
+
+    def __contains__(self, digest: bytes) -> bool:
+        if digest in self.pending:
+            return True
+        self.lookups += 1
+        return self.conn.execute("SELECT 1 FROM seen WHERE digest = ?", (digest,)).fetchone() is not None
+
+    def add(self, digest: bytes):
+        self.pending.add(digest)
+        if self.autoflush and len(self.pending) >= SEEN_COMMIT_EVERY:
+            self.flush()
+
+    def write_pending(self):
+        """Inserts the buffered digests into the current transaction (the caller commits)."""
+        if self.pending:
+            self.conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((d,) for d in self.pending))
+            self.pending.clear()
+
+    def flush(self):
+        with self.conn:
+            self.write_pending()
+
+    def digests(self):
+        """Every digest in the set (used to rebuild the Bloom filter of a reopened frontier)."""
+        self.flush()
+        for (digest,) in self.conn.execute("SELECT digest FROM seen"):
+            yield digest
+
+    def close(self):
+        if self.autoflush:
+            self.flush()  # without autoflush, unsaved digests belong to an unsaved state and are dropped
+        self.conn.close()
+
+
+class CrawlFrontier:
+    """
+    The crawler's set of seen URLs and queue of URLs to fetch.
+
+    URLs are canonicalized once on add(). Seen checks go to a scalable Bloom filter first; only a
+    "maybe" is confirmed against the exact on-disk set, so memory stays at a few bytes per URL.
+    Queued URLs wait in one priority queue per host (shallower depth first, then discovery
+    order), and pop_layer() interleaves hosts so consecutive fetches spread over servers.
+
+    With durable=True the queue is kept in the database as well and nothing is written until
+    save(): the seen set and the queue on disk then always match each other, and a reopened
+    frontier continues with the URLs that were queued but not yet completed.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, durable: bool = False):
+        self.temporary = db_path is None
+        if db_path is None:
+            fd, db_path = tempfile.mkstemp(prefix="crawl_seen_", suffix=".db")
+            os.close(fd)
+        self.durable = durable
+        self.bloom = ScalableBloomFilter()
+        self.seen = SeenSet(db_path, autoflush=not durable)
+        if not self.temporary:
+            for digest in self.seen.digests():
+                self.bloom.add(digest)
+        self.queues: Dict[str, List[Tuple[int, int, str, Optional[str]]]] = {}
+        self.hosts: deque = deque()  # hosts with queued URLs, in round-robin order
+        self.sequence = 0
+        self.queued = 0
+        self.unsaved_pushes: List[Tuple[str, int, Optional[str], int]] = []
+        self.counters = {"added": 0, "duplicates": 0, "bloom_false_positives": 0, "rejected": 0}
+        if durable:
+            self.seen.conn.execute("CREATE TABLE IF NOT EXISTS queue (url TEXT PRIMARY KEY, depth INTEGER, parent TEXT, "
+                                   "sequence INTEGER)")
+            for url, depth, parent, sequence in self.seen.conn.execute(
+                    "SELECT url, depth, parent, sequence FROM queue ORDER BY sequence"):
+                self.sequence = sequence - 1
+                self._push(url, depth, parent)
+
+    def is_seen(self, url: str) -> bool:
+        digest = url_digest(url)
+        return digest in self.bloom and digest in self.seen
+
+    def add(self, url: str, depth: int, parent: Optional[str] = None, enqueue: bool = True) -> Optional[str]:
+        """
+        Records a URL and queues it at the given depth if it has not been seen.
+
+        Args:
+            url (str): Absolute URL as found.
+            depth (int): Depth it would be fetched at.
+            parent (str): The page it was found on.
+            enqueue (bool): False only records it (links found on the last layer are not fetched).
+
+        Returns:
+            str or None: The canonical URL if it is new, None for duplicates and non-http URLs.
+        """
+        canonical = canonicalize_url(url)
+        if canonical is None:
+            self.counters["rejected"] += 1
+            return None
+        digest = url_digest(canonical)
+        if digest in self.bloom:
+            if digest in self.seen:
+                self.counters["duplicates"] += 1
+                return None
+            self.counters["bloom_false_positives"] += 1
+        self.bloom.add(digest)
+        self.seen.add(digest)
+        self.counters["added"] += 1
+        if enqueue:
+            self.push(canonical, depth, parent)
+        return canonical
+
+    def mark_seen(self, url: str):
+        """Records a URL (for example a redirect target) without queueing it."""
+        self.add(url, 0, enqueue=False)
+
+    def push(self, url: str, depth: int, parent: Optional[str] = None):
+        self._push(url, depth, parent)
+        if self.durable:
+            self.unsaved_pushes.append((url, depth, parent, self.sequence))
+
+    def _push(self, url: str, depth: int, parent: Optional[str]):
+        host = url_host(url)
+        queue = self.queues.get(host)
+        if queue is None:
+            queue = self.queues[host] = []
+            self.hosts.append(host)
+        self.sequence += 1
+        heapq.heappush(queue, (depth, self.sequence, url, parent))
+        self.queued += 1
+
+    def pop_layer(self, depth: int) -> List[Tuple[str, Optional[str]]]:
+        """Takes every queued URL of a depth (or shallower), one host after the other: [(url, parent)]."""
+        layer = []
+        while self.hosts:
+            host = self.hosts.popleft()
+            queue = self.queues[host]
+            if not queue or queue[0][0] > depth:
+                continue  # nothing left for this layer; back in the rotation below if it has deeper URLs
+            _, _, url, parent = heapq.heappop(queue)
+            self.queued -= 1
+            layer.append((url, parent))
+            self.hosts.append(host)
+        # hosts that still have deeper URLs go back into the rotation
+        self.queues = {host: queue for host, queue in self.queues.items() if queue}
+        self.hosts.extend(self.queues)
+        return layer
+
+    def save(self, completed: Iterable[str] = (), write: Optional[Callable[[sqlite3.Connection], None]] = None):
+        """
+        Durable frontier: writes the new seen URLs and queue entries and removes the `completed`
+        URLs from the queue on disk, all in one transaction. `write` adds the owner's own
+        statements (e.g. the completed pages) to that transaction.
+        """
+        with self.seen.conn as conn:
+            self.seen.write_pending()
+            conn.executemany("INSERT OR REPLACE INTO queue VALUES (?, ?, ?, ?)", self.unsaved_pushes)
+            conn.executemany("DELETE FROM queue WHERE url = ?", ((url,) for url in completed))
+            if write is not None:
+                write(conn)
+        self.unsaved_pushes.clear()
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Bytes held in memory for the seen set (Bloom filter) and the queues."""
+        seen = len(self.bloom)
+        bloom_bytes = self.bloom.nbytes()
+        queue_bytes = self.queued * 200  # rough: tuple + canonical URL string
+        return {
+            "seen_urls": seen,
+            "queued_urls": self.queued,
+            "hosts": len(self.queues),
+            "bloom_filters": len(self.bloom.filters),
+            "bloom_bytes": bloom_bytes,
+            "bloom_bytes_per_million_urls": round(bloom_bytes / seen * 1_000_000) if seen else 0,
+            "queue_bytes_estimate": queue_bytes,
+            "exact_set_lookups": self.seen.lookups,
+            "exact_set_path": self.seen.db_path,
+            **self.counters,
+        }
+
+    def close(self):
+        self.seen.close()
+        if self.temporary:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.seen.db_path + suffix)
+                except OSError:
+                    pass
+
+
+def main():
+    """Memory per million URLs against a Python set of URL strings, and canonicalization examples."""
+    import sys
+    import time
+
+    for url in ("HTTP://Example.com:80/a/b/../c/?utm_source=x&b=2&a=1#frag",
+                "https://example.com:443/shop/", "https://example.com/shop?fbclid=123", "https://example.com/%7Euser"):
+        print(f"{url} -> {canonicalize_url(url)}")
+
+    n = 1_000_000
+    urls = [f"https://host{i % 500}.example.com/section/{i // 500}/page-{i}.html?id={i}" for i in range(n)]
+
+    t0 = time.perf_counter()
+    plain = set(urls)
+    plain_bytes = sys.getsizeof(plain) + sum(sys.getsizeof(url) for url in urls)
+    print(f"Python set: {plain_bytes / 1e6:.0f} MB per million URLs, built in {time.perf_counter() - t0:.1f} s")
+    del plain
+
+    frontier = CrawlFrontier()
+    try:
+        t0 = time.perf_counter()
+        for url in urls:
+            frontier.add(url, depth=1, enqueue=False)
+        added = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for url in urls[:100_000]:
+            frontier.add(url, depth=1, enqueue=False)
+        dup = time.perf_counter() - t0
+        report = frontier.memory_report()
+        print(f"Frontier: {report['bloom_bytes'] / 1e6:.1f} MB Bloom filter per million URLs "
+              f"({report['bloom_filters']} filters), {added / n * 1e6:.1f} us/new URL, {dup / 100_000 * 1e6:.1f} us/duplicate")
+        print(f"False positives confirmed on disk: {report['bloom_false_positives']}, duplicates: {report['duplicates']}")
+    finally:
+        frontier.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import re
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+
+from LINK_EXTRACTOR import extract_links_and_images
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpeg", ".jpg", ".gif", ".png")
+DEFAULT_WORKERS = max(0, (os.cpu_count() or 1) - 1)  # one core stays with the fetch loop; 0 parses in-process
+
+_worker_pattern: Optional[Pattern] = None  # set in each pool process by _init_worker
+
+
+def compile_excluded(phrases: Iterable[str]) -> Pattern:
+    """
+    All excluded phrases as one regex, matched against the lower-cased link in one scan.
+
+    The phrases are folded into a trie first ("feedback form" and "feedback survey" share
+    "feedback", which alone already excludes them), so at each position the regex tests one
+    branch per first character instead of every phrase.
+    """
+    trie: Dict[str, Any] = {}
+    for phrase in sorted({phrase.lower() for phrase in phrases}, key=len):
+        node = trie
+        for char in phrase:
+            if "" in node:
+                break  # a shorter phrase is a prefix of this one and matches first
+            node = node.setdefault(char, {})
+        else:
+            node.clear()
+            node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != ""]
+        if not branches:
+            return ""
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return re.compile(build(trie) or r"(?!)")  # no phrases: a pattern that never matches
+
+
+def link_allowed(link: str, excluded: Pattern) -> bool:
+    """False for links containing an excluded phrase (case-insensitive) and for links to images."""
+    return not excluded.search(link.lower()) and not link.endswith(IMAGE_EXTENSIONS)
+
+
+def parse_page(body: bytes, page_url: str, charset: Optional[str], excluded: Optional[Pattern] = None) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Links (filtered) and images of a page; runs in the pool processes."""
+    excluded = excluded if excluded is not None else _worker_pattern
+    links, images = extract_links_and_images(body, page_url, charset)
+    return [link for link in links if link_allowed(link, excluded)], images
+
+
+def _init_worker(pattern: Pattern):
+    global _worker_pattern
+    _worker_pattern = pattern
+
+
+class ParsePool:
+    """
+    The crawler's parse stage: link/image extraction and link filtering in worker processes, so
+    it runs on other cores than the fetch loop instead of serializing on the GIL.
+
+    At most `max_pending` pages are handed to the pool at once; callers awaiting parse() beyond
+    that wait, which in turn holds back the fetch stage. With workers=0 pages are parsed in the
+    calling process (the default on a single core machine).
+    """
+
+    def __init__(self, excluded_phrases: Iterable[str], workers: int = DEFAULT_WORKERS, max_pending: Optional[int] = None):
+        self.excluded = compile_excluded(excluded_phrases)
+        self.workers = workers
+        self.max_pending = max_pending or max(2, workers * 2)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.parsed = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.excluded,))
+        return self.executor
+
+    def parse_local(self, page: Dict[str, Any]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        self.parsed += 1
+        return parse_page(page["body"], page["final_url"], page["charset"], self.excluded)
+
+    async def parse(self, page: Dict[str, Any]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Parses a fetched page (an engine fetch result) in the pool."""
+        if self.workers <= 0:
+            return self.parse_local(page)
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_pending)
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor(), parse_page, page["body"], page["final_url"], page["charset"])
+        self.parsed += 1
+        return result
+
+    def reset_loop(self):
+        """The semaphore belongs to an event loop; call before using the pool from a new one."""
+        self.semaphore = None
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+
+def main():
+    """Link filter speed, and crawl throughput of the fixture site with 0..N parse workers."""
+    import time
+    from CRAWL_ENGINE import CrawlEngine, serve_synthetic_site
+
+    phrases = {"membership", "login", "sign up", "register", "account", "forgot password", "user profile", "checkout",
+               "shopping cart", "payment", "terms of service", "privacy policy", "about us", "contact us", "error",
+               "help", "support", "faq", "careers", "blog", "forum", "community", "newsletter", "subscription",
+               "unsubscribe", "feedback", "feedback form", "feedback survey", "feedback submission", "feedback response"}
+    links = [f"https://shop{i % 7}.example.com/category/{i}/product-{i}?ref=list" for i in range(100_000)]
+    t0 = time.perf_counter()
+    old = [link for link in links if not any(phrase.lower() in link.lower() for phrase in phrases)]
+    old_s = time.perf_counter() - t0
+    excluded = compile_excluded(phrases)
+    t0 = time.perf_counter()
+    new = [link for link in links if link_allowed(link, excluded)]
+    new_s = time.perf_counter() - t0
+    print(f"filter 100k links: phrase loop {old_s * 1000:.0f} ms, single regex {new_s * 1000:.0f} ms (same: {old == new})")
+
+    cores = os.cpu_count() or 1
+    server, base_url, _ = serve_synthetic_site(pages=600, links_per_page=40, latency_s=0.005, filler_bytes=200_000)
+    urls = [f"{base_url}/p/{n}" for n in range(600)]
+    try:
+        for workers in sorted({0, 1, min(2, cores), cores}):
+            pool = ParsePool(phrases, workers=workers)
+            engine = CrawlEngine(concurrency=32, per_host=32)
+            t0 = time.perf_counter()
+            results = engine.fetch_and_parse_all(urls, pool)
+            elapsed = time.perf_counter() - t0
+            pool.close()
+            found = sum(len(parsed[0]) for _, parsed in results.values() if parsed)
+            print(f"{workers} parse workers ({cores} cores): {len(urls) / elapsed:.0f} pages/s, {found} links")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
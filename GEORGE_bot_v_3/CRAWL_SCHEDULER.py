@@ -0,0 +1,220 @@
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ROBOTS_AGENT = "GEORGE-crawler"  # the token robots.txt groups are matched against
+ROBOTS_TTL_S = 24 * 3600  # robots.txt is fetched once per host and day
+ROBOTS_TIMEOUT_S = 10.0
+ROBOTS_MAX_BYTES = 512 * 1024
+MAX_CRAWL_DELAY_S = 30.0  # longer crawl-delays are capped (and logged)
+MIN_DELAY_S = 0.0  # pause between two request starts on a host that asks for nothing
+MAX_DELAY_S = 60.0
+TARGET_CONCURRENCY = 2.0  # requests a host should have in flight on average
+BACKOFF_STATUSES = (429, 503)
+BACKOFF_PAUSE_S = 1.0  # pause after a 429/503 without Retry-After
+BACKOFF_MIN_DELAY_S = 0.05  # after a 429/503 a host gets at most 20 requests per second...
+FLOOR_DECAY = 0.99  # ...and every success lowers that limit by 1% again, to probe the host's rate
+MAX_RETRIES = 2  # 429/503 responses are retried after the backoff this often
+
+
+def origin_of(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class HostState:
+    """Pacing of one host (scheme://host:port): its robots.txt rules and the current delay between requests."""
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self.robots: Optional[RobotFileParser] = None
+        self.robots_fetched = 0.0
+        self.crawl_delay = 0.0  # from robots.txt (crawl-delay or request-rate)
+        self.delay = MIN_DELAY_S  # current pause between request starts, adapted from responses
+        self.floor = 0.0  # lower bound of delay learned from 429/503 responses
+        self.next_start = 0.0  # time.monotonic() at which the next reserved request starts
+        self.blocked_until = 0.0  # after a 429/503 no request starts before this, reserved or not
+        self.requests = 0
+        self.backoffs = 0
+        # Bound to the running event loop, created by HostScheduler.reset_loop
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.robots_lock: Optional[asyncio.Lock] = None
+
+    def report(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "delay_s": round(self.delay, 3), "crawl_delay_s": self.crawl_delay,
+                "floor_s": round(self.floor, 3), "backoffs": self.backoffs}
+
+
+class HostScheduler:
+    """
+    Per-host politeness for the crawl engine.
+
+    Each host's robots.txt is fetched once (cached for ROBOTS_TTL_S) and disallowed URLs are
+    not requested. Request starts on a host are spaced by its delay, which is never below the
+    robots.txt crawl-delay and otherwise follows the host's latency (latency / TARGET_CONCURRENCY,
+    smoothed), so a slow host gets fewer requests in flight. A 429 or 503 pauses the host (for
+    Retry-After, if given) and doubles a floor under its delay, which successes slowly lower
+    again; the request is retried after the pause.
+
+    A request waiting for its host holds no global slot, so other hosts keep the engine busy
+    meanwhile: hosts are interleaved by their own pace rather than by the order of the URLs.
+    """
+
+    def __init__(self, per_host: int = 6, respect_robots: bool = True):
+        self.per_host = per_host
+        self.respect_robots = respect_robots
+        self.hosts: Dict[str, HostState] = {}
+        self.counters = {"robots_fetched": 0, "robots_blocked": 0, "backoffs": 0, "retries": 0, "waited_s": 0.0}
+
+    def host(self, url: str) -> HostState:
+        origin = origin_of(url)
+        state = self.hosts.get(origin)
+        if state is None:
+            state = self.hosts[origin] = HostState(origin)
+            state.slots = asyncio.Semaphore(self.per_host)
+            state.robots_lock = asyncio.Lock()
+        return state
+
+    def reset_loop(self):
+        """Semaphores and locks belong to an event loop; call before using the scheduler from a new one."""
+        for state in self.hosts.values():
+            state.slots = asyncio.Semaphore(self.per_host)
+            state.robots_lock = asyncio.Lock()
+
+    async def _load_robots(self, session: aiohttp.ClientSession, state: HostState):
+        """Fetches and parses the host's robots.txt, following RFC 9309 for missing or failing files."""
+        async with state.robots_lock:
+            if state.robots is not None and time.monotonic() - state.robots_fetched < ROBOTS_TTL_S:
+                return
+            robots = RobotFileParser(f"{state.origin}/robots.txt")
+            try:
+                timeout = aiohttp.ClientTimeout(total=ROBOTS_TIMEOUT_S)
+                async with session.get(robots.url, allow_redirects=True, timeout=timeout) as response:
+                    if response.status >= 500:
+                        robots.disallow_all = True  # unreachable rules: assume everything is off limits
+                    elif response.status >= 400:
+                        robots.allow_all = True  # no robots.txt (also for 401/403, as RFC 9309 says)
+                    else:
+                        text = (await response.content.read(ROBOTS_MAX_BYTES)).decode("utf-8", errors="replace")
+                        robots.parse(text.splitlines())
+                robots.modified()  # RobotFileParser answers nothing before it has a fetch time
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                # The host will most likely fail for the page as well; that error is reported there
+                logger.warning(f"robots.txt of {state.origin} not available ({type(e).__name__}), crawling without it")
+                robots.allow_all = True
+            self.counters["robots_fetched"] += 1
+
+            crawl_delay = robots.crawl_delay(ROBOTS_AGENT)
+            request_rate = robots.request_rate(ROBOTS_AGENT)
+            if crawl_delay is None and request_rate is not None and request_rate.requests:
+                crawl_delay = request_rate.seconds / request_rate.requests
+            crawl_delay = float(crawl_delay or 0.0)
+            if crawl_delay > MAX_CRAWL_DELAY_S:
+                logger.warning(f"{state.origin} asks for a crawl-delay of {crawl_delay} s, using {MAX_CRAWL_DELAY_S} s")
+                crawl_delay = MAX_CRAWL_DELAY_S
+            state.crawl_delay = crawl_delay
+            state.delay = max(state.delay, crawl_delay)
+            state.robots = robots
+            state.robots_fetched = time.monotonic()
+
+    async def allowed(self, session: aiohttp.ClientSession, url: str) -> bool:
+        """False if the host's robots.txt disallows the URL for this crawler."""
+        if not self.respect_robots:
+            return True
+        state = self.host(url)
+        if state.robots is None or time.monotonic() - state.robots_fetched >= ROBOTS_TTL_S:
+            await self._load_robots(session, state)
+        if state.robots.can_fetch(ROBOTS_AGENT, url):
+            return True
+        self.counters["robots_blocked"] += 1
+        return False
+
+    async def wait_turn(self, state: HostState):
+        """Waits until the host's next request may start and reserves that start time."""
+        now = time.monotonic()
+        start = max(now, state.next_start)
+        state.next_start = start + state.delay
+        state.requests += 1
+        if start > now:
+            self.counters["waited_s"] += start - now
+            await asyncio.sleep(start - now)
+        # Starts reserved before a backoff still wait for it to pass
+        while time.monotonic() < state.blocked_until:
+            pause = state.blocked_until - time.monotonic()
+            self.counters["waited_s"] += pause
+            await asyncio.sleep(pause)
+
+    def observe(self, state: HostState, result: Dict[str, Any]) -> bool:
+        """
+        Adapts the host's delay to a finished request.
+
+        Returns:
+            bool: True if the response asks to back off (429/503), i.e. the request should be retried.
+        """
+        if result["status"] in BACKOFF_STATUSES:
+            now = time.monotonic()
+            if now >= state.blocked_until:  # the requests in flight when a host starts refusing all get one; slow down once
+                state.floor = min(max(state.floor * 2, state.delay * 2, BACKOFF_MIN_DELAY_S), MAX_DELAY_S)
+                state.delay = max(state.delay, state.floor)
+                retry_after = result.get("retry_after")
+                pause = retry_after if retry_after is not None else max(state.floor, BACKOFF_PAUSE_S)
+                state.blocked_until = now + min(pause, MAX_DELAY_S)
+                state.next_start = max(state.next_start, state.blocked_until)
+                state.backoffs += 1
+                self.counters["backoffs"] += 1
+            return True
+        if result["error"] or result["status"] is None:
+            return False
+        # Like Scrapy's AutoThrottle: aim for TARGET_CONCURRENCY requests in flight at the observed latency
+        state.floor *= FLOOR_DECAY
+        target = max(result["elapsed_s"] / TARGET_CONCURRENCY, state.floor, state.crawl_delay, MIN_DELAY_S)
+        state.delay = min(max((state.delay + target) / 2, state.floor, state.crawl_delay), MAX_DELAY_S)
+        return False
+
+    def report(self) -> Dict[str, Any]:
+        return {**{key: round(value, 3) if isinstance(value, float) else value for key, value in self.counters.items()},
+                "hosts": {origin: state.report() for origin, state in self.hosts.items()}}
+
+
+def main():
+    """Three local hosts (one with a crawl-delay, one rate limited): unpaced fetching vs the scheduler."""
+    from CRAWL_ENGINE import CrawlEngine, serve_synthetic_site
+
+    sites = [serve_synthetic_site(pages=200, latency_s=0.01),
+             serve_synthetic_site(pages=200, latency_s=0.01, robots_txt="User-agent: *\nCrawl-delay: 1\nDisallow: /p/1\n"),
+             serve_synthetic_site(pages=200, latency_s=0.01, rate_limit_per_s=40)]
+    # 200 pages on the free and the rate limited host, 20 on the one with the crawl-delay (/p/1* are disallowed there)
+    urls = [f"{base_url}/p/{n}" for n in range(200) for index, (_, base_url, _) in enumerate(sites) if index != 1 or n < 20]
+    try:
+        for label, scheduler in (("unpaced", None), ("scheduler", HostScheduler())):
+            engine = CrawlEngine(concurrency=32, per_host=32, scheduler=scheduler)
+            t0 = time.perf_counter()
+            results = engine.fetch_all(urls)
+            elapsed = time.perf_counter() - t0
+            statuses: Dict[Any, int] = {}
+            for result in results:
+                key = result["status"] if result["status"] is not None else result["error"]
+                statuses[key] = statuses.get(key, 0) + 1
+            print(f"{label}: {len(urls)} urls on {len(sites)} hosts in {elapsed:.2f} s, statuses {statuses}")
+            for server, base_url, _ in sites:
+                starts = sorted(server.request_times)
+                gap = min((b - a for a, b in zip(starts, starts[1:])), default=0.0)
+                print(f"    {base_url}: {len(starts)} requests, smallest gap {gap * 1000:.1f} ms")
+                server.request_times.clear()
+            if scheduler is not None:
+                print(f"    {scheduler.report()}")
+    finally:
+        for server, _, _ in sites:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import gzip
+import uuid
+import zlib
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BOT_FOLDER = os.path.abspath(os.path.dirname(__file__))
+CRAWL_DATA_FOLDER = os.path.join(BOT_FOLDER, "crawl_data")
+RECORDS_FILE = "pages.jsonl.gz"
+INDEX_FILE = "index.json"
+FLUSH_EVERY_RECORDS = 500
+FLUSH_EVERY_S = 5.0
+
+
+def new_run_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+class CrawlSink:
+    """
+    Output of one crawl run: a gzip compressed JSONL file with one record per fetched page
+    (url, depth, parent, status, timing, images, links found) and a small index.json.
+
+    Records are buffered and written every FLUSH_EVERY_RECORDS records or FLUSH_EVERY_S seconds,
+    each batch as its own gzip member (concatenated members are still one valid .gz file). A
+    crash loses at most the unflushed batch, and the index lists where each member starts
+    (record number, byte offset) so a reader can start decompressing in the middle of the file.
+
+    Opening an existing run_id appends to it. on_flush, if set, is called after every flush,
+    once the flushed records are on disk (the crawl state commits its progress there).
+    """
+
+    def __init__(self, run_id: Optional[str] = None, folder: str = CRAWL_DATA_FOLDER):
+        self.run_id = run_id or new_run_id()
+        self.folder = os.path.join(folder, self.run_id)
+        os.makedirs(self.folder, exist_ok=True)
+        self.path = os.path.join(self.folder, RECORDS_FILE)
+        self.index = self._load_index()
+        self.index["closed"] = False
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.index["compressed_bytes"]:
+            # A crash between writing a batch and saving the index: drop that batch (possibly torn)
+            # so the index stays exact and new batches do not follow a broken gzip member
+            logger.warning(f"Dropping {os.path.getsize(self.path) - self.index['compressed_bytes']} unindexed bytes from {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(self.index["compressed_bytes"])
+        self.on_flush: Optional[Callable[[], None]] = None
+        self.raw = open(self.path, "ab")
+        self.buffer: List[bytes] = []
+        self.last_flush = time.monotonic()
+
+    def _load_index(self) -> Dict[str, Any]:
+        path = os.path.join(self.folder, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"run_id": self.run_id, "created": time.time(), "records": 0, "by_depth": {},
+                "raw_bytes": 0, "compressed_bytes": 0, "checkpoints": [], "closed": False}
+
+    def write(self, record: Dict[str, Any]):
+        """Buffers one page record; flushes when the buffer is full or old enough."""
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        self.buffer.append(line)
+        depth = self.index["by_depth"].setdefault(str(record.get("depth", 0)),
+                                                  {"pages": 0, "links": 0, "images": 0, "errors": 0})
+        depth["pages"] += 1
+        depth["links"] += len(record.get("links", []))
+        depth["images"] += len(record.get("images", []))
+        depth["errors"] += 1 if record.get("error") else 0
+        if len(self.buffer) >= FLUSH_EVERY_RECORDS or time.monotonic() - self.last_flush >= FLUSH_EVERY_S:
+            self.flush()
+
+    def flush(self):
+        """Compresses the buffered records, makes them readable on disk and updates the index."""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        data = b"".join(self.buffer)
+        self.index["checkpoints"].append([self.index["records"], self.raw.tell()])
+        self.raw.write(gzip.compress(data, compresslevel=6))
+        self.raw.flush()
+        self.index["records"] += len(self.buffer)
+        self.index["raw_bytes"] += len(data)
+        self.index["compressed_bytes"] = self.raw.tell()
+        self.buffer.clear()
+        self._save_index()
+        if self.on_flush is not None:
+            self.on_flush()
+
+    def _save_index(self):
+        path = os.path.join(self.folder, INDEX_FILE)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=4)
+        os.replace(temp_path, path)
+
+    def close(self):
+        self.flush()
+        self.raw.close()
+        self.index["compressed_bytes"] = os.path.getsize(self.path)
+        self.index["closed"] = True
+        self._save_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_index(run_folder: str) -> Dict[str, Any]:
+    with open(os.path.join(run_folder, INDEX_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_records(run_folder: str, start: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the page records of a run from record number `start` on. Decompression starts at the
+    gzip member holding `start` instead of the beginning of the file; a torn last member (crash
+    while writing) yields the complete records it holds.
+    """
+    index = load_index(run_folder)
+    checkpoints = [cp for cp in index["checkpoints"] if cp[0] <= start] or [[0, 0]]
+    record_number, offset = checkpoints[-1]
+    pending = b""
+    with open(os.path.join(run_folder, RECORDS_FILE), "rb") as f:
+        f.seek(offset)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while True:
+            data = f.read(256 * 1024)
+            chunk = data
+            while chunk:
+                pending += decompressor.decompress(chunk)
+                chunk = b""
+                if decompressor.eof:  # next gzip member
+                    chunk = decompressor.unused_data
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            if not data:
+                pending += decompressor.flush()
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if record_number >= start:
+                    yield json.loads(line)
+                record_number += 1
+            if not data:
+                break
+
+
+def export_layers(run_folder: str, out_folder: str, links: bool = True, images: bool = True) -> List[str]:
+    """
+    Writes the old plain text layout from a run: Layer{d}.txt with the links first found on
+    depth d pages, and Images_Layer{d}.txt with "url ****** alt ****** source" lines.
+
+    Returns:
+        list: The files written.
+    """
+    os.makedirs(out_folder, exist_ok=True)
+    handles: Dict[str, Any] = {}
+    try:
+        for record in read_records(run_folder):
+            depth = record.get("depth", 0)
+            if links:
+                name = f"Layer{depth}.txt"
+                if name not in handles:
+                    handles[name] = open(os.path.join(out_folder, name), "w", encoding="utf-8")
+                handles[name].writelines(link + "\n" for link in record.get("links", []))
+            if images:
+                name = f"Images_Layer{depth}.txt"
+                if name not in handles:
+                    handles[name] = open(os.path.join(out_folder, name), "w", encoding="utf-8")
+                handles[name].writelines(f"{image['url']} ****** {image['alt']} ****** {image['source']}\n"
+                                         for image in record.get("images", []))
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return [os.path.join(out_folder, name) for name in sorted(handles)]
+
+
+def main():
+    """Compares writing 20k page records through the sink with one open/append/close per link."""
+    import tempfile
+
+    records = [{"url": f"https://example.com/p/{i}", "depth": 1 + i // 5000, "parent": "https://example.com/",
+                "status": 200, "elapsed_s": 0.05,
+                "links": [f"https://example.com/p/{i}/{j}" for j in range(10)],
+                "images": [{"url": f"https://example.com/img/{i}.png", "alt": "x", "source": "img"}]}
+               for i in range(20_000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        for record in records:
+            for link in record["links"]:
+                with open(os.path.join(tmp, f"Layer{record['depth']}.txt"), "a", encoding="utf-8") as file:
+                    file.write(link + "\n")
+        elapsed = time.perf_counter() - t0
+        plain = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+        print(f"open/append/close per link: {elapsed:.2f} s for {len(records) * 10} links, {plain / 1e6:.1f} MB (links only)")
+
+        t0 = time.perf_counter()
+        with CrawlSink(folder=tmp) as sink:
+            for record in records:
+                sink.write(record)
+        elapsed = time.perf_counter() - t0
+        index = load_index(sink.folder)
+        print(f"CrawlSink: {elapsed:.2f} s, {index['compressed_bytes'] / 1e6:.1f} MB compressed "
+              f"({index['raw_bytes'] / 1e6:.1f} MB of JSONL with images and timing), {len(index['checkpoints'])} checkpoints")
+
+        t0 = time.perf_counter()
+        tail = list(read_records(sink.folder, start=19_990))
+        print(f"read records 19990+: {len(tail)} records in {(time.perf_counter() - t0) * 1000:.1f} ms, first {tail[0]['url']}")
+        assert sum(1 for _ in read_records(sink.folder)) == len(records)
+        print(f"export: {[os.path.basename(p) for p in export_layers(sink.folder, os.path.join(tmp, 'export'))]}")
+
+
+if __name__ == "__main__":
+    main()
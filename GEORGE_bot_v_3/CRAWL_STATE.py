@@ -0,0 +1,110 @@
+import os
+import json
+import sqlite3
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from CRAWL_FRONTIER import CrawlFrontier
+from CRAWL_SINK import RECORDS_FILE, read_records
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "state.db"
+
+
+class CrawlState:
+    """
+    Resumable state of one crawl run, in crawl_data/<run_id>/state.db next to the run's records:
+    the frontier (seen set and queue), the completed URLs and the run's parameters.
+
+    Progress is committed in one transaction whenever the sink has flushed its records
+    (commit() is the sink's on_flush), so the completed URLs on disk are exactly pages whose
+    records are on disk, and the queue holds everything found on them that is still to fetch.
+    Pages fetched after the last flush are fetched again on resume. If a crash hit between the
+    sink's flush and the commit, reconcile() takes those pages from the records instead.
+    """
+
+    def __init__(self, run_folder: str):
+        self.run_folder = run_folder
+        self.path = os.path.join(run_folder, STATE_FILE)
+        self.frontier = CrawlFrontier(self.path, durable=True)
+        self.conn: sqlite3.Connection = self.frontier.seen.conn
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS done (url TEXT PRIMARY KEY, depth INTEGER, record INTEGER)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.meta: Dict[str, Any] = {key: json.loads(value) for key, value in self.conn.execute("SELECT key, value FROM meta")}
+        self.meta.setdefault("records", 0)
+        self.pending: List[Tuple[str, int]] = []  # completed since the last commit, in record order
+
+    @staticmethod
+    def exists(run_folder: str) -> bool:
+        return os.path.exists(os.path.join(run_folder, STATE_FILE))
+
+    def is_done(self, url: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM done WHERE url = ?", (url,)).fetchone() is not None
+
+    def done_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM done").fetchone()[0]
+
+    def mark_done(self, url: str, depth: int):
+        """Records a completed page; call right after its record was written to the sink."""
+        self.pending.append((url, depth))
+
+    def commit(self):
+        """Makes the completed pages and the frontier durable (one transaction)."""
+        first = self.meta["records"]
+        self.meta["records"] = first + len(self.pending)
+        done = [(url, depth, first + n) for n, (url, depth) in enumerate(self.pending)]
+        meta = [(key, json.dumps(value)) for key, value in self.meta.items()]
+
+        def write(conn: sqlite3.Connection):
+            conn.executemany("INSERT OR REPLACE INTO done VALUES (?, ?, ?)", done)
+            conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta)
+
+        self.frontier.save(completed=(url for url, _ in self.pending), write=write)
+        self.pending.clear()
+
+    def start(self, starting_links: List[str], max_depth: int):
+        """A new run: stores its parameters and queues the starting links."""
+        self.meta.update({"starting_links": list(starting_links), "max_depth": max_depth})
+        for link in starting_links:
+            self.frontier.add(link, depth=1)
+        self.commit()
+
+    def reconcile(self) -> int:
+        """
+        Takes over records that reached the disk after the last commit (crash between the sink's
+        flush and commit()): their pages count as done and the links on them are queued.
+
+        Returns:
+            int: The number of records taken over.
+        """
+        if not os.path.exists(os.path.join(self.run_folder, RECORDS_FILE)):
+            return 0
+        max_depth = self.meta.get("max_depth", 0)
+        taken = 0
+        for record in read_records(self.run_folder, start=self.meta["records"]):
+            depth = record.get("depth", 0)
+            for link in record.get("links", []):
+                self.frontier.add(link, depth=depth + 1, parent=record["url"], enqueue=depth < max_depth)
+            self.frontier.mark_seen(record.get("final_url") or record["url"])
+            self.mark_done(record["url"], depth)
+            taken += 1
+        if taken:
+            logger.info(f"Took over {taken} crawl records written after the last state commit")
+            self.commit()
+        return taken
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """The committed page records of the run (from the sink), in the order they were completed."""
+        count = self.meta["records"]
+        if count and os.path.exists(os.path.join(self.run_folder, RECORDS_FILE)):
+            for number, record in enumerate(read_records(self.run_folder)):
+                if number >= count:
+                    break
+                yield record
+
+    def close(self):
+        """Closes without committing: pages completed since the last commit are fetched again on resume."""
+        self.frontier.close()
@@ -0,0 +1,256 @@
+import queue
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from CRAWL_ENGINE import CrawlEngine
+from CRAWL_FRONTIER import CrawlFrontier
+from CRAWL_PARSER import ParsePool
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER = 32  # page records that may wait for a slow consumer before the crawl pauses
+HAND_OVER_POLL_S = 0.01  # how often a paused crawl checks whether the synchronous consumer made room
+
+
+class CrawlStream:
+    """
+    A breadth-first crawl as a stream of page records, yielded as the pages finish.
+
+    The starting links are depth 1, links found on depth d pages are fetched at depth d + 1, up
+    to max_depth. URLs are canonicalized (fragments, default ports, trailing slashes and tracking
+    parameters removed), a URL is fetched at most once, at the shallowest depth it was found at,
+    and each layer is fetched concurrently with the hosts interleaved.
+
+    Consume it with `for record in stream` (the crawl runs on an event loop in a helper thread)
+    or `async for record in stream`. The crawl only runs ahead of the consumer by `buffer`
+    records plus the pages in the engine's pipeline, so a slow consumer slows the crawl down
+    instead of piling up pages. cancel() (from any thread) or leaving the loop early stops it:
+    pages in flight are abandoned and not recorded.
+
+    Every page is written to `sink` (a CrawlSink) before it is yielded. With a `state` (a
+    CrawlState in the sink's run folder) progress is saved as the sink flushes and when the
+    stream ends for any reason; a state of an earlier run continues that run, and with replay
+    its completed records are yielded first.
+
+    Record: url, depth, parent, final_url, status, content_type, bytes, truncated, elapsed_s,
+    error, links (canonical URLs first found on this page) and images.
+    """
+
+    def __init__(self, starting_links: List[str], max_depth: int = 3, engine: Optional[CrawlEngine] = None,
+                 parser: Optional[ParsePool] = None, sink=None, state=None, buffer: int = DEFAULT_BUFFER,
+                 replay: bool = True):
+        self.starting_links = list(starting_links)
+        self.max_depth = max_depth
+        self.engine = engine or CrawlEngine()
+        self.parser = parser or ParsePool(())
+        self.sink = sink
+        self.state = state
+        self.buffer = buffer
+        self.replay = replay
+        self.cancel_event = threading.Event()
+        self.started = False
+        self.fetched = 0  # pages requested by this stream
+        self.replayed = 0  # records of an earlier session yielded first
+        self.memory: Optional[Dict[str, Any]] = None  # the frontier's memory report, once the stream ended
+
+    def cancel(self):
+        """Stops the crawl at the next finished page; the stream then ends normally."""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        return self.pages()
+
+    async def pages(self) -> AsyncIterator[Dict[str, Any]]:
+        """The crawl itself; yields one record per fetched page."""
+        if self.started:
+            raise RuntimeError("A CrawlStream can only be consumed once")
+        self.started = True
+        state, sink = self.state, self.sink
+        frontier = state.frontier if state is not None else CrawlFrontier()
+        try:
+            if state is not None and "starting_links" in state.meta:
+                state.reconcile()
+                logger.info(f"Resuming crawl: {state.done_count()} pages done, {frontier.queued} queued")
+                if self.replay:
+                    for record in state.records():
+                        self.replayed += 1
+                        yield record
+            elif state is not None:
+                state.start(self.starting_links, self.max_depth)
+            else:
+                for link in self.starting_links:
+                    frontier.add(link, depth=1)
+            if state is not None:
+                sink.on_flush = state.commit
+
+            for depth in range(1, self.max_depth + 1):
+                if self.cancelled:
+                    break
+                layer = frontier.pop_layer(depth)
+                if state is not None:
+                    layer = [(url, parent) for url, parent in layer if not state.is_done(url)]
+                if not layer:
+                    if not frontier.queued:
+                        break
+                    continue  # a resumed run whose layer was already complete
+                logger.info(f"Crawling layer {depth}: {len(layer)} pages")
+                parents = dict(layer)
+                pages = self.engine.fetch_and_parse_stream(list(parents), self.parser, buffer=self.buffer)
+                try:
+                    async for page, parsed in pages:
+                        if self.cancelled:
+                            break
+                        self.fetched += 1
+                        record = self._record(frontier, page, parsed, depth, parents[page["url"]])
+                        if state is not None:
+                            state.mark_done(page["url"], depth)  # before the write: a flush in there commits it
+                        if sink is not None:
+                            sink.write(record)
+                        yield record
+                finally:
+                    await pages.aclose()
+
+            self.memory = frontier.memory_report()
+        finally:
+            if state is not None:
+                # Everything written so far is complete; make it durable even if the crawl was stopped
+                sink.on_flush = None
+                sink.flush()
+                state.commit()
+                state.close()
+            else:
+                frontier.close()
+
+    def _record(self, frontier: CrawlFrontier, page: Dict[str, Any], parsed, depth: int,
+                parent: Optional[str]) -> Dict[str, Any]:
+        record = {"url": page["url"], "depth": depth, "parent": parent, "final_url": page["final_url"],
+                  "status": page["status"], "content_type": page["content_type"], "bytes": page["bytes"],
+                  "truncated": page["truncated"], "elapsed_s": round(page["elapsed_s"], 3), "error": page["error"],
+                  "links": [], "images": []}
+        if not page["error"]:
+            frontier.mark_seen(page["final_url"])  # a redirect target is not fetched again
+            new_links, images = parsed
+            record["images"] = images
+            for new_link in new_links:
+                canonical = frontier.add(new_link, depth=depth + 1, parent=page["url"], enqueue=depth < self.max_depth)
+                if canonical is not None:
+                    record["links"].append(canonical)
+        return record
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Synchronous iteration: the crawl runs on its own event loop in a helper thread."""
+        records: queue.Queue = queue.Queue(maxsize=self.buffer)
+        loop = asyncio.new_event_loop()
+        pump: Dict[str, asyncio.Task] = {}
+
+        async def hand_over(item):
+            while True:
+                try:
+                    return records.put_nowait(item)
+                except queue.Full:
+                    await asyncio.sleep(HAND_OVER_POLL_S)  # the consumer is behind; the crawl waits
+
+        async def run():
+            stream = self.pages()
+            try:
+                async for record in stream:
+                    await hand_over(("record", record))
+                await hand_over(("end", None))
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                await hand_over(("error", e))
+            finally:
+                await stream.aclose()
+
+        def thread_main():
+            asyncio.set_event_loop(loop)
+            pump["task"] = loop.create_task(run())
+            started.set()
+            try:
+                loop.run_until_complete(pump["task"])
+            except asyncio.CancelledError:
+                pass
+            finally:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+
+        started = threading.Event()
+        thread = threading.Thread(target=thread_main, name="crawl-stream", daemon=True)
+        thread.start()
+        started.wait()
+        finished = False
+        try:
+            while not self.cancelled:
+                kind, value = records.get()
+                if kind == "record":
+                    if self.cancelled:
+                        break  # records handed over before the cancel are not delivered
+                    yield value
+                    continue
+                finished = True
+                if kind == "error":
+                    raise value
+                return
+        finally:
+            if not finished:  # stopped early: cancel the crawl (its cleanup still runs)
+                try:
+                    loop.call_soon_threadsafe(pump["task"].cancel)
+                except RuntimeError:
+                    pass  # the loop is already gone
+            thread.join()
+
+
+def main():
+    """Time to the first record vs the whole crawl, stopping early, and a slow consumer holding the crawl back."""
+    import time
+    from CRAWL_ENGINE import serve_synthetic_site
+
+    server, base_url, fetch_counts = serve_synthetic_site(pages=2000, latency_s=0.02)
+    try:
+        t0 = time.perf_counter()
+        first = None
+        count = 0
+        for record in CrawlStream([f"{base_url}/p/0"], max_depth=3):
+            first = first or time.perf_counter() - t0
+            count += 1
+        total = time.perf_counter() - t0
+        print(f"{count} records: first after {first * 1000:.0f} ms, all after {total * 1000:.0f} ms "
+              f"(a collecting call returns only then)")
+
+        fetch_counts.clear()
+        stream = CrawlStream([f"{base_url}/p/0"], max_depth=3)
+        for count, record in enumerate(stream, 1):
+            if count == 20:
+                stream.cancel()
+        print(f"cancel after 20 records: {count} yielded, {sum(fetch_counts.values())} of 111 pages requested")
+
+        fetch_counts.clear()
+        stream = CrawlStream([f"{base_url}/p/0"], max_depth=3, engine=CrawlEngine(concurrency=8), buffer=4)
+        ahead = 0
+        for count, record in enumerate(stream, 1):
+            time.sleep(0.02)  # a consumer slower than the crawl
+            ahead = max(ahead, sum(fetch_counts.values()) - count)
+        print(f"slow consumer (buffer 4, concurrency 8): the crawl ran at most {ahead} pages ahead of it")
+
+        async def first_five():
+            records = []
+            async for record in CrawlStream([f"{base_url}/p/0"], max_depth=2):
+                records.append(record["url"])
+                if len(records) == 5:
+                    break
+            return records
+        print(f"async for, break after 5: {len(asyncio.run(first_five()))} records")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
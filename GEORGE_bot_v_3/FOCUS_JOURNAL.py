@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from STATE_STORE import BOT_FOLDER, StateStore, get_focus_store
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE_PATH = os.path.join(BOT_FOLDER, "focus", "focus_journal.jsonl")
+SNAPSHOT_EVERY = 32  # a full snapshot at least every N versions bounds the deltas replayed per lookup
+
+
+def focus_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Field level difference between two focus states.
+
+    Lists that only grew at the end (accomplished, obtained_data) are stored as the appended items,
+    so the entry grows with what changed rather than with the size of the list.
+    """
+    delta: Dict[str, Any] = {}
+    for key, value in new.items():
+        if key in old and old[key] == value:
+            continue
+        previous = old.get(key)
+        if isinstance(value, list) and isinstance(previous, list) and previous and value[:len(previous)] == previous:
+            delta.setdefault("append", {})[key] = value[len(previous):]
+        else:
+            delta.setdefault("set", {})[key] = value
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta["del"] = removed
+    return delta
+
+
+def apply_delta(state: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Applies one journal entry (snapshot or delta) to a state and returns it."""
+    if "snapshot" in entry:
+        return json.loads(json.dumps(entry["snapshot"]))
+    for key, value in entry.get("set", {}).items():
+        state[key] = value
+    for key, items in entry.get("append", {}).items():
+        state[key] = list(state.get(key) or []) + items
+    for key in entry.get("del", []):
+        state.pop(key, None)
+    return state
+
+
+class FocusJournal:
+    """
+    Append-only history of the focus: one JSON line per version holding either the changed fields
+    or, every SNAPSHOT_EVERY versions, a full snapshot.
+
+    Only the byte offset, turn and kind of each line are kept in memory. Rebuilding a version
+    reads the nearest snapshot before it and replays at most SNAPSHOT_EVERY deltas.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE_PATH, store: Optional[StateStore] = None,
+                 snapshot_every: int = SNAPSHOT_EVERY):
+        self.path = os.path.abspath(path)
+        self.store = store if store is not None else get_focus_store()
+        self.snapshot_every = snapshot_every
+        self.lock = threading.RLock()
+        self.offsets: List[int] = []  # version v is line v - 1
+        self.turns: List[int] = []  # non decreasing, so "as of turn N" is a bisect
+        self.is_snapshot: List[bool] = []
+        self.since_snapshot = 0
+        self.head: Optional[Dict[str, Any]] = None
+        self.turn = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._load()
+        self.file = open(self.path, "ab")
+
+    def _load(self):
+        """Indexes the journal and rebuilds the latest version; drops a torn last line."""
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Truncating damaged focus journal entry at byte {offset} of {self.path}")
+                    break
+                self.head = apply_delta(self.head or {}, entry)
+                self.offsets.append(offset)
+                self.turns.append(entry.get("turn", 0))
+                self.is_snapshot.append("snapshot" in entry)
+                self.since_snapshot = 0 if "snapshot" in entry else self.since_snapshot + 1
+                offset += len(line)
+        if offset < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        if self.turns:
+            self.turn = self.turns[-1]
+
+    # --- Writing ---
+
+    @property
+    def version(self) -> int:
+        return len(self.offsets)
+
+    def next_turn(self) -> int:
+        """Starts a new conversation turn; later versions are recorded under it."""
+        with self.lock:
+            self.turn += 1
+            return self.turn
+
+    def record(self, data: Dict[str, Any], source: str = "update") -> int:
+        """
+        Appends the focus state as a new version if it differs from the latest one.
+
+        Returns:
+            int: The version now at the head of the journal.
+        """
+        with self.lock:
+            if self.head == data:
+                return self.version
+            entry: Dict[str, Any] = {"v": self.version + 1, "turn": self.turn, "ts": round(time.time(), 3), "source": source}
+            delta = focus_delta(self.head, data) if self.head is not None else None
+            if delta is None or self.since_snapshot + 1 >= self.snapshot_every:
+                entry["snapshot"] = data
+            else:
+                entry.update(delta)
+            line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+            offset = self.file.tell()
+            self.file.write(line)
+            self.file.flush()
+            self.offsets.append(offset)
+            self.turns.append(self.turn)
+            self.is_snapshot.append("snapshot" in entry)
+            self.since_snapshot = 0 if "snapshot" in entry else self.since_snapshot + 1
+            self.head = json.loads(json.dumps(data))
+            return self.version
+
+    def commit(self, data: Dict[str, Any], source: str = "update") -> int:
+        """Makes data the current focus (in-memory store, written in the background) and journals it."""
+        with self.lock:
+            self.store.set(data)
+            return self.record(data, source)
+
+    def ensure_seeded(self):
+        """Records the current focus as the first version of an empty journal."""
+        with self.lock:
+            data = self.store.get()
+            if not self.offsets and isinstance(data, dict):
+                self.record(data, source="initial")
+
+    # --- Reading ---
+
+    def _read_entry(self, version: int) -> Dict[str, Any]:
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[version - 1])
+            return json.loads(f.readline())
+
+    def state_at(self, version: int) -> Optional[Dict[str, Any]]:
+        """The focus as it was at a version, or None if the version does not exist."""
+        with self.lock:
+            if not 1 <= version <= self.version:
+                return None
+            start = version
+            while not self.is_snapshot[start - 1]:
+                start -= 1
+            state: Dict[str, Any] = {}
+            with open(self.path, "rb") as f:
+                for v in range(start, version + 1):
+                    f.seek(self.offsets[v - 1])
+                    state = apply_delta(state, json.loads(f.readline()))
+            return state
+
+    def version_at_turn(self, turn: int) -> int:
+        """The last version recorded at or before a turn (0 if there is none)."""
+        with self.lock:
+            return bisect.bisect_right(self.turns, turn)
+
+    def as_of_turn(self, turn: int) -> Optional[Dict[str, Any]]:
+        """The focus as it stood at the end of a turn."""
+        return self.state_at(self.version_at_turn(turn))
+
+    def rollback(self, version: int) -> Optional[int]:
+        """
+        Restores the focus of an earlier version. The journal is not rewritten: the restored
+        state is appended as a new version, so the rollback itself can be undone.
+
+        Returns:
+            int or None: The new head version, or None if the version does not exist.
+        """
+        with self.lock:
+            state = self.state_at(version)
+            if state is None:
+                return None
+            return self.commit(state, source=f"rollback to v{version}")
+
+    def history(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Short descriptions of the latest versions: version, turn, source and changed fields."""
+        with self.lock:
+            rows = []
+            for v in range(max(1, self.version - limit + 1), self.version + 1):
+                entry = self._read_entry(v)
+                changed = sorted(entry["snapshot"]) if "snapshot" in entry else sorted(
+                    list(entry.get("set", {})) + list(entry.get("append", {})) + entry.get("del", []))
+                rows.append({"version": v, "turn": entry.get("turn", 0), "source": entry.get("source", ""),
+                             "snapshot": "snapshot" in entry, "changed": changed})
+            return rows
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"versions": self.version, "turn": self.turn, "snapshots": sum(self.is_snapshot),
+                    "bytes": self.file.tell()}
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+_journal: Optional[FocusJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_focus_journal() -> FocusJournal:
+    """Returns the process wide focus journal, seeded with the current focus on first use."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = FocusJournal()
+            _journal.ensure_seeded()
+        return _journal
+
+
+def main():
+    """Compares journal growth with copying focus.json per update and times version lookups."""
+    import random
+    import tempfile
+
+    focus = {"user_goal": "Collect prices of 50 products", "steps_to_achieve_goal": [f"step {i}: " + "x" * 60 for i in range(15)],
+             "current_focus": "step 0", "accomplished": [], "obtained_data": [],
+             "additional_info": "", "switch_task": "NO"}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StateStore(os.path.join(tmp, "focus.json"), default=focus)
+        journal = FocusJournal(os.path.join(tmp, "focus_journal.jsonl"), store=store)
+        journal.ensure_seeded()
+
+        full_copy_bytes = 0
+        t0 = time.perf_counter()
+        for i in range(1, 2001):
+            journal.next_turn()
+            focus = dict(focus, current_focus=f"step {i % 15}",
+                         accomplished=focus["accomplished"] + [f"step {i}"],
+                         obtained_data=focus["obtained_data"] + ([f"price {i}: {random.random():.2f}"] if i % 3 == 0 else []))
+            journal.commit(focus)
+            full_copy_bytes += len(json.dumps(focus, indent=4))
+        elapsed = time.perf_counter() - t0
+        stats = journal.stats()
+        print(f"{stats['versions']} versions in {elapsed / 2000 * 1e6:.0f} us/update")
+        print(f"Journal: {stats['bytes'] / 1024:.0f} KB ({stats['snapshots']} snapshots), "
+              f"full copies: {full_copy_bytes / 1024:.0f} KB")
+
+        versions = [random.randint(1, journal.version) for _ in range(500)]
+        t0 = time.perf_counter()
+        for v in versions:
+            journal.state_at(v)
+        print(f"state_at: {(time.perf_counter() - t0) / 500 * 1e6:.0f} us/lookup")
+
+        assert journal.as_of_turn(100)["accomplished"][-1] == "step 100"
+        head = journal.rollback(journal.version_at_turn(100))
+        assert store.get()["accomplished"][-1] == "step 100"
+        print(f"Rolled back to turn 100 as version {head}; history tail: {journal.history(2)}")
+        journal.close()
+
+        reopened = FocusJournal(journal.path, store=store)
+        assert reopened.head == store.get() and reopened.version == head
+        reopened.close()
+
+
+if __name__ == "__main__":
+    main()
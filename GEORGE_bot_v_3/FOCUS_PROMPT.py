@@ -0,0 +1,124 @@
+import copy
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from FOCUS_JOURNAL import focus_delta
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_TURNS = 8  # token stats of turns whose summary was never taken are dropped after this many
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), good enough to compare prompt variants."""
+    return (len(text) + 3) // 4
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class FocusInjector:
+    """
+    Renders the focus for stage prompts as a delta against what the session has already seen.
+
+    The stage models are called without a chat session; what they share is the conversation
+    history pasted into every prompt. A focus block added to that history stays visible to
+    later stages, so each new block only needs a short header, the fields that changed since
+    the session last saw the focus (items appended to a list are sent as just those items) and
+    the names of the unchanged fields. The first block of a session is the full focus.
+    Call reset() when the conversation history is cleared or summarized.
+    """
+
+    def __init__(self):
+        self.seen: Dict[str, Dict[str, Any]] = {}  # session -> focus as last rendered into it
+        self.turn_stats: Dict[int, Dict[str, int]] = {}
+
+    def render(self, session: str, focus: Optional[Dict[str, Any]], raw_text: str = "",
+               version: int = 0, turn: int = 0, stage: str = "") -> str:
+        """
+        Args:
+            session (str): Name of the history the block goes into (stages sharing a history share a session).
+            focus (dict): The current focus; None if focus.json is not valid JSON.
+            raw_text (str): focus.json as text, what would have been pasted otherwise.
+            version (int): Focus version (from the focus journal), shown in the header.
+            turn (int): Conversation turn, used for the header and the per turn token stats.
+            stage (str): Stage name for the logs.
+
+        Returns:
+            str: The focus block to add to the conversation.
+        """
+        header = f"[focus v{version}, turn {turn}]"
+        if not isinstance(focus, dict):
+            block = f"{header} {raw_text}"  # cannot diff what does not parse; paste it as is
+        else:
+            previous = self.seen.get(session)
+            if previous is None:
+                block = f"{header} full: {compact_json(focus)}"
+            else:
+                delta = focus_delta(previous, focus)
+                changed = set(delta.get("set", {})) | set(delta.get("append", {})) | set(delta.get("del", []))
+                lines = [header + (" changes since last shown:" if delta else " unchanged since last shown")]
+                for key, value in delta.get("set", {}).items():
+                    lines.append(f"{key} = {compact_json(value)}")
+                for key, items in delta.get("append", {}).items():
+                    lines.append(f"{key} += {compact_json(items)}")
+                if delta.get("del"):
+                    lines.append(f"removed: {', '.join(delta['del'])}")
+                unchanged = [key for key in focus if key not in changed]
+                if delta and unchanged:
+                    lines.append(f"unchanged: {', '.join(unchanged)}")
+                block = "\n".join(lines)
+            self.seen[session] = copy.deepcopy(focus)
+
+        full = f"Focus: {raw_text}" if raw_text else f"Focus: {compact_json(focus)}"
+        stats = self.turn_stats.setdefault(turn, {"injected": 0, "full": 0})
+        while len(self.turn_stats) > MAX_TRACKED_TURNS:
+            del self.turn_stats[next(iter(self.turn_stats))]
+        stats["injected"] += estimate_tokens(block)
+        stats["full"] += estimate_tokens(full)
+        logger.info(f"Focus for {stage or session}: ~{estimate_tokens(block)} tokens instead of ~{estimate_tokens(full)}")
+        return block
+
+    def turn_summary(self, turn: int) -> Dict[str, int]:
+        """Estimated focus tokens injected during a turn versus pasting the full focus each time; ends the turn's stats."""
+        stats = self.turn_stats.pop(turn, {"injected": 0, "full": 0})
+        return dict(stats, saved=stats["full"] - stats["injected"])
+
+    def reset(self, session: Optional[str] = None):
+        """Forgets what a session (or every session) has seen, so the next block is the full focus."""
+        if session is None:
+            self.seen.clear()
+        else:
+            self.seen.pop(session, None)
+
+
+def main():
+    """Simulates a 30 turn session where the focus changes a little every turn."""
+    focus = {"user_goal": "Collect prices and reviews for 40 laptops from three shops",
+             "steps_to_achieve_goal": [f"step {i}: visit shop page {i} and extract the product table" for i in range(12)],
+             "current_focus": "step 0", "accomplished": [],
+             "obtained_data": [f"laptop {i}: price {900 + i} EUR, rating 4.{i % 10}, 120 reviews" for i in range(25)],
+             "additional_info": "Prefer official shop pages, skip marketplaces.", "switch_task": "NO"}
+    injector = FocusInjector()
+    total_full = total_delta = 0
+    for turn in range(1, 31):
+        # input stage sees the focus, the evaluator sees it again after the action stage changed it
+        for stage in ("input", "evaluator"):
+            if stage == "evaluator" and turn % 2 == 0:
+                focus = dict(focus, current_focus=f"step {turn % 12}", accomplished=focus["accomplished"] + [f"step {turn}"])
+            raw_text = json.dumps(focus, indent=4)
+            injector.render("conversation", focus, raw_text, version=turn, turn=turn, stage=stage)
+        summary = injector.turn_summary(turn)
+        total_full += summary["full"]
+        total_delta += summary["injected"]
+        if turn in (1, 2, 10, 30):
+            print(f"turn {turn:2d}: injected ~{summary['injected']} tokens, full paste ~{summary['full']}, saved ~{summary['saved']}")
+    print(f"30 turns: ~{total_delta} focus tokens injected vs ~{total_full} ({1 - total_delta / total_full:.0%} saved)")
+
+
+if __name__ == "__main__":
+    logger.setLevel(logging.WARNING)
+    main()
@@ -4,7 +4,14 @@ import json
 from typing import List, Dict, Optional
 import logging
 import os
+import inspect
 from TOOL_MANAGER import ToolManager
+from MEMORY_RECALL import MemoryRecaller
+from MEMORY_VECTORS import get_vector_index
+from MEMORY_TIERS import get_tiered_memory
+from STATE_STORE import get_state_store, FOCUS_FILE_PATH
+from FOCUS_JOURNAL import get_focus_journal
+from FOCUS_PROMPT import FocusInjector
 
 tool_manager = ToolManager(tools_folder="tools")
 
@@ -83,20 +90,37 @@ def print_colored(color: str, text: str):
 
 
 def load_focus_data(focus_file_path: str) -> str:
-    """Loads focus data as a string from the specified file."""
+    """Returns focus data as a string from the in-memory state store (the file is only read when it changes)."""
     try:
-        with open(focus_file_path, "r") as f:
-            focus_data = f.read()
+        focus_data = get_state_store(focus_file_path).get_text()
+        if not focus_data:
+            print_colored(Color.WARNING, f"⚠️ Focus file not found: {focus_file_path}")
+            return ""
         print_colored(Color.OKCYAN, f"✨ Loaded Focus: {focus_data}")
         return focus_data
-    except FileNotFoundError:
-        print_colored(Color.WARNING, f"⚠️ Focus file not found: {focus_file_path}")
-        return ""
     except Exception as e:
         print_colored(Color.FAIL, f"❌ Error loading focus file: {e}")
         return ""
 
 
+def add_focus_to_history(stage: str, focus_text: str, turn_number: int):
+    """Adds the focus to the conversation history, as the changes since the history last showed it."""
+    focus_block = focus_injector.render("conversation", get_state_store(FOCUS_FILE_PATH).get(), focus_text,
+                                        version=focus_journal.version, turn=turn_number, stage=stage)
+    conversation_history.append(f"Focus: {focus_block}")
+
+
+def recall_memories(user_input: str, focus_data: str) -> str:
+    """Rendered memory frames relevant to the turn; empty if recall fails."""
+    try:
+        memory_block = memory_recaller.recall(user_input, focus_data)
+        print_colored(Color.OKCYAN, f"🧠 Recalled memories ({memory_recaller.stats()}):\n{memory_block}")
+        return memory_block
+    except Exception as e:
+        logger.error(f"Error recalling memories: {e}")
+        return ""
+
+
 def extract_text_from_response(response) -> str:
     """Extracts text content from model response with error handling."""
     try:
@@ -130,6 +154,9 @@ def handle_tool_calls(response):
                                     arg_name: arg_value
                                     for arg_name, arg_value in function_call.args.items()
                                 }
+                                # Tools that keep per-conversation state get this conversation's id
+                                if "session_id" in inspect.signature(tool_function).parameters:
+                                    function_args.setdefault("session_id", chat_session_id)
 
                                 print(f"🤖 Executing: {Color.OKGREEN}{tool_name}{Color.ENDC}")
                                 print("Arguments:")
@@ -166,18 +193,26 @@ def process_turn(user_input: str) -> bool:
     global conversation_history, current_turn, memory, total_tokens
 
     try:
-        # Reset the current turn
+        # Reset the current turn; focus changes from here on are journaled under the new turn number
         current_turn = []
+        turn_number = focus_journal.next_turn()
+        print_colored(Color.OKBLUE, f"🔢 Turn {turn_number} (focus version {focus_journal.version})")
 
         # Stage 1: Input/Reasoning Model
         conversation_history.append(f"User: {user_input}")
         time.sleep(1)
 
+        # Focus comes from memory, so recall can use this turn's focus
+        focus_data = load_focus_data(FOCUS_FILE_PATH)
+        memory_block = recall_memories(user_input, focus_data)
+        add_focus_to_history("input", focus_data, turn_number)
+
         # Build a combined prompt for the input model
         input_prompt = f"""
             Conversation:
             {'\n'.join(conversation_history)}
-            Focus: {load_focus_data('focus/focus.json')} 
+            Relevant memories from past sessions:
+            {memory_block or 'none'}
             {prompts.get('input_model_prompt', '')}
 
             Available Tools:
@@ -244,6 +279,11 @@ def process_turn(user_input: str) -> bool:
         # Stage 3: Evaluator Model
         time.sleep(3)
         try:
+            # The evaluator updates the focus, so it gets whatever the earlier stages changed
+            add_focus_to_history("evaluator", load_focus_data(FOCUS_FILE_PATH), turn_number)
+            focus_tokens = focus_injector.turn_summary(turn_number)
+            print_colored(Color.OKBLUE, f"📉 Focus tokens this turn: ~{focus_tokens['injected']} instead of ~{focus_tokens['full']} (saved ~{focus_tokens['saved']})")
+
             evaluation_prompt = f"""
                 Conversation:
                 {'\n'.join(conversation_history)}
@@ -281,7 +321,7 @@ def process_turn(user_input: str) -> bool:
                     Conversation Summary:
                     {'\n'.join(conversation_history)}
 
-                    Focus: {load_focus_data('focus/focus.json')}
+                    Focus: {load_focus_data(FOCUS_FILE_PATH)}
 
                     {prompts.get('optimizer_model_prompt', '')}
                 """
@@ -295,6 +335,7 @@ def process_turn(user_input: str) -> bool:
                     # Optionally, reset total_tokens or summarize conversation_history here
                     total_tokens = 0  # Reset token count
                     # conversation_history = []  # Reset conversation history (be cautious!)
+                    # focus_injector.reset()  # ...and then the next focus block has to be the full focus again
 
                 except Exception as E:
                     print_colored(Color.FAIL, f"❌ Error generating content from Optimizer Model: {E}")
@@ -318,6 +359,10 @@ conversation_history = []
 current_turn = []
 memory = {}
 total_tokens = 0
+memory_recaller = MemoryRecaller(vector_index=get_vector_index(), tiers=get_tiered_memory())
+focus_journal = get_focus_journal()
+focus_injector = FocusInjector()
+chat_session_id = f"chat-{os.getpid()}-{int(time.time())}"  # one conversation per process
 
 if __name__ == "__main__":
     print_colored(Color.OKGREEN, "🎉 Welcome to GEORGE, your AI assistant!")
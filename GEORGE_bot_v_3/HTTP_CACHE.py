@@ -0,0 +1,289 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from CRAWL_FRONTIER import canonicalize_url
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BOT_FOLDER = os.path.abspath(os.path.dirname(__file__))
+HTTP_CACHE_FOLDER = os.path.join(BOT_FOLDER, "http_cache")
+HEURISTIC_FRACTION = 0.1  # without max-age/Expires, a page is fresh for 10% of its age since Last-Modified...
+HEURISTIC_MAX_S = 24 * 3600  # ...for at most a day
+MAX_AGE_PATTERN = re.compile(r"(?:^|,)\s*(?:s-maxage|max-age)\s*=\s*\"?(\d+)", re.IGNORECASE)
+
+
+def cache_key(url: str) -> str:
+    """Entries are keyed by the canonical URL (no fragment, default port or tracking parameters)."""
+    return canonicalize_url(url) or url
+
+
+def http_date(value: Optional[str]) -> Optional[float]:
+    """Unix time of an HTTP date header, None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def freshness_lifetime(headers: Mapping[str, str], now: float) -> float:
+    """
+    Seconds a response may be served without asking the server: max-age (or s-maxage), else
+    Expires - Date, else a fraction of the time since Last-Modified. 0 means revalidate every time.
+    """
+    cache_control = headers.get("Cache-Control", "")
+    if "no-cache" in cache_control.lower():
+        return 0.0
+    match = MAX_AGE_PATTERN.search(cache_control)
+    if match:
+        return float(match.group(1))
+    date = http_date(headers.get("Date")) or now
+    expires = http_date(headers.get("Expires"))
+    if expires is not None:
+        return max(0.0, expires - date)
+    last_modified = http_date(headers.get("Last-Modified"))
+    if last_modified is not None:
+        return min(max(0.0, (date - last_modified) * HEURISTIC_FRACTION), HEURISTIC_MAX_S)
+    return 0.0
+
+
+def storable(status: int, headers: Mapping[str, str]) -> bool:
+    return status == 200 and "no-store" not in headers.get("Cache-Control", "").lower()
+
+
+class HttpCache:
+    """
+    On-disk HTTP cache for the crawler and the web tools.
+
+    Bodies live in a content addressed blob directory (blobs/<sha256[:2]>/<sha256>, so the same
+    image or page under several URLs is stored once); an SQLite index maps the canonical URL to
+    its blob, ETag, Last-Modified and expiry.
+
+    Fresh entries (max-age, Expires or the Last-Modified heuristic) are served without any
+    request. Stale entries with a validator are revalidated with If-None-Match /
+    If-Modified-Since, and a 304 serves the stored body. Counters: hits (served without a
+    request), revalidations (304s), misses, stores and bytes_saved (body bytes not downloaded).
+    """
+
+    def __init__(self, folder: str = HTTP_CACHE_FOLDER):
+        self.folder = folder
+        self.blob_folder = os.path.join(folder, "blobs")
+        os.makedirs(self.blob_folder, exist_ok=True)
+        self.lock = threading.Lock()  # the crawler uses the cache from its event loop thread, tools from theirs
+        self.conn = sqlite3.connect(os.path.join(folder, "index.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY, url TEXT, final_url TEXT, content_type TEXT, charset TEXT,
+            etag TEXT, last_modified TEXT, blob TEXT, size INTEGER, stored_at REAL, expires_at REAL)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_blob ON entries (blob)")
+        self.counters = {"hits": 0, "revalidations": 0, "misses": 0, "stores": 0, "bytes_saved": 0}
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_folder, digest[:2], digest)
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """The entry for a URL, with "fresh" (servable without a request) and "path" (the body file); None if not cached."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, final_url, content_type, charset, etag, last_modified, blob, size, stored_at, expires_at "
+                "FROM entries WHERE key = ?", (cache_key(url),)).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(("url", "final_url", "content_type", "charset", "etag", "last_modified", "blob", "size",
+                          "stored_at", "expires_at"), row))
+        entry["path"] = self.blob_path(entry["blob"])
+        if not os.path.exists(entry["path"]):
+            return None  # blob removed by hand; fetch again
+        entry["fresh"] = time.time() < entry["expires_at"]
+        return entry
+
+    def fresh_entry(self, url: str) -> Optional[Dict[str, Any]]:
+        """The entry if it can be served without a request (counted as a hit)."""
+        entry = self.lookup(url)
+        if entry is None or not entry["fresh"]:
+            return None
+        self.counters["hits"] += 1
+        self.counters["bytes_saved"] += entry["size"]
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since for revalidating a stale entry."""
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def revalidated(self, url: str, entry: Dict[str, Any], headers: Mapping[str, str]) -> Dict[str, Any]:
+        """Records a 304 for a stale entry: new expiry (and validators, if sent); the stored body stays."""
+        now = time.time()
+        entry["etag"] = headers.get("ETag") or entry["etag"]
+        entry["last_modified"] = headers.get("Last-Modified") or entry["last_modified"]
+        entry["expires_at"] = now + freshness_lifetime(headers, now)
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE entries SET etag = ?, last_modified = ?, stored_at = ?, expires_at = ? WHERE key = ?",
+                              (entry["etag"], entry["last_modified"], now, entry["expires_at"], cache_key(url)))
+        self.counters["revalidations"] += 1
+        self.counters["bytes_saved"] += entry["size"]
+        return entry
+
+    def miss(self):
+        self.counters["misses"] += 1
+
+    def store(self, url: str, headers: Mapping[str, str], chunks: Iterable[bytes], final_url: Optional[str] = None,
+              content_type: str = "", charset: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stores a 200 response: the body (an iterable of chunks, written to disk as it comes) goes
+        to its blob, the validators and expiry to the index.
+
+        Returns:
+            dict: The new entry (see lookup).
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.blob_folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            blob = digest.hexdigest()
+            path = self.blob_path(blob)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(temp_path)  # same content already stored (under another URL or an earlier version)
+            else:
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        now = time.time()
+        entry = {"url": url, "final_url": final_url or url, "content_type": content_type, "charset": charset,
+                 "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"), "blob": blob,
+                 "size": size, "stored_at": now, "expires_at": now + freshness_lifetime(headers, now),
+                 "path": path, "fresh": True}
+        key = cache_key(url)
+        with self.lock, self.conn:
+            previous = self.conn.execute("SELECT blob FROM entries WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              (key, url, entry["final_url"], content_type, charset, entry["etag"],
+                               entry["last_modified"], blob, size, now, entry["expires_at"]))
+            if previous is not None and previous[0] != blob:
+                self._drop_blob_if_unused(previous[0])
+        self.counters["stores"] += 1
+        return entry
+
+    def _drop_blob_if_unused(self, blob: str):
+        if self.conn.execute("SELECT 1 FROM entries WHERE blob = ? LIMIT 1", (blob,)).fetchone() is None:
+            try:
+                os.remove(self.blob_path(blob))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def read_body(entry: Dict[str, Any]) -> bytes:
+        with open(entry["path"], "rb") as f:
+            return f.read()
+
+    def get(self, url: str, session=None, timeout: float = 20.0) -> Dict[str, Any]:
+        """
+        Synchronous fetch through the cache with requests (for the tools). Non-200 responses are
+        returned but not stored.
+
+        Returns:
+            dict: status, source ("hit", "revalidated" or "network"), content_type and, for a 200,
+            path (the body file in the cache, to read or copy) and size.
+        """
+        import requests
+
+        entry = self.fresh_entry(url)
+        if entry is not None:
+            return {"status": 200, "source": "hit", "content_type": entry["content_type"], "path": entry["path"],
+                    "size": entry["size"]}
+        stale = self.lookup(url)
+        response = (session or requests).get(url, stream=True, timeout=timeout, headers=self.conditional_headers(stale))
+        with response:
+            if response.status_code == 304 and stale is not None:
+                entry = self.revalidated(url, stale, response.headers)
+                return {"status": 200, "source": "revalidated", "content_type": entry["content_type"],
+                        "path": entry["path"], "size": entry["size"]}
+            self.miss()
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if not storable(response.status_code, response.headers):
+                return {"status": response.status_code, "source": "network", "content_type": content_type,
+                        "path": None, "size": 0}
+            entry = self.store(url, response.headers, response.iter_content(chunk_size=64 * 1024),
+                               final_url=response.url, content_type=content_type, charset=response.encoding)
+        return {"status": 200, "source": "network", "content_type": content_type, "path": entry["path"],
+                "size": entry["size"]}
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {**self.counters, "entries": entries, "bytes_indexed": size}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> HttpCache:
+    """Returns the process wide cache in http_cache/, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
+
+
+def main():
+    """Crawls a local site three times: cold, revalidating (ETag/304) and within max-age (no requests at all)."""
+    from CRAWL_ENGINE import CrawlEngine, serve_synthetic_site
+
+    urls_count = 300
+    with tempfile.TemporaryDirectory() as tmp:
+        for max_age in (0, 60):
+            server, base_url, fetch_counts = serve_synthetic_site(pages=urls_count, latency_s=0.01, filler_bytes=50_000,
+                                                                  validators=True, max_age_s=max_age)
+            urls = [f"{base_url}/p/{n}" for n in range(urls_count)]
+            cache = HttpCache(os.path.join(tmp, f"max_age_{max_age}"))
+            try:
+                for run in ("cold", "warm"):
+                    engine = CrawlEngine(concurrency=16, per_host=16, cache=cache)
+                    before = dict(cache.counters)
+                    served_before = sum(fetch_counts.values())
+                    t0 = time.perf_counter()
+                    results = engine.fetch_all(urls)
+                    elapsed = time.perf_counter() - t0
+                    delta = {key: cache.counters[key] - before[key] for key in cache.counters}
+                    ok = sum(1 for result in results if result["status"] == 200 and result["bytes"] > 0)
+                    print(f"max-age {max_age:2d}, {run}: {elapsed:.2f} s, {ok}/{len(urls)} pages with body, "
+                          f"{sum(fetch_counts.values()) - served_before} requests, "
+                          f"{engine.counters['bytes'] / 1e6:.1f} MB downloaded, cache {delta}")
+            finally:
+                server.shutdown()
+                cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from MEMORY_STORE import MemoryStore, get_memory_store, flatten_text, frame_name, frame_text, parse_importance
+from MEMORY_SEGMENTS import SegmentStore
+from MEMORY_TIERS import get_tiered_memory
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128  # MinHash signature length
+LSH_BANDS = 16  # 16 bands x 8 rows: frames with Jaccard >= ~0.7 share a bucket with high probability
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_WORDS = 3
+DUPLICATE_THRESHOLD = 0.8  # estimated Jaccard similarity above which two frames are merged
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frame_signatures (
+    frame_id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    bucket INTEGER NOT NULL,
+    frame_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lsh_buckets_bucket ON lsh_buckets(bucket);
+CREATE INDEX IF NOT EXISTS lsh_buckets_frame ON lsh_buckets(frame_id);
+"""
+
+
+def shingles(text: str) -> set:
+    """Word 3-grams of the lowercased text (the words themselves for very short texts)."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return set(words)
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+class MinHasher:
+    """MinHash signatures with NUM_PERM universal hash permutations (seeded, so stable across runs)."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, 1 << 61, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 61, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        grams = shingles(text)
+        if not grams:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint32)
+        hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+        # uint64 wraparound is intended here, as in the usual MinHash implementations
+        with np.errstate(over="ignore"):
+            permuted = np.bitwise_and((hashes[:, None] * self.a + self.b) % MERSENNE_PRIME, MAX_HASH)
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """One signed 63-bit bucket key per LSH band (band number is mixed in so bands never collide)."""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()
+        digest = hashlib.blake2b(rows, digest_size=8, key=band.to_bytes(2, "little")).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def content_text(frame: Dict[str, Any]) -> str:
+    """Frame content compared for duplicates; the name is left out since repeats mostly differ by name."""
+    return " ".join(flatten_text(frame.get(key)) for key in ("interaction", "impact", "technical_details"))
+
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the two frames' shingle sets."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def merge_values(kept: Any, other: Any) -> Any:
+    """Merges two frame sections: lists are unioned, dicts merged per key, empty strings filled in."""
+    if isinstance(kept, dict) and isinstance(other, dict):
+        merged = dict(kept)
+        for key, value in other.items():
+            merged[key] = merge_values(merged[key], value) if key in merged else value
+        return merged
+    if isinstance(kept, list) and isinstance(other, list):
+        merged = list(kept)
+        for item in other:
+            if item not in merged:
+                merged.append(item)
+        return merged
+    if kept in (None, "", [], {}):
+        return other
+    return kept
+
+
+def merge_frames(canonical: Dict[str, Any], duplicate: Dict[str, Any], duplicate_id: str, score: float) -> Dict[str, Any]:
+    """
+    Folds a near-duplicate frame into the canonical one.
+
+    The canonical frame keeps its name and storage, gains any list items or empty fields the
+    duplicate adds, takes the higher importance, and records the duplicate under "consolidated_from".
+    """
+    merged = dict(canonical)
+    for key in ("interaction", "impact", "technical_details"):
+        merged[key] = merge_values(canonical.get(key) or {}, duplicate.get(key) or {})
+    if parse_importance(duplicate) > parse_importance(canonical):
+        merged["importance"] = merge_values(duplicate.get("importance") or {}, canonical.get("importance") or {})
+    merged["edit_number"] = int(canonical.get("edit_number") or 0) + 1
+    merged["consolidated_from"] = list(canonical.get("consolidated_from") or []) + [{
+        "frame_id": duplicate_id,
+        "memory_frame_name": frame_name(duplicate),
+        "timestamp": duplicate.get("timestamp", ""),
+        "session_info": duplicate.get("session_info", ""),
+        "similarity": round(score, 3),
+    }]
+    return merged
+
+
+def load_frame(file_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not read memory frame {file_path}: {e}")
+        return None
+
+
+def write_frame(frame: Dict[str, Any], file_path: str):
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(frame, indent=4))
+
+
+class FrameDeduplicator:
+    """
+    Finds and merges near-duplicate memory frames with MinHash + LSH.
+
+    Signatures and LSH buckets live next to the frame index in the MemoryStore's SQLite database.
+    Frames are read from and written back to the tiered segment storage, or any SegmentStore passed
+    in (or their file, for frames saved before the segment store existed).
+    consolidate() is called for every new frame, so each frame costs one signature and a handful of
+    indexed bucket lookups instead of a comparison against every stored frame.
+    """
+
+    def __init__(self, store: MemoryStore = None, threshold: float = DUPLICATE_THRESHOLD, hasher: MinHasher = None,
+                 segments: SegmentStore = None):
+        self.store = store or get_memory_store()
+        self.segments = segments if segments is not None else get_tiered_memory()
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        with self.store.lock:
+            self.store.conn.executescript(SCHEMA)
+        self.merged = 0
+
+    def _register(self, frame_id: str, signature: np.ndarray):
+        conn = self.store.conn
+        conn.execute("DELETE FROM lsh_buckets WHERE frame_id = ?", (frame_id,))
+        conn.execute(
+            "INSERT OR REPLACE INTO frame_signatures (frame_id, signature) VALUES (?, ?)",
+            (frame_id, signature.tobytes()),
+        )
+        conn.executemany(
+            "INSERT INTO lsh_buckets (bucket, frame_id) VALUES (?, ?)",
+            [(key, frame_id) for key in band_keys(signature)],
+        )
+
+    def _load(self, frame_id: str, file_path: str = "") -> Optional[Dict[str, Any]]:
+        frame = self.segments.get(frame_id)
+        if frame is None and file_path:
+            frame = load_frame(file_path)
+        return frame
+
+    def _save(self, frame_id: str, frame: Dict[str, Any], file_path: str = ""):
+        if frame_id in self.segments or not file_path:
+            self.segments.append(frame_id, frame)
+        else:
+            write_frame(frame, file_path)
+
+    def find_duplicate(self, signature: np.ndarray, exclude: str = "") -> Optional[Tuple[str, float]]:
+        """The most similar stored frame above the threshold, as (frame_id, similarity)."""
+        keys = band_keys(signature)
+        placeholders = ", ".join("?" for _ in keys)
+        with self.store.lock:
+            rows = self.store.conn.execute(
+                "SELECT s.frame_id, s.signature FROM frame_signatures s WHERE s.frame_id IN "
+                f"(SELECT DISTINCT frame_id FROM lsh_buckets WHERE bucket IN ({placeholders}))",
+                keys,
+            ).fetchall()
+        best = None
+        for row in rows:
+            if row["frame_id"] == exclude:
+                continue
+            score = similarity(signature, np.frombuffer(row["signature"], dtype=np.uint32))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (row["frame_id"], score)
+        return best
+
+    def consolidate(self, frame: Dict[str, Any], frame_id: str, file_path: str = "", vector_index=None) -> Dict[str, Any]:
+        """
+        Registers a newly stored frame, or merges it into an existing near-duplicate.
+
+        Args:
+            frame: The frame that was just saved and indexed.
+            frame_id: Its id in the MemoryStore.
+            file_path: Its file, for frames stored as files; deleted when the frame is merged away.
+            vector_index: Optional VectorIndex to drop the merged frame from and re-embed the canonical one in.
+
+        Returns:
+            {"status": "unique", "frame_id": ...} or
+            {"status": "merged", "frame_id": <canonical id>, "file_path": ..., "similarity": ...}
+        """
+        signature = self.hasher.signature(content_text(frame))
+        duplicate = self.find_duplicate(signature, exclude=frame_id)
+        canonical_row = self.store.get_frames([duplicate[0]]).get(duplicate[0]) if duplicate else None
+        canonical = self._load(duplicate[0], canonical_row["file_path"]) if canonical_row else None
+        if canonical is None:
+            with self.store.lock, self.store.conn:
+                self._register(frame_id, signature)
+            return {"status": "unique", "frame_id": frame_id}
+
+        canonical_id, score = duplicate
+        merged = merge_frames(canonical, frame, frame_id, score)
+        self._save(canonical_id, merged, canonical_row["file_path"])
+        self.store.add_frame(merged, canonical_row["file_path"], frame_id=canonical_id)
+        # Later frames are compared against the merged content, not the canonical frame's old one
+        with self.store.lock, self.store.conn:
+            self._register(canonical_id, self.hasher.signature(content_text(merged)))
+        self.remove(frame_id)
+        self.store.remove_frame(frame_id)
+        self.segments.delete(frame_id)
+        if file_path and os.path.abspath(file_path) != os.path.abspath(canonical_row["file_path"] or ""):
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                logger.warning(f"Could not delete merged memory frame {file_path}: {e}")
+        if vector_index is not None:
+            try:
+                vector_index.remove(frame_id)
+            except Exception as e:
+                logger.warning(f"Could not drop merged frame {frame_id} from the vector index: {e}")
+            try:
+                vector_index.add([canonical_id], [frame_text(merged)])  # replaces its pre-merge vector
+            except Exception as e:
+                logger.warning(f"Could not re-embed merged frame {canonical_id}: {e}")
+        self.merged += 1
+        logger.info(f"Merged memory frame {frame_id} into {canonical_id} (similarity {score:.2f})")
+        return {"status": "merged", "frame_id": canonical_id, "file_path": canonical_row["file_path"],
+                "similarity": round(score, 3)}
+
+    def remove(self, frame_id: str):
+        """Forgets a frame's signature (call when a frame is deleted)."""
+        with self.store.lock, self.store.conn:
+            self.store.conn.execute("DELETE FROM lsh_buckets WHERE frame_id = ?", (frame_id,))
+            self.store.conn.execute("DELETE FROM frame_signatures WHERE frame_id = ?", (frame_id,))
+
+    def consolidate_all(self, vector_index=None) -> Dict[str, int]:
+        """
+        One-off pass over every indexed frame that has no signature yet, oldest first.
+
+        Frames indexed before deduplication existed are registered or merged exactly as new frames
+        would be, so later runs only touch frames added since.
+        """
+        with self.store.lock:
+            rows = self.store.conn.execute(
+                "SELECT frame_id, file_path FROM frames WHERE frame_id NOT IN (SELECT frame_id FROM frame_signatures) "
+                "ORDER BY created_at"
+            ).fetchall()
+        counts = {"checked": 0, "merged": 0, "unique": 0, "unreadable": 0}
+        for row in rows:
+            frame = self._load(row["frame_id"], row["file_path"])
+            if frame is None:
+                counts["unreadable"] += 1
+                continue
+            result = self.consolidate(frame, row["frame_id"], row["file_path"], vector_index)
+            counts["checked"] += 1
+            counts[result["status"]] += 1
+        return counts
+
+
+_default_deduplicator = None
+
+
+def get_deduplicator() -> FrameDeduplicator:
+    """Returns the process wide deduplicator on the default memory store."""
+    global _default_deduplicator
+    if _default_deduplicator is None:
+        _default_deduplicator = FrameDeduplicator()
+    return _default_deduplicator
+
+
+def main():
+    """Benchmarks incremental consolidation on synthetic frames where a third are near-duplicates."""
+    import random
+    import tempfile
+
+    random.seed(0)
+    words = [f"term{i}" for i in range(5000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "bench.sqlite3"))
+        segments = SegmentStore(os.path.join(tmp, "segments"))
+        dedup = FrameDeduplicator(store, segments=segments)
+        originals, expected_duplicates, found, false_merges = [], 0, 0, 0
+        timings = []
+        for i in range(5000):
+            is_duplicate = originals and random.random() < 0.33
+            if is_duplicate:
+                source_index, source = random.choice(originals)
+                text = source.split()
+                text[random.randrange(len(text))] = random.choice(words)  # one edited word, like a re-run of the same task
+                body = " ".join(text)
+                expected_duplicates += 1
+            else:
+                body = " ".join(random.choices(words, k=60))
+                originals.append((i, body))
+            frame = {
+                "timestamp": datetime.now().strftime('%Y-%m-%d_%H-%M'),
+                "naming_suggestion": {"memory_frame_name": f"frame {i}"},
+                "storage": {"memory_folders_storage": [{"folder_path": "bench", "probability": 5}]},
+                "impact": {"obtained_knowledge": body},
+                "importance": {"importance_level": str(random.randint(0, 100))},
+            }
+            frame_id = store.add_frame(frame)
+            segments.append(frame_id, frame)
+            t0 = time.perf_counter()
+            result = dedup.consolidate(frame, frame_id)
+            timings.append(time.perf_counter() - t0)
+            if result["status"] == "merged":
+                found += 1
+                false_merges += 0 if is_duplicate else 1
+        print(f"Frames: 5000, stored after consolidation: {store.count()} ({len(segments)} in segments)")
+        print(f"Near-duplicates: {expected_duplicates}, merged: {found}, false merges: {false_merges}")
+        print(f"Consolidation: {np.mean(timings) * 1000:.2f} ms/frame avg, {np.percentile(timings, 99) * 1000:.2f} ms p99")
+        segments.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
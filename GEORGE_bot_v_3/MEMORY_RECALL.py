@@ -0,0 +1,127 @@
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from MEMORY_STORE import MemoryStore, get_memory_store
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RECALL_TOP_K = 5
+RECALL_TOKEN_BUDGET = 600  # tokens of memory injected into the input model prompt
+RECALL_CACHE_SIZE = 64
+RECALL_CACHE_TTL_S = 300
+RECALL_QUERY_MAX_WORDS = 40
+CHARS_PER_TOKEN = 4
+RRF_K = 60  # reciprocal rank fusion constant
+
+
+class MemoryRecaller:
+    """
+    Retrieves the memory frames most relevant to the current turn and renders them compactly.
+
+    Keyword (FTS) and, when a vector index is given, embedding results are merged with
+    reciprocal rank fusion. Rendered recalls are cached per query until the TTL expires or the
+    memory store changes. When a TieredMemory is given, every recalled frame is counted so often
+    recalled frames stay in the faster tiers.
+    """
+
+    def __init__(self, store: MemoryStore = None, vector_index=None, top_k: int = RECALL_TOP_K,
+                 token_budget: int = RECALL_TOKEN_BUDGET, tiers=None):
+        self.store = store
+        self.vector_index = vector_index
+        self.tiers = tiers
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self) -> MemoryStore:
+        if self.store is None:
+            self.store = get_memory_store()
+        return self.store
+
+    def build_query(self, user_message: str, focus_data: str = "") -> str:
+        """Query text from the user message plus the goal/current focus words of the focus file."""
+        focus_terms = " ".join(re.findall(r'"(?:user_goal|current_focus)":\s*"([^"]*)"', focus_data or ""))
+        words = re.findall(r"\w+", f"{user_message} {focus_terms}".lower())
+        return " ".join(words[:RECALL_QUERY_MAX_WORDS])
+
+    def recall(self, user_message: str, focus_data: str = "") -> str:
+        """Returns the rendered memory block for a turn (empty string if nothing relevant)."""
+        query = self.build_query(user_message, focus_data)
+        if not query:
+            return ""
+        key = (query, self._store().generation)
+        now = time.monotonic()
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached and now - cached[0] < RECALL_CACHE_TTL_S:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                self._record(cached[2])
+                return cached[1]
+            self.misses += 1
+
+        frames = self.retrieve(query)
+        rendered = self.render(frames)
+        frame_ids = [frame["frame_id"] for frame in frames]
+        with self.lock:
+            self.cache[key] = (now, rendered, frame_ids)
+            while len(self.cache) > RECALL_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        self._record(frame_ids)
+        return rendered
+
+    def _record(self, frame_ids: List[str]):
+        if self.tiers is None:
+            return
+        try:
+            self.tiers.record_recalls(frame_ids)
+        except Exception as e:
+            logger.warning(f"Could not record memory recalls: {e}")
+
+    def retrieve(self, query: str) -> List[Dict[str, Any]]:
+        """Top-k frames for a query, fusing keyword and vector rankings."""
+        scores: Dict[str, float] = {}
+        try:
+            keyword_hits = self._store().search(query=query, limit=self.top_k * 2, match_any=True)
+            for rank, frame in enumerate(keyword_hits):
+                scores[frame["frame_id"]] = scores.get(frame["frame_id"], 0.0) + 1.0 / (RRF_K + rank)
+        except Exception as e:
+            logger.warning(f"Keyword memory recall failed: {e}")
+        if self.vector_index is not None:
+            try:
+                for rank, (frame_id, _) in enumerate(self.vector_index.search(query, k=self.top_k * 2)):
+                    scores[frame_id] = scores.get(frame_id, 0.0) + 1.0 / (RRF_K + rank)
+            except Exception as e:
+                logger.warning(f"Vector memory recall failed: {e}")
+
+        best = sorted(scores, key=scores.get, reverse=True)[:self.top_k]
+        frames = self._store().get_frames(best, include_text=True)
+        return [frames[frame_id] for frame_id in best if frame_id in frames]
+
+    def render(self, frames: List[Dict[str, Any]]) -> str:
+        """Compact one-entry-per-frame rendering that stays within the token budget."""
+        budget_chars = self.token_budget * CHARS_PER_TOKEN
+        lines = []
+        for i, frame in enumerate(frames):
+            header = f"- [{frame['timestamp']}] {frame['name']} (importance {frame['importance_level']}): "
+            body = " ".join(f"{frame.get('impact', '')} {frame.get('technical_details', '')}".split())
+            remaining = budget_chars - sum(len(line) + 1 for line in lines)
+            # Split what is left evenly over the frames still to render
+            room = remaining // (len(frames) - i) - len(header)
+            if room < 40:
+                break
+            if len(body) > room:
+                body = body[:room - 3].rstrip() + "..."
+            lines.append(header + body)
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached": len(self.cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,497 @@
+import os
+import json
+import mmap
+import time
+import atexit
+import lzma
+import zlib
+import struct
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from MEMORY_STORE import MEMORY_FOLDER
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SEGMENT_FOLDER = os.path.join(MEMORY_FOLDER, "segments")
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024  # active segment is sealed and a new one started past this size
+COMPACT_MIN_DEAD_RATIO = 0.5  # compact once half the stored bytes belong to replaced/deleted frames
+COMPACT_MIN_DEAD_BYTES = 4 * 1024 * 1024
+COMPRESSIONS = (None, "zlib", "lzma")
+ZLIB_DICTIONARY_BYTES = 32 * 1024  # zlib preset dictionary (its maximum useful size) trained from the first frames
+
+# Record: payload length, crc32 of id + payload, id length, then id and compact JSON payload
+# (compressed as a whole in compressed stores). A zero length payload is a tombstone (the frame was deleted).
+RECORD_HEADER = struct.Struct("<IIH")
+
+
+def encode_frame(frame: Dict[str, Any]) -> bytes:
+    return json.dumps(frame, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_record(frame_id: str, payload: bytes) -> bytes:
+    key = frame_id.encode("utf-8")
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(key + payload), len(key)) + key + payload
+
+
+def segment_name(number: int) -> str:
+    return f"seg_{number:06d}.log"
+
+
+def export_path(root: str, frame_id: str) -> str:
+    """
+    The file of a frame id ("folder/sub/name.json") under root.
+
+    Raises:
+        ValueError: If the id is absolute or has empty, "." or ".." parts or other path separators,
+            i.e. would not name a file inside root.
+    """
+    parts = frame_id.split("/")
+    for part in parts:
+        if part in ("", ".", "..") or "\\" in part or ":" in part:
+            raise ValueError(f"Unsafe memory frame id for export: {frame_id!r}")
+    return os.path.join(root, *parts)
+
+
+class SegmentStore:
+    """
+    Append-only storage for memory frames.
+
+    Frames are written as length-prefixed compact JSON records to rotating segment files. An
+    offset index (frame id -> segment, offset, length) is kept in memory and snapshotted to
+    index.json whenever a segment is sealed, so opening the store only scans the active segment.
+    Reads go through read-only mmaps of the segments. Replaced and deleted frames stay in the
+    segments as dead bytes until compact() rewrites the live records.
+
+    With compression="zlib" or "lzma" every record is compressed on its own, so single frames can
+    still be read without touching their neighbours. zlib uses a preset dictionary trained from
+    the first frames written (zdict.bin), which is what makes compressing ~1 KB records worthwhile.
+    A folder must always be opened with the compression it was created with.
+
+    compact() lists the segments it replaced as retired in the index it publishes; opening the
+    store deletes retired segments that are still there instead of indexing them again.
+    """
+
+    def __init__(self, folder: str = SEGMENT_FOLDER, max_segment_bytes: int = SEGMENT_MAX_BYTES, fsync: bool = False,
+                 compression: str = None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.folder = folder
+        self.compression = compression
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        os.makedirs(folder, exist_ok=True)
+        self.index_path = os.path.join(folder, "index.json")
+        self.zdict_path = os.path.join(folder, "zdict.bin")
+        self.zdict = None
+        if os.path.exists(self.zdict_path):
+            with open(self.zdict_path, "rb") as f:
+                self.zdict = f.read()
+        self.lock = threading.RLock()
+        self.offsets: Dict[str, Tuple[int, int, int]] = {}  # frame_id -> (segment number, record offset, record length)
+        self.scanned: Dict[int, int] = {}  # segment number -> bytes covered by the offset index
+        self.dead_bytes = 0
+        self.retired: List[int] = []  # segments replaced by a compaction, deleted but maybe still on disk
+        self.maps: Dict[int, mmap.mmap] = {}
+        self.compacting = False
+        self._load_index()
+        self.active = max(self.scanned) if self.scanned else 1
+        self.writer = open(self._path(self.active), "ab")
+
+    def _path(self, number: int) -> str:
+        return os.path.join(self.folder, segment_name(number))
+
+    def _segment_numbers(self) -> List[int]:
+        return sorted(int(name[4:10]) for name in os.listdir(self.folder) if name.startswith("seg_") and name.endswith(".log"))
+
+    # --- Offset index ---
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot.get("compression") != self.compression:
+                raise ValueError(f"{self.folder} was written with compression={snapshot.get('compression')}, "
+                                 f"opened with compression={self.compression}")
+            self.offsets = {frame_id: tuple(entry) for frame_id, entry in snapshot["offsets"].items()}
+            self.scanned = {int(number): size for number, size in snapshot["scanned"].items()}
+            self.dead_bytes = snapshot.get("dead_bytes", 0)
+            self.retired = [int(number) for number in snapshot.get("retired", [])]
+        except (OSError, json.JSONDecodeError, KeyError):
+            self.offsets, self.scanned, self.dead_bytes = {}, {}, 0
+
+        # A compaction that crashed before deleting the segments it replaced: their frames are in the
+        # new segments, and scanning them again would bring back deleted and replaced frames
+        self._remove_retired()
+        numbers = [number for number in self._segment_numbers() if number not in self.retired]
+        if any(number not in numbers or os.path.getsize(self._path(number)) < size
+               for number, size in self.scanned.items()):
+            logger.warning("Memory segment index does not match the segments, rebuilding it")
+            self.offsets, self.scanned, self.dead_bytes = {}, {}, 0
+        for number in numbers:
+            self._scan(number, self.scanned.get(number, 0))
+
+    def _scan(self, number: int, start: int):
+        """Indexes the records of a segment from `start`; a torn record at the end is cut off."""
+        path = self._path(number)
+        size = os.path.getsize(path)
+        offset = start
+        if size > start:
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read()
+            position = 0
+            while position + RECORD_HEADER.size <= len(data):
+                payload_length, crc, key_length = RECORD_HEADER.unpack_from(data, position)
+                end = position + RECORD_HEADER.size + key_length + payload_length
+                body = data[position + RECORD_HEADER.size:end]
+                if end > len(data) or zlib.crc32(body) != crc:
+                    break
+                self._apply(body[:key_length].decode("utf-8"), number, start + position, end - position, payload_length == 0)
+                position = end
+            offset = start + position
+            if offset < size:
+                logger.warning(f"Truncating {size - offset} bytes of incomplete records in {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+        self.scanned[number] = offset
+
+    def _apply(self, frame_id: str, number: int, offset: int, length: int, deleted: bool):
+        previous = self.offsets.pop(frame_id, None)
+        if previous:
+            self.dead_bytes += previous[2]
+        if deleted:
+            self.dead_bytes += length
+        else:
+            self.offsets[frame_id] = (number, offset, length)
+
+    def _remove_retired(self):
+        """Deletes retired segments; those that cannot be deleted stay retired."""
+        remaining = []
+        for number in self.retired:
+            try:
+                if os.path.exists(self._path(number)):
+                    os.remove(self._path(number))
+            except OSError as e:
+                logger.warning(f"Could not delete compacted segment {segment_name(number)}: {e}")
+                remaining.append(number)
+        self.retired = remaining
+
+    def save_index(self):
+        """Writes the offset index snapshot (temp file + rename, so a crash never leaves half an index)."""
+        with self.lock:
+            snapshot = {"offsets": self.offsets, "scanned": self.scanned, "dead_bytes": self.dead_bytes,
+                        "compression": self.compression, "retired": self.retired}
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, separators=(",", ":"))
+            os.replace(temp_path, self.index_path)
+
+    # --- Writing ---
+
+    def _rotate(self):
+        self.writer.close()
+        self.active += 1
+        self.scanned[self.active] = 0
+        self.writer = open(self._path(self.active), "ab")
+        if not self.compacting:
+            self.save_index()
+
+    def _append_records(self, records: Sequence[Tuple[str, bytes, bool]]) -> int:
+        """Appends encoded (frame_id, record, deleted) records with one write per segment."""
+        written = 0
+        pending: List[bytes] = []
+        position = self.scanned.get(self.active, 0)
+        for frame_id, record, deleted in records:
+            if position + len(record) > self.max_segment_bytes and position > 0:
+                written += self._write(pending)
+                pending = []
+                self._rotate()
+                position = 0
+            pending.append(record)
+            self._apply(frame_id, self.active, position, len(record), deleted)
+            position += len(record)
+        return written + self._write(pending)
+
+    def append_many(self, items: Sequence[Tuple[str, Optional[Dict[str, Any]]]]) -> int:
+        """
+        Appends (frame_id, frame) pairs in bulk; a None frame deletes the id.
+
+        Returns:
+            int: Number of bytes written.
+        """
+        with self.lock:
+            payloads = [(frame_id, None if frame is None else encode_frame(frame)) for frame_id, frame in items]
+            if self.compression == "zlib" and self.zdict is None:
+                self._train_dictionary([payload for _, payload in payloads if payload])
+            records = [(frame_id, encode_record(frame_id, b"" if payload is None else self._compress(payload)), payload is None)
+                       for frame_id, payload in payloads]
+            written = self._append_records(records)
+        self.maybe_compact()
+        return written
+
+    # --- Compression ---
+
+    def _train_dictionary(self, samples: List[bytes]):
+        """Keeps the tail of the first frames written as the zlib preset dictionary (zlib favours its end)."""
+        if not samples:
+            return
+        self.zdict = b"".join(samples)[-ZLIB_DICTIONARY_BYTES:]
+        with open(self.zdict_path, "wb") as f:
+            f.write(self.zdict)
+
+    def _compress(self, payload: bytes) -> bytes:
+        if self.compression == "zlib":
+            compressor = zlib.compressobj(9, zdict=self.zdict) if self.zdict else zlib.compressobj(9)
+            return compressor.compress(payload) + compressor.flush()
+        if self.compression == "lzma":
+            return lzma.compress(payload, preset=6)
+        return payload
+
+    def _decompress(self, payload: bytes) -> bytes:
+        if self.compression == "zlib":
+            decompressor = zlib.decompressobj(zdict=self.zdict) if self.zdict else zlib.decompressobj()
+            return decompressor.decompress(payload) + decompressor.flush()
+        if self.compression == "lzma":
+            return lzma.decompress(payload)
+        return payload
+
+    def _write(self, records: List[bytes]) -> int:
+        if not records:
+            return 0
+        data = b"".join(records)
+        self.writer.write(data)
+        self.writer.flush()
+        if self.fsync:
+            os.fsync(self.writer.fileno())
+        self.scanned[self.active] = self.scanned.get(self.active, 0) + len(data)
+        return len(data)
+
+    def append(self, frame_id: str, frame: Dict[str, Any]):
+        """Stores (or replaces) one frame."""
+        self.append_many([(frame_id, frame)])
+
+    def delete(self, frame_id: str) -> bool:
+        with self.lock:
+            if frame_id not in self.offsets:
+                return False
+            self.append_many([(frame_id, None)])
+            return True
+
+    # --- Reading ---
+
+    def _map(self, number: int, needed: int) -> mmap.mmap:
+        mapped = self.maps.get(number)
+        if mapped is None or len(mapped) < needed:
+            if mapped is not None:
+                mapped.close()
+            with open(self._path(number), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[number] = mapped
+        return mapped
+
+    def _read(self, entry: Tuple[int, int, int]) -> Dict[str, Any]:
+        number, offset, length = entry
+        mapped = self._map(number, offset + length)
+        _, _, key_length = RECORD_HEADER.unpack_from(mapped, offset)
+        return json.loads(self._decompress(mapped[offset + RECORD_HEADER.size + key_length:offset + length]))
+
+    def get(self, frame_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self.offsets.get(frame_id)
+            return self._read(entry) if entry else None
+
+    def __contains__(self, frame_id: str) -> bool:
+        return frame_id in self.offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def iter_frames(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Every live frame, in segment order."""
+        with self.lock:
+            entries = sorted(self.offsets.items(), key=lambda item: item[1][:2])
+        for frame_id, entry in entries:
+            with self.lock:
+                if self.offsets.get(frame_id) != entry:
+                    continue  # replaced or compacted meanwhile
+                frame = self._read(entry)
+            yield frame_id, frame
+
+    # --- Maintenance ---
+
+    def total_bytes(self) -> int:
+        return sum(self.scanned.values())
+
+    def maybe_compact(self) -> bool:
+        """Compacts when dead records take up more than COMPACT_MIN_DEAD_RATIO of the segments."""
+        total = self.total_bytes()
+        if self.dead_bytes >= COMPACT_MIN_DEAD_BYTES and total and self.dead_bytes / total >= COMPACT_MIN_DEAD_RATIO:
+            self.compact()
+            return True
+        return False
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Copies the live records into fresh segments and deletes the old ones.
+
+        The new segments are numbered after the current ones. The index snapshot listing the old
+        segments as retired is published before they are removed, so a compaction interrupted
+        before that point reopens from the old index and one interrupted after it deletes the
+        leftover old segments on open.
+        """
+        with self.lock:
+            start = time.perf_counter()
+            before = self.total_bytes()
+            old_numbers = sorted(self.scanned)
+            live = []
+            for frame_id, (number, offset, length) in sorted(self.offsets.items(), key=lambda item: item[1][:2]):
+                live.append((frame_id, self._map(number, offset + length)[offset:offset + length], False))
+
+            self.writer.close()
+            for mapped in self.maps.values():
+                mapped.close()
+            self.maps = {}
+            self.offsets, self.scanned, self.dead_bytes = {}, {}, 0
+            self.active = old_numbers[-1] + 1 if old_numbers else 1
+            self.scanned[self.active] = 0
+            self.writer = open(self._path(self.active), "ab")
+            self.compacting = True
+            try:
+                self._append_records(live)
+            finally:
+                self.compacting = False
+            self.retired = sorted(set(self.retired) | set(old_numbers))
+            self.save_index()
+            self._remove_retired()
+            result = {"frames": len(live), "bytes_before": before, "bytes_after": self.total_bytes(),
+                      "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+            logger.info(f"Compacted memory segments: {result}")
+            return result
+
+    def export_folder(self, root: str) -> int:
+        """
+        Writes every live frame as a pretty-printed JSON file under root, reproducing the
+        NewGeneratedbyAI/<folder_path>/<frame name>.json layout the frames used to be stored in.
+        Frames whose id would point outside root (see export_path) are skipped.
+        """
+        count = 0
+        for frame_id, frame in self.iter_frames():
+            try:
+                path = export_path(root, frame_id)
+            except ValueError as e:
+                logger.warning(f"Skipping memory frame: {e}")
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(frame, indent=4))
+            count += 1
+        return count
+
+    def import_folder(self, root: str) -> int:
+        """Bulk appends existing frame files under root, keyed by their path relative to root."""
+        items = []
+        for folder, _, files in os.walk(root):
+            for file in files:
+                if not file.endswith(".json"):
+                    continue
+                path = os.path.join(folder, file)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        items.append((os.path.relpath(path, root).replace(os.sep, "/"), json.load(f)))
+                except (OSError, json.JSONDecodeError) as e:
+                    logger.warning(f"Skipping unreadable memory frame {path}: {e}")
+        self.append_many(items)
+        self.save_index()
+        return len(items)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"frames": len(self.offsets), "segments": len(self.scanned), "bytes": self.total_bytes(),
+                    "dead_bytes": self.dead_bytes}
+
+    def close(self):
+        with self.lock:
+            self.save_index()
+            self.writer.close()
+            for mapped in self.maps.values():
+                mapped.close()
+            self.maps = {}
+
+
+_default_segments = None
+_default_segments_lock = threading.Lock()
+
+
+def get_segment_store() -> SegmentStore:
+    """Returns the process wide segment store on SEGMENT_FOLDER."""
+    global _default_segments
+    with _default_segments_lock:
+        if _default_segments is None:
+            _default_segments = SegmentStore()
+            atexit.register(_default_segments.close)
+        return _default_segments
+
+
+def main():
+    """Compares bulk appends and reads against one pretty-printed file per frame, then compacts and exports."""
+    import random
+    import shutil
+    import tempfile
+
+    words = [f"term{i}" for i in range(20_000)]
+    frames = [(f"topic{i % 50}/frame_{i}.json", {
+        "timestamp": "2024-07-01_10-00",
+        "naming_suggestion": {"memory_frame_name": f"frame {i}"},
+        "storage": {"memory_folders_storage": [{"folder_path": f"topic{i % 50}", "probability": 5}]},
+        "impact": {"obtained_knowledge": " ".join(random.choices(words, k=40))},
+        "importance": {"importance_level": str(random.randint(0, 100))},
+    }) for i in range(100_000)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        for frame_id, frame in frames[:20_000]:
+            path = os.path.join(tmp, "files", *frame_id.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(frame, indent=4))
+        print(f"Per-file JSON: 20000 frames in {time.perf_counter() - t0:.2f}s")
+        t0 = time.perf_counter()
+        for folder, _, files in os.walk(os.path.join(tmp, "files")):
+            for file in files:
+                with open(os.path.join(folder, file), "r", encoding="utf-8") as f:
+                    json.load(f)
+        print(f"Per-file JSON: walk + read all in {time.perf_counter() - t0:.2f}s")
+
+        store = SegmentStore(os.path.join(tmp, "segments"), max_segment_bytes=4 * 1024 * 1024)
+        t0 = time.perf_counter()
+        for i in range(0, len(frames), 1000):
+            store.append_many(frames[i:i + 1000])
+        print(f"Segments: {len(store)} frames bulk appended in {time.perf_counter() - t0:.2f}s, {store.stats()}")
+        t0 = time.perf_counter()
+        for frame_id, _ in random.sample(frames, 10_000):
+            store.get(frame_id)
+        print(f"Segments: random reads {(time.perf_counter() - t0) / 10_000 * 1e6:.1f} us/frame")
+        t0 = time.perf_counter()
+        sum(1 for _ in store.iter_frames())
+        print(f"Segments: read all in {time.perf_counter() - t0:.2f}s")
+        store.close()
+
+        t0 = time.perf_counter()
+        store = SegmentStore(os.path.join(tmp, "segments"), max_segment_bytes=4 * 1024 * 1024)
+        print(f"Segments: reopened ({len(store)} frames) in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        for frame_id, frame in random.sample(frames, 60_000):
+            store.append(frame_id, dict(frame, edit_number=1))
+        print(f"After 60000 rewrites: {store.stats()}")
+        print(f"Compaction: {store.compact()}")
+        t0 = time.perf_counter()
+        exported = store.export_folder(os.path.join(tmp, "export"))
+        print(f"Exported {exported} frames to the folder layout in {time.perf_counter() - t0:.2f}s")
+        store.close()
+        shutil.rmtree(os.path.join(tmp, "export"))
+
+
+if __name__ == "__main__":
+    main()
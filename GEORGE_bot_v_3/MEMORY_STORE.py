@@ -0,0 +1,340 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MEMORY_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), "tools", "memory", "memory")
+MEMORY_INDEX_PATH = os.path.join(MEMORY_FOLDER, "memory_index.sqlite3")
+TIMESTAMP_FORMAT = '%Y-%m-%d_%H-%M'  # same format tool_create_memory stamps frames with
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    rowid INTEGER PRIMARY KEY,
+    frame_id TEXT UNIQUE NOT NULL,
+    name TEXT,
+    folder_path TEXT,
+    file_path TEXT,
+    timestamp TEXT,
+    created_at REAL,
+    importance_level INTEGER
+);
+CREATE INDEX IF NOT EXISTS frames_created_at ON frames(created_at);
+CREATE INDEX IF NOT EXISTS frames_importance ON frames(importance_level);
+CREATE VIRTUAL TABLE IF NOT EXISTS frames_fts USING fts5(
+    name, interaction, impact, technical_details, tokenize = 'unicode61'
+);
+"""
+
+
+def flatten_text(value: Any) -> str:
+    """Joins every string/number inside a (nested) frame section into one searchable text."""
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        return " ".join(flatten_text(v) for v in value.values() if v not in (None, "", [], {}))
+    if isinstance(value, (list, tuple)):
+        return " ".join(flatten_text(v) for v in value)
+    return str(value)
+
+
+def parse_importance(frame: Dict[str, Any]) -> int:
+    """Reads importance.importance_level as an int (the model sometimes writes "85" or "80-90")."""
+    level = (frame.get("importance") or {}).get("importance_level", 0)
+    match = re.search(r"\d+", str(level))
+    return int(match.group()) if match else 0
+
+
+def parse_time(value) -> Optional[float]:
+    """Converts a frame timestamp, ISO date/time string or number to epoch seconds."""
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    for fmt in (TIMESTAMP_FORMAT, "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(value), fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized time: {value}")
+
+
+def frame_name(frame: Dict[str, Any]) -> str:
+    return (frame.get("naming_suggestion") or {}).get("memory_frame_name", "")
+
+
+def frame_folder(frame: Dict[str, Any]) -> str:
+    storage = (frame.get("storage") or {}).get("memory_folders_storage") or [{}]
+    return storage[0].get("folder_path", "")
+
+
+def frame_id_for(frame: Dict[str, Any]) -> str:
+    """A frame's id: its path relative to NewGeneratedbyAI, e.g. "coding/python/Scraper_fix.json"."""
+    return os.path.join(frame_folder(frame), frame_name(frame).replace(" ", "_") + ".json").replace(os.sep, "/")
+
+
+def frame_text(frame: Dict[str, Any]) -> str:
+    """The searchable text of a frame (name and the indexed sections), used for embeddings."""
+    return " ".join(
+        [frame_name(frame)] + [flatten_text(frame.get(key)) for key in ("interaction", "impact", "technical_details")]
+    )
+
+
+def fts_query(query: str, match_any: bool = False) -> str:
+    """Turns free text into a safe FTS5 query: every word quoted, joined with AND (or OR)."""
+    terms = re.findall(r"\w+", query)
+    return (" OR " if match_any else " ").join(f'"{term}"' for term in terms)
+
+
+class MemoryStore:
+    """
+    Local SQLite index over memory frames.
+
+    Every frame written by tool_create_memory is indexed here with FTS5 over its name,
+    interaction, impact and technical_details sections, plus timestamp and importance columns,
+    so recalls are a single indexed query instead of a walk over all frame files.
+    """
+
+    def __init__(self, db_path: str = MEMORY_INDEX_PATH):
+        self.db_path = db_path
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.generation = 0  # bumped on every write so callers can invalidate caches
+
+    def _index(self, frame: Dict[str, Any], file_path: str = "", frame_id: str = None) -> str:
+        name = frame_name(frame)
+        folder_path = frame_folder(frame)
+        frame_id = frame_id or frame_id_for(frame)
+        timestamp = frame.get("timestamp", "")
+        try:
+            created_at = parse_time(timestamp) or time.time()
+        except ValueError:
+            created_at = time.time()
+
+        row = self.conn.execute("SELECT rowid FROM frames WHERE frame_id = ?", (frame_id,)).fetchone()
+        if row:
+            # Re-indexing the same frame (file overwritten): replace its entries
+            self.conn.execute("DELETE FROM frames_fts WHERE rowid = ?", (row["rowid"],))
+            self.conn.execute("DELETE FROM frames WHERE rowid = ?", (row["rowid"],))
+        cursor = self.conn.execute(
+            "INSERT INTO frames (frame_id, name, folder_path, file_path, timestamp, created_at, importance_level) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (frame_id, name, folder_path, file_path, timestamp, created_at, parse_importance(frame)),
+        )
+        self.conn.execute(
+            "INSERT INTO frames_fts (rowid, name, interaction, impact, technical_details) VALUES (?, ?, ?, ?, ?)",
+            (
+                cursor.lastrowid,
+                name,
+                flatten_text(frame.get("interaction")),
+                flatten_text(frame.get("impact")),
+                flatten_text(frame.get("technical_details")),
+            ),
+        )
+        return frame_id
+
+    def add_frame(self, frame: Dict[str, Any], file_path: str = "", frame_id: str = None) -> str:
+        """Indexes one frame and returns its id (the frame's path relative to NewGeneratedbyAI)."""
+        with self.lock, self.conn:
+            self.generation += 1
+            return self._index(frame, file_path, frame_id)
+
+    def add_frames(self, frames: List[Dict[str, Any]], file_paths: List[str] = None) -> List[str]:
+        """Indexes many frames in a single transaction."""
+        file_paths = file_paths or [""] * len(frames)
+        with self.lock, self.conn:
+            self.generation += 1
+            return [self._index(frame, path) for frame, path in zip(frames, file_paths)]
+
+    def remove_frame(self, frame_id: str) -> bool:
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT rowid FROM frames WHERE frame_id = ?", (frame_id,)).fetchone()
+            if not row:
+                return False
+            self.generation += 1
+            self.conn.execute("DELETE FROM frames_fts WHERE rowid = ?", (row["rowid"],))
+            self.conn.execute("DELETE FROM frames WHERE rowid = ?", (row["rowid"],))
+            return True
+
+    def search(
+        self,
+        query: str = "",
+        since=None,
+        until=None,
+        min_importance: int = 0,
+        limit: int = 10,
+        match_any: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Finds frames by keywords and/or time range, best matches (bm25) or newest first.
+
+        Args:
+            query: Free text keywords; every word must match unless match_any is True.
+            since / until: Time range as frame timestamp, ISO date/time or epoch seconds.
+            min_importance: Lowest importance_level to return.
+            limit: Maximum number of frames.
+        """
+        conditions = ["f.importance_level >= ?"]
+        params: List[Any] = [min_importance]
+        if since not in (None, ""):
+            conditions.append("f.created_at >= ?")
+            params.append(parse_time(since))
+        if until not in (None, ""):
+            conditions.append("f.created_at <= ?")
+            params.append(parse_time(until))
+
+        match = fts_query(query, match_any) if query else ""
+        if match:
+            sql = (
+                "SELECT f.*, snippet(frames_fts, -1, '[', ']', '...', 12) AS snippet, bm25(frames_fts) AS score "
+                "FROM frames_fts JOIN frames f ON f.rowid = frames_fts.rowid "
+                f"WHERE frames_fts MATCH ? AND {' AND '.join(conditions)} ORDER BY score LIMIT ?"
+            )
+            params = [match] + params + [limit]
+        else:
+            sql = (
+                "SELECT f.*, '' AS snippet, 0.0 AS score FROM frames f "
+                f"WHERE {' AND '.join(conditions)} ORDER BY f.created_at DESC LIMIT ?"
+            )
+            params = params + [limit]
+
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [
+            {
+                "frame_id": row["frame_id"],
+                "name": row["name"],
+                "folder_path": row["folder_path"],
+                "file_path": row["file_path"],
+                "timestamp": row["timestamp"],
+                "importance_level": row["importance_level"],
+                "snippet": row["snippet"],
+                "score": row["score"],
+            }
+            for row in rows
+        ]
+
+    def get_frames(self, frame_ids: List[str], include_text: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Index rows of the given frame ids, keyed by id; include_text adds the indexed impact/technical text."""
+        if not frame_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in frame_ids)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT f.*, t.impact AS impact_text, t.technical_details AS technical_text "
+                f"FROM frames f JOIN frames_fts t ON t.rowid = f.rowid WHERE f.frame_id IN ({placeholders})",
+                list(frame_ids),
+            ).fetchall()
+        frames = {}
+        for row in rows:
+            frame = {
+                "frame_id": row["frame_id"],
+                "name": row["name"],
+                "folder_path": row["folder_path"],
+                "file_path": row["file_path"],
+                "timestamp": row["timestamp"],
+                "importance_level": row["importance_level"],
+            }
+            if include_text:
+                frame["impact"] = row["impact_text"]
+                frame["technical_details"] = row["technical_text"]
+            frames[row["frame_id"]] = frame
+        return frames
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM frames").fetchone()[0]
+
+    def rebuild_from_folder(self, root: str = os.path.join(MEMORY_FOLDER, "NewGeneratedbyAI")) -> int:
+        """Indexes every existing frame file under root (one-off walk for frames written before the index)."""
+        frames, paths = [], []
+        for folder, _, files in os.walk(root):
+            for file in files:
+                if not file.endswith(".json"):
+                    continue
+                path = os.path.join(folder, file)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        frames.append(json.load(f))
+                    paths.append(path)
+                except (OSError, json.JSONDecodeError) as e:
+                    logger.warning(f"Skipping unreadable memory frame {path}: {e}")
+        self.add_frames(frames, paths)
+        logger.info(f"Indexed {len(frames)} memory frames from {root}")
+        return len(frames)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_memory_store() -> MemoryStore:
+    """Returns the process wide store on MEMORY_INDEX_PATH."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = MemoryStore()
+        return _default_store
+
+
+def main():
+    """Benchmarks indexing and recall on 100k synthetic frames in a temporary database."""
+    import random
+    import tempfile
+
+    topics = ["python", "scraper", "gemini", "focus", "memory", "crawler", "image", "error", "json", "async",
+              "database", "tool", "summary", "cat", "poem", "search", "login", "page", "model", "token"]
+    # Realistic vocabulary: a few topic words plus a long tail of rarer terms
+    words = topics + [f"term{i}" for i in range(20_000)]
+    start = datetime(2024, 1, 1).timestamp()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "bench.sqlite3"))
+        frames = []
+        for i in range(100_000):
+            frames.append({
+                "timestamp": datetime.fromtimestamp(start + i * 60).strftime(TIMESTAMP_FORMAT),
+                "naming_suggestion": {"memory_frame_name": f"frame {i} {random.choice(topics)}"},
+                "storage": {"memory_folders_storage": [{"folder_path": random.choice(topics), "probability": 5}]},
+                "interaction": {"actions": random.sample(topics, 2) + random.sample(words, 2)},
+                "impact": {"obtained_knowledge": " ".join(random.choices(words, k=20))},
+                "importance": {"importance_level": str(random.randint(0, 100))},
+                "technical_details": {"problem_solved": " ".join(random.choices(words, k=30))},
+            })
+        t0 = time.perf_counter()
+        for i in range(0, len(frames), 5000):
+            store.add_frames(frames[i:i + 5000])
+        print(f"Indexed {store.count()} frames in {time.perf_counter() - t0:.1f}s")
+
+        queries = [
+            {"query": "crawler async"},
+            {"query": "gemini token", "since": "2024-01-20", "until": "2024-02-10"},
+            {"since": "2024-02-01", "until": "2024-02-02"},
+            {"query": "poem", "min_importance": 90},
+        ]
+        for q in queries:
+            t0 = time.perf_counter()
+            for _ in range(20):
+                results = store.search(limit=10, **q)
+            print(f"{q}: {len(results)} results, {(time.perf_counter() - t0) / 20 * 1000:.2f} ms/query")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from MEMORY_STORE import MEMORY_FOLDER, MemoryStore, get_memory_store
+from MEMORY_SEGMENTS import SegmentStore, get_segment_store
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+COLD_SEGMENT_FOLDER = os.path.join(MEMORY_FOLDER, "segments_cold")
+COLD_COMPRESSION = "zlib"  # zlib with a trained dictionary: ~5x smaller frames, ~15 us to decompress one
+HOT_CACHE_SIZE = 256  # frames kept decoded in RAM
+
+# Tier score = weighted importance, recency and recall frequency, each scaled to 0..1
+IMPORTANCE_WEIGHT = 0.5
+RECENCY_WEIGHT = 0.3
+FREQUENCY_WEIGHT = 0.2
+RECENCY_HALF_LIFE_DAYS = 30
+RECALL_SATURATION = 20  # recalls at which the frequency part of the score maxes out
+COLD_BELOW = 0.25  # warm frames scoring below this are archived
+WARM_ABOVE = 0.35  # cold frames scoring above this come back (the gap stops frames flapping between tiers)
+
+MAINTENANCE_INTERVAL_S = 600
+MAINTENANCE_BATCH = 5000  # most frames moved per tier per maintenance run
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frame_usage (
+    frame_id TEXT PRIMARY KEY,
+    tier TEXT NOT NULL DEFAULT 'warm',
+    recall_count INTEGER NOT NULL DEFAULT 0,
+    last_recalled REAL
+);
+CREATE INDEX IF NOT EXISTS frame_usage_tier ON frame_usage(tier);
+"""
+
+
+def tier_scores(importance: np.ndarray, created_at: np.ndarray, recall_count: np.ndarray,
+                last_recalled: np.ndarray, now: float) -> np.ndarray:
+    """Scores frames from importance (0-100), age since created or last recalled, and recall count."""
+    last_used = np.fmax(created_at, np.nan_to_num(last_recalled, nan=0.0))
+    age_days = np.maximum(now - last_used, 0.0) / 86400.0
+    recency = 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+    frequency = np.minimum(np.log1p(recall_count) / np.log1p(RECALL_SATURATION), 1.0)
+    return (IMPORTANCE_WEIGHT * np.clip(importance, 0, 100) / 100.0
+            + RECENCY_WEIGHT * recency
+            + FREQUENCY_WEIGHT * frequency)
+
+
+class TieredMemory:
+    """
+    Memory frame storage split into hot, warm and cold tiers.
+
+    Hot frames are kept decoded in an in-RAM LRU cache, warm frames live in the primary segment
+    store and cold frames are compressed into archive segments and decompressed on demand.
+    run_maintenance() scores every frame from its importance_level, recency and recall count
+    (recorded in the frame_usage table next to the frame index) and moves frames between warm and
+    cold; start_maintenance() runs it periodically on a background thread.
+
+    get/append/append_many/delete follow SegmentStore, so callers don't need to know a frame's tier.
+    """
+
+    def __init__(self, store: MemoryStore = None, warm: SegmentStore = None, cold: SegmentStore = None,
+                 hot_size: int = HOT_CACHE_SIZE):
+        self.store = store if store is not None else get_memory_store()
+        self.warm = warm if warm is not None else get_segment_store()
+        self.cold = cold if cold is not None else SegmentStore(COLD_SEGMENT_FOLDER, compression=COLD_COMPRESSION)
+        self.hot: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hot_size = hot_size
+        self.lock = threading.RLock()
+        self.hits = {"hot": 0, "warm": 0, "cold": 0, "miss": 0}
+        self.last_maintenance: Dict[str, Any] = {}
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        with self.store.lock:
+            self.store.conn.executescript(SCHEMA)
+
+    # --- Frame access ---
+
+    def _cache(self, frame_id: str, frame: Dict[str, Any]):
+        self.hot[frame_id] = frame
+        self.hot.move_to_end(frame_id)
+        while len(self.hot) > self.hot_size:
+            self.hot.popitem(last=False)
+
+    def get(self, frame_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            frame = self.hot.get(frame_id)
+            if frame is not None:
+                self.hot.move_to_end(frame_id)
+                self.hits["hot"] += 1
+                return frame
+            for tier, segments in (("warm", self.warm), ("cold", self.cold)):
+                frame = segments.get(frame_id)
+                if frame is not None:
+                    self.hits[tier] += 1
+                    self._cache(frame_id, frame)
+                    return frame
+            self.hits["miss"] += 1
+            return None
+
+    def __contains__(self, frame_id: str) -> bool:
+        return frame_id in self.warm or frame_id in self.cold
+
+    def __len__(self) -> int:
+        return len(self.warm) + len(self.cold)
+
+    def append_many(self, items: Sequence[Tuple[str, Optional[Dict[str, Any]]]]) -> int:
+        """Writes frames to the warm tier (a None frame deletes it); archived copies are dropped."""
+        with self.lock:
+            written = self.warm.append_many(items)
+            archived = [frame_id for frame_id, _ in items if frame_id in self.cold]
+            if archived:
+                self.cold.append_many([(frame_id, None) for frame_id in archived])
+                with self.store.lock, self.store.conn:
+                    self.store.conn.executemany("UPDATE frame_usage SET tier = 'warm' WHERE frame_id = ?",
+                                                [(frame_id,) for frame_id in archived])
+            for frame_id, _ in items:
+                self.hot.pop(frame_id, None)
+            return written
+
+    def append(self, frame_id: str, frame: Dict[str, Any]):
+        self.append_many([(frame_id, frame)])
+
+    def delete(self, frame_id: str) -> bool:
+        with self.lock:
+            deleted = self.warm.delete(frame_id) | self.cold.delete(frame_id)
+            self.hot.pop(frame_id, None)
+            with self.store.lock, self.store.conn:
+                self.store.conn.execute("DELETE FROM frame_usage WHERE frame_id = ?", (frame_id,))
+            return deleted
+
+    def iter_frames(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        yield from self.warm.iter_frames()
+        yield from self.cold.iter_frames()
+
+    def export_folder(self, root: str) -> int:
+        """Exports warm and cold frames into the same folder layout (see SegmentStore.export_folder)."""
+        return self.warm.export_folder(root) + self.cold.export_folder(root)
+
+    def compact(self) -> Dict[str, Any]:
+        return {"warm": self.warm.compact(), "cold": self.cold.compact()}
+
+    # --- Usage and tiering ---
+
+    def record_recalls(self, frame_ids: Sequence[str], now: float = None):
+        """Counts a recall of each frame; recalled frames score higher and are cached hot."""
+        if not frame_ids:
+            return
+        now = now or time.time()
+        with self.store.lock, self.store.conn:
+            self.store.conn.executemany(
+                "INSERT INTO frame_usage (frame_id, recall_count, last_recalled) VALUES (?, 1, ?) "
+                "ON CONFLICT(frame_id) DO UPDATE SET recall_count = recall_count + 1, last_recalled = excluded.last_recalled",
+                [(frame_id, now) for frame_id in frame_ids],
+            )
+
+    def _move(self, frame_ids: List[str], source: SegmentStore, target: SegmentStore, tier: str) -> int:
+        frames = [(frame_id, source.get(frame_id)) for frame_id in frame_ids]
+        frames = [(frame_id, frame) for frame_id, frame in frames if frame is not None]
+        if not frames:
+            return 0
+        target.append_many(frames)
+        source.append_many([(frame_id, None) for frame_id, _ in frames])
+        with self.store.lock, self.store.conn:
+            self.store.conn.executemany(
+                "INSERT INTO frame_usage (frame_id, tier) VALUES (?, ?) ON CONFLICT(frame_id) DO UPDATE SET tier = excluded.tier",
+                [(frame_id, tier) for frame_id, _ in frames],
+            )
+        return len(frames)
+
+    def run_maintenance(self, now: float = None) -> Dict[str, Any]:
+        """
+        Re-scores all frames, archives low scoring warm frames, restores high scoring cold frames
+        and preloads the best scoring frames into the hot cache.
+
+        Returns:
+            dict: Frames scored, archived, restored, cached hot, and the run time.
+        """
+        start = time.perf_counter()
+        now = now or time.time()
+        with self.store.lock:
+            rows = self.store.conn.execute(
+                "SELECT f.frame_id, f.importance_level, f.created_at, COALESCE(u.tier, 'warm') AS tier, "
+                "COALESCE(u.recall_count, 0) AS recall_count, u.last_recalled "
+                "FROM frames f LEFT JOIN frame_usage u ON u.frame_id = f.frame_id"
+            ).fetchall()
+        if not rows:
+            return {"scored": 0, "archived": 0, "restored": 0, "hot": len(self.hot), "elapsed_ms": 0.0}
+
+        frame_ids = [row["frame_id"] for row in rows]
+        tiers = np.array([row["tier"] for row in rows])
+        scores = tier_scores(
+            np.array([row["importance_level"] or 0 for row in rows], dtype=np.float64),
+            np.array([row["created_at"] or now for row in rows], dtype=np.float64),
+            np.array([row["recall_count"] for row in rows], dtype=np.float64),
+            np.array([row["last_recalled"] if row["last_recalled"] is not None else np.nan for row in rows], dtype=np.float64),
+            now,
+        )
+        order = np.argsort(scores)
+        to_archive = [frame_ids[i] for i in order if tiers[i] == "warm" and scores[i] < COLD_BELOW][:MAINTENANCE_BATCH]
+        to_restore = [frame_ids[i] for i in order[::-1] if tiers[i] == "cold" and scores[i] > WARM_ABOVE][:MAINTENANCE_BATCH]
+
+        with self.lock:
+            archived = self._move(to_archive, self.warm, self.cold, "cold")
+            restored = self._move(to_restore, self.cold, self.warm, "warm")
+            archived_ids = set(to_archive)
+            for frame_id in archived_ids:
+                self.hot.pop(frame_id, None)
+            # Best scoring frames end up most recently used, so reads evict the weaker ones first
+            best = [frame_ids[i] for i in order[::-1][:self.hot_size] if frame_ids[i] not in archived_ids]
+            for frame_id in reversed(best):
+                frame = self.hot.get(frame_id) or self.warm.get(frame_id)
+                if frame is not None:
+                    self._cache(frame_id, frame)
+
+        self.last_maintenance = {
+            "scored": len(rows),
+            "archived": archived,
+            "restored": restored,
+            "hot": len(self.hot),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        if archived or restored:
+            logger.info(f"Memory tier maintenance: {self.last_maintenance}")
+        return self.last_maintenance
+
+    def _maintenance_loop(self, interval_s: float):
+        while not self.stop_event.wait(interval_s):
+            try:
+                self.run_maintenance()
+            except Exception as e:
+                logger.exception(f"Memory tier maintenance failed: {e}")
+
+    def start_maintenance(self, interval_s: float = MAINTENANCE_INTERVAL_S):
+        """Runs run_maintenance every interval_s seconds on a daemon thread."""
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._maintenance_loop, args=(interval_s,),
+                                           name="memory-tiers", daemon=True)
+            self.thread.start()
+
+    def stop_maintenance(self):
+        self.stop_event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "hot": len(self.hot),
+                "warm": self.warm.stats(),
+                "cold": self.cold.stats(),
+                "hits": dict(self.hits),
+                "last_maintenance": dict(self.last_maintenance),
+            }
+
+
+_default_tiers = None
+_default_tiers_lock = threading.Lock()
+
+
+def get_tiered_memory() -> TieredMemory:
+    """Returns the process wide tiered memory and starts its background maintenance."""
+    global _default_tiers
+    with _default_tiers_lock:
+        if _default_tiers is None:
+            _default_tiers = TieredMemory()
+            _default_tiers.start_maintenance()
+        return _default_tiers
+
+
+def main():
+    """Tiers 50k synthetic frames of mixed importance and age, then compares read latency per tier."""
+    import random
+    import tempfile
+
+    random.seed(0)
+    now = time.time()
+    words = ["python", "scraper", "page", "json", "error", "fixed", "user", "asked", "model", "links", "saved"]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "bench.sqlite3"))
+        tiers = TieredMemory(store, SegmentStore(os.path.join(tmp, "warm")),
+                             SegmentStore(os.path.join(tmp, "cold"), compression=COLD_COMPRESSION))
+        frames = []
+        for i in range(50_000):
+            age_days = random.expovariate(1 / 60)
+            frames.append((f"bench/frame_{i}.json", {
+                "timestamp": time.strftime('%Y-%m-%d_%H-%M', time.localtime(now - age_days * 86400)),
+                "naming_suggestion": {"memory_frame_name": f"frame {i}"},
+                "storage": {"memory_folders_storage": [{"folder_path": "bench", "probability": 5}]},
+                "interaction": {"people": ["user"], "actions": random.sample(words, 3)},
+                "impact": {"obtained_knowledge": " ".join(random.choices(words, k=30)), "positive_impact": ""},
+                "importance": {"reason": "", "importance_level": str(int(random.betavariate(2, 3) * 100))},
+                "technical_details": {"problem_solved": " ".join(random.choices(words, k=15)), "resources": []},
+            }))
+        for i in range(0, len(frames), 5000):
+            batch = frames[i:i + 5000]
+            store.add_frames([frame for _, frame in batch])
+            tiers.append_many(batch)
+        recalled = [frame_id for frame_id, _ in random.sample(frames, 2000)]
+        tiers.record_recalls(recalled, now=now - 86400)
+        warm_before = tiers.warm.total_bytes()
+
+        print(f"Maintenance: {tiers.run_maintenance(now)}")
+        tiers.warm.compact()
+        print(f"Warm: {tiers.warm.stats()['frames']} frames, {tiers.warm.total_bytes() / 1e6:.1f} MB "
+              f"(was {warm_before / 1e6:.1f} MB); cold: {tiers.cold.stats()['frames']} frames, "
+              f"{tiers.cold.total_bytes() / 1e6:.1f} MB")
+
+        hot_ids = list(tiers.hot)[:1000]
+        warm_ids = [frame_id for frame_id in random.sample(list(tiers.warm.offsets), 1000) if frame_id not in tiers.hot]
+        cold_ids = random.sample(list(tiers.cold.offsets), 1000)
+        for name, ids in (("hot", hot_ids), ("warm", warm_ids), ("cold", cold_ids)):
+            tiers.hot_size = 0 if name != "hot" else HOT_CACHE_SIZE  # measure the tier itself, not the cache
+            t0 = time.perf_counter()
+            for frame_id in ids:
+                tiers.get(frame_id)
+            print(f"{name} reads: {(time.perf_counter() - t0) / len(ids) * 1e6:.1f} us/frame")
+        tiers.hot_size = HOT_CACHE_SIZE
+        print(f"Second run (archives the next batch): {tiers.run_maintenance(now)}")
+        tiers.warm.close()
+        tiers.cold.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from MEMORY_STORE import MEMORY_FOLDER
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_FOLDER = os.path.join(MEMORY_FOLDER, "vectors")
+GEMINI_EMBEDDING_MODEL = "models/text-embedding-004"
+IVF_MIN_VECTORS = 1_000_000  # collections this large are searched through the IVF lists when built
+SEARCH_BATCH_ROWS = 65536  # rows scored per matmul in exact search
+
+
+# --- Embedders ---
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder: signed feature hashing of words and word bigrams.
+
+    Needs no network or model, so it is used for offline runs and benchmarks.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r"\w+", text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: Sequence[str], task: str = "document") -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dim] += 1.0 if (digest >> 63) & 1 else -1.0
+        return vectors
+
+
+class GeminiEmbedder:
+    """Embeddings from the Gemini embedding model (needs network and the google key)."""
+
+    name = "gemini"
+
+    def __init__(self, model: str = GEMINI_EMBEDDING_MODEL, dim: int = 768):
+        self.model = model
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str], task: str = "document") -> np.ndarray:
+        import google.generativeai as genai
+
+        task_type = "retrieval_query" if task == "query" else "retrieval_document"
+        result = genai.embed_content(model=self.model, content=list(texts), task_type=task_type)
+        return np.asarray(result["embedding"], dtype=np.float32).reshape(len(texts), self.dim)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+# --- Index ---
+
+class VectorIndex:
+    """
+    Cosine similarity index over memory frame embeddings.
+
+    Vectors are L2-normalized float32 rows in a memory-mapped matrix (vectors.f32) that grows by
+    doubling; frame ids are appended to ids.txt in row order. Search is exact top-k with batched
+    matmuls. For very large collections build_ivf() clusters the rows (spherical k-means) so
+    queries only score the nprobe closest lists.
+    """
+
+    def __init__(self, folder: str, embedder=None, initial_capacity: int = 1024):
+        self.folder = folder
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        os.makedirs(folder, exist_ok=True)
+        self.lock = threading.RLock()
+        self.meta_path = os.path.join(folder, "meta.json")
+        self.vectors_path = os.path.join(folder, "vectors.f32")
+        self.ids_path = os.path.join(folder, "ids.txt")
+        self.removed_path = os.path.join(folder, "removed.txt")
+        self.ivf_path = os.path.join(folder, "ivf.npz")
+
+        meta = {"dim": self.dim, "count": 0, "capacity": initial_capacity, "embedder": self.embedder.name}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["dim"] != self.dim:
+                raise ValueError(f"Index at {folder} has dim {meta['dim']}, embedder gives {self.dim}")
+        self.count = meta["count"]
+        self.capacity = max(meta["capacity"], 1)
+        self.matrix = self._open_matrix(self.capacity)
+
+        self.ids: List[str] = []
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, "r", encoding="utf-8") as f:
+                self.ids = f.read().splitlines()
+            if len(self.ids) > self.count:
+                # An add that crashed after appending its ids but before saving the meta: its rows do
+                # not count, so drop the ids too or the next add would write its ids after them
+                logger.warning(f"{self.ids_path} has {len(self.ids)} ids for {self.count} rows, truncating")
+                self.ids = self.ids[:self.count]
+                with open(self.ids_path, "r+b") as f:
+                    f.truncate(sum(len(frame_id.encode("utf-8")) + 1 for frame_id in self.ids))
+        self.row_of: Dict[str, int] = {frame_id: row for row, frame_id in enumerate(self.ids)}
+        if os.path.exists(self.removed_path):
+            with open(self.removed_path, "r", encoding="utf-8") as f:
+                for line in f.read().splitlines():
+                    frame_id, _, row = line.rpartition("\t")
+                    if self.row_of.get(frame_id) == int(row):
+                        del self.row_of[frame_id]
+        self.alive = np.ones(self.capacity, dtype=bool)
+        self.alive[:self.count] = [self.row_of.get(frame_id) == row for row, frame_id in enumerate(self.ids)]
+        self.alive[self.count:] = False
+
+        self.centroids: Optional[np.ndarray] = None
+        self.list_of_row: Optional[np.ndarray] = None
+        self.inverted_lists = None  # (rows sorted by list, start offset of each list), rebuilt lazily
+        if os.path.exists(self.ivf_path):
+            data = np.load(self.ivf_path)
+            self.centroids = data["centroids"]
+            self.list_of_row = np.full(self.capacity, -1, dtype=np.int32)
+            self.list_of_row[:len(data["assignments"])] = data["assignments"]
+            self._assign_missing_rows()
+
+    def _open_matrix(self, capacity: int) -> np.memmap:
+        mode = "r+" if os.path.exists(self.vectors_path) else "w+"
+        if mode == "r+" and os.path.getsize(self.vectors_path) < capacity * self.dim * 4:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(capacity * self.dim * 4)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+
+    def _grow(self, needed: int):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        self.matrix.flush()
+        del self.matrix
+        self.matrix = self._open_matrix(capacity)
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - self.capacity, dtype=bool)])
+        if self.list_of_row is not None:
+            self.list_of_row = np.concatenate([self.list_of_row, np.full(capacity - self.capacity, -1, dtype=np.int32)])
+        self.capacity = capacity
+
+    def _save_meta(self):
+        """Writes meta.json atomically: the row count in it is what commits an add."""
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count, "capacity": self.capacity, "embedder": self.embedder.name}, f)
+        os.replace(temp_path, self.meta_path)
+
+    def add_vectors(self, frame_ids: Sequence[str], vectors: np.ndarray):
+        """Adds precomputed vectors; an id that is already indexed is replaced."""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(frame_ids), self.dim))
+        with self.lock:
+            start = self.count
+            self._grow(start + len(frame_ids))
+            self.matrix[start:start + len(frame_ids)] = vectors
+            self.matrix.flush()
+            for offset, frame_id in enumerate(frame_ids):
+                old_row = self.row_of.get(frame_id)
+                if old_row is not None:
+                    self.alive[old_row] = False
+                self.row_of[frame_id] = start + offset
+                self.alive[start + offset] = True
+            self.ids.extend(frame_ids)
+            self.count += len(frame_ids)
+            with open(self.ids_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{frame_id}\n" for frame_id in frame_ids))
+            self._save_meta()
+            if self.centroids is not None:
+                self._assign_missing_rows()
+
+    def add(self, frame_ids: Sequence[str], texts: Sequence[str]):
+        """Embeds texts with the index's embedder and adds them."""
+        self.add_vectors(frame_ids, self.embedder.embed(texts, task="document"))
+
+    def remove(self, frame_id: str) -> bool:
+        with self.lock:
+            row = self.row_of.pop(frame_id, None)
+            if row is None:
+                return False
+            self.alive[row] = False
+            with open(self.removed_path, "a", encoding="utf-8") as f:
+                f.write(f"{frame_id}\t{row}\n")
+            return True
+
+    def __len__(self):
+        return len(self.row_of)
+
+    # --- search ---
+
+    def search_vectors(self, queries: np.ndarray, k: int = 10, nprobe: int = 8, use_ivf: bool = None) -> List[List[Tuple[str, float]]]:
+        """Top-k (frame_id, cosine) per query row. use_ivf=None picks IVF when built and the index is large."""
+        queries = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        with self.lock:
+            if use_ivf is None:
+                use_ivf = self.centroids is not None and self.count >= IVF_MIN_VECTORS
+            if use_ivf and self.centroids is not None:
+                return [self._search_ivf(q, k, nprobe) for q in queries]
+            return self._search_exact(queries, k)
+
+    def search(self, text: str, k: int = 10, **kwargs) -> List[Tuple[str, float]]:
+        """Top-k frames most similar to a text."""
+        return self.search_vectors(self.embedder.embed([text], task="query"), k, **kwargs)[0]
+
+    def _search_exact(self, queries: np.ndarray, k: int) -> List[List[Tuple[str, float]]]:
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, self.count, SEARCH_BATCH_ROWS):
+            end = min(start + SEARCH_BATCH_ROWS, self.count)
+            scores = queries @ self.matrix[start:end].T  # (queries, rows)
+            scores[:, ~self.alive[start:end]] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            keep = min(k, scores.shape[1])
+            part = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, part, axis=1)
+            best_rows = np.take_along_axis(rows, part, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([(self.ids[rows[i]], float(scores[i])) for i in order if np.isfinite(scores[i])])
+        return results
+
+    def _search_ivf(self, query: np.ndarray, k: int, nprobe: int) -> List[Tuple[str, float]]:
+        if self.inverted_lists is None:
+            assigned = self.list_of_row[:self.count]
+            order = np.argsort(assigned, kind="stable")
+            self.inverted_lists = (order, np.searchsorted(assigned[order], np.arange(len(self.centroids) + 1)))
+        order, offsets = self.inverted_lists
+        lists = top_k(self.centroids @ query, nprobe)
+        rows = np.sort(np.concatenate([order[offsets[i]:offsets[i + 1]] for i in lists]))
+        rows = rows[self.alive[rows]]
+        if len(rows) == 0:
+            return []
+        scores = self.matrix[rows] @ query
+        best = top_k(scores, k)
+        return [(self.ids[rows[i]], float(scores[i])) for i in best]
+
+    # --- IVF ---
+
+    def build_ivf(self, n_lists: int = None, sample_size: int = 100_000, iterations: int = 10, seed: int = 0):
+        """Trains spherical k-means centroids on a sample of rows and assigns every row to a list."""
+        with self.lock:
+            live_rows = np.flatnonzero(self.alive[:self.count])
+            if len(live_rows) == 0:
+                return
+            n_lists = n_lists or max(1, int(np.sqrt(len(live_rows))))
+            rng = np.random.default_rng(seed)
+            sample = self.matrix[np.sort(rng.choice(live_rows, min(sample_size, len(live_rows)), replace=False))]
+            centroids = sample[rng.choice(len(sample), min(n_lists, len(sample)), replace=False)].copy()
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, sample)
+                empty = np.bincount(assignment, minlength=len(centroids)) == 0
+                sums[empty] = centroids[empty]
+                centroids = normalize_rows(sums)
+            self.centroids = centroids
+            self.list_of_row = np.full(self.capacity, -1, dtype=np.int32)
+            self._assign_missing_rows()
+            logger.info(f"Built IVF with {len(centroids)} lists over {len(live_rows)} vectors")
+
+    def _assign_missing_rows(self):
+        missing = np.flatnonzero(self.list_of_row[:self.count] < 0)
+        for start in range(0, len(missing), SEARCH_BATCH_ROWS):
+            rows = missing[start:start + SEARCH_BATCH_ROWS]
+            self.list_of_row[rows] = np.argmax(self.matrix[rows] @ self.centroids.T, axis=1)
+        self.inverted_lists = None
+        np.savez(self.ivf_path, centroids=self.centroids, assignments=self.list_of_row[:self.count])
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_vector_index(embedder=None) -> VectorIndex:
+    """Returns the process wide index of memory frames (Gemini embeddings unless an embedder is given)."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            embedder = embedder or GeminiEmbedder()
+            _default_index = VectorIndex(os.path.join(VECTOR_INDEX_FOLDER, embedder.name), embedder)
+        return _default_index
+
+
+def main():
+    """Benchmarks exact and IVF search latency and IVF recall@10 on synthetic clustered vectors."""
+    import tempfile
+
+    n, dim, n_queries, k = 200_000, 256, 100, 10
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((500, dim)).astype(np.float32)
+    data = centers[rng.integers(0, len(centers), n)] + 2.0 * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = data[rng.integers(0, n, n_queries)] + 1.0 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(tmp, HashingEmbedder(dim))
+        t0 = time.perf_counter()
+        for start in range(0, n, 50_000):
+            index.add_vectors([f"frame-{i}" for i in range(start, min(start + 50_000, n))], data[start:start + 50_000])
+        print(f"Added {len(index)} vectors in {time.perf_counter() - t0:.2f}s")
+
+        t0 = time.perf_counter()
+        exact = [index.search_vectors(q, k, use_ivf=False)[0] for q in queries]
+        print(f"Exact top-{k}: {(time.perf_counter() - t0) / n_queries * 1000:.2f} ms/query")
+        t0 = time.perf_counter()
+        index.search_vectors(queries, k, use_ivf=False)
+        print(f"Exact top-{k}, {n_queries} queries batched: {(time.perf_counter() - t0) / n_queries * 1000:.2f} ms/query")
+
+        t0 = time.perf_counter()
+        index.build_ivf()
+        print(f"Built IVF in {time.perf_counter() - t0:.2f}s")
+        for nprobe in (4, 8, 16, 32):
+            t0 = time.perf_counter()
+            approx = [index.search_vectors(q, k, nprobe=nprobe, use_ivf=True)[0] for q in queries]
+            elapsed = (time.perf_counter() - t0) / n_queries * 1000
+            recall = np.mean([len({i for i, _ in a} & {i for i, _ in e}) / k for a, e in zip(approx, exact)])
+            print(f"IVF nprobe={nprobe}: {elapsed:.2f} ms/query, recall@{k} = {recall:.3f}")
+
+        embedder = HashingEmbedder()
+        texts = ["scraping cat images with beautifulsoup", "writing a poem about a cat", "fixing a json decode error"]
+        text_index = VectorIndex(os.path.join(tmp, "text"), embedder)
+        text_index.add(["a", "b", "c"], texts)
+        print("Hashing embedder, query 'cat poem':", text_index.search("cat poem", k=2))
+
+
+if __name__ == "__main__":
+    main()
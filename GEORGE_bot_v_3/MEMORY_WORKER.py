@@ -0,0 +1,142 @@
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 4  # conversation loops sent to the memory model in one request
+BATCH_LINGER_S = 2.0  # how long the worker waits for more loops before sending a batch
+MAX_TRACKED_TICKETS = 1000
+
+
+class MemoryWorker:
+    """
+    Background worker that turns queued conversation loops into memory frames.
+
+    submit() returns a ticket id immediately. A daemon thread collects up to `max_batch` pending
+    jobs (waiting at most `linger_s` after the first one) and hands them to `process_batch`, which
+    returns one result per job in order; jobs it returns no result for are marked failed.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Dict[str, Any]]], List[Any]],
+                 max_batch: int = MAX_BATCH_SIZE, linger_s: float = BATCH_LINGER_S):
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.linger_s = linger_s
+        self.jobs: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self.tickets: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.total_lag_s = 0.0
+        self.last_batch_size = 0
+        self.thread: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    def _ensure_started(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="memory-worker", daemon=True)
+            self.thread.start()
+
+    def submit(self, payload: Any) -> str:
+        """Queues a job and returns its ticket id."""
+        ticket_id = uuid.uuid4().hex[:12]
+        job = {"ticket_id": ticket_id, "payload": payload, "queued_at": time.time()}
+        with self.lock:
+            self.tickets[ticket_id] = {"status": "queued", "queued_at": job["queued_at"]}
+            while len(self.tickets) > MAX_TRACKED_TICKETS:
+                self.tickets.popitem(last=False)
+        self.jobs.put(job)
+        self._ensure_started()
+        return ticket_id
+
+    def _collect_batch(self) -> List[Dict[str, Any]]:
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + self.linger_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _set_status(self, ticket_id: str, **fields):
+        with self.lock:
+            if ticket_id in self.tickets:
+                self.tickets[ticket_id].update(fields)
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.time()
+            for job in batch:
+                self._set_status(job["ticket_id"], status="running")
+            try:
+                results = self.process_batch(batch)
+            except Exception as e:
+                logger.exception(f"Memory batch failed: {e}")
+                results = [{"status": "failure", "message": str(e)}] * len(batch)
+            results = list(results or [])
+            if len(results) != len(batch):
+                logger.error(f"Memory batch of {len(batch)} jobs returned {len(results)} results")
+                missing = {"status": "failure", "message": "No result returned for this job"}
+                results = results[:len(batch)] + [missing] * (len(batch) - len(results))
+
+            finished = time.time()
+            with self.lock:
+                self.batches += 1
+                self.last_batch_size = len(batch)
+                for job, result in zip(batch, results):
+                    ok = isinstance(result, dict) and result.get("status") == "success"
+                    self.processed += 1
+                    self.failed += 0 if ok else 1
+                    self.total_lag_s += finished - job["queued_at"]
+                    if job["ticket_id"] in self.tickets:
+                        self.tickets[job["ticket_id"]].update(
+                            status="done" if ok else "failed",
+                            result=result,
+                            lag_s=round(finished - job["queued_at"], 2),
+                            processing_s=round(finished - started, 2),
+                        )
+            for _ in batch:
+                self.jobs.task_done()
+
+    def status(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            ticket = self.tickets.get(ticket_id)
+            return dict(ticket) if ticket else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, lag of the oldest waiting job and totals."""
+        now = time.time()
+        with self.lock:
+            waiting = [t["queued_at"] for t in self.tickets.values() if t["status"] == "queued"]
+            return {
+                "queue_depth": self.jobs.qsize(),
+                "running": sum(1 for t in self.tickets.values() if t["status"] == "running"),
+                "oldest_wait_s": round(now - min(waiting), 2) if waiting else 0.0,
+                "processed": self.processed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_batch_size": self.last_batch_size,
+                "avg_lag_s": round(self.total_lag_s / self.processed, 2) if self.processed else 0.0,
+            }
+
+    def flush(self, timeout: float = 60.0) -> bool:
+        """Waits until every queued job is processed (used at exit); returns False on timeout."""
+        if self.thread is None or not self.thread.is_alive():
+            return self.jobs.unfinished_tasks == 0
+        deadline = time.monotonic() + timeout
+        while self.jobs.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return self.jobs.unfinished_tasks == 0
@@ -0,0 +1,432 @@
+import os
+import copy
+import json
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BOT_FOLDER = os.path.abspath(os.path.dirname(__file__))
+FOCUS_FILE_PATH = os.path.join(BOT_FOLDER, "focus", "focus.json")
+INTERNAL_STATE_FILE_PATH = os.path.join(BOT_FOLDER, "inner_brain_settings", "internal_state.json")
+
+FLUSH_DELAY_S = 0.2  # writes within this window after the first change are coalesced into one flush
+POLL_INTERVAL_S = 1.0  # how often the background thread checks the files for external edits
+CAS_MAX_ATTEMPTS = 8  # optimistic attempts before the update is computed while holding the file lock
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on <path>.lock, shared by every process (and thread) that updates the file."""
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def merge_replace(old: Any, new: Any) -> Any:
+    return new
+
+
+def merge_union(old: Any, new: Any) -> list:
+    """Keeps the old items and appends the new ones that are not there yet."""
+    merged = list(old or [])
+    merged.extend(item for item in new if item not in merged)
+    return merged
+
+
+def merge_dict(old: Any, new: Any) -> dict:
+    """Shallow merge: keys in new replace the same keys in old, other old keys stay."""
+    return dict(old or {}, **new)
+
+
+def state_version(data: Any) -> int:
+    return data.get("version", 0) if isinstance(data, dict) else 0
+
+
+class StateStore:
+    """
+    One JSON state file (focus.json, internal_state.json) kept as an in-memory object.
+
+    Reads are served from memory. Updates change the in-memory object at once and mark it dirty;
+    the shared background thread writes it out after FLUSH_DELAY_S (coalescing bursts of updates)
+    through a temp file and os.replace, so the file is never seen half written. The same thread
+    watches the file's mtime and reloads it when it is edited outside the bot.
+    """
+
+    def __init__(self, path: str, default: Optional[Dict[str, Any]] = None):
+        self.path = os.path.abspath(path)
+        self.default = default
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()  # one writer of the temp file at a time (background thread vs atexit)
+        self.data: Optional[Dict[str, Any]] = None
+        self.text = ""  # file content as served to prompts (raw file text if it is not valid JSON)
+        self.version = 0  # bumped on every change, in memory or on disk
+        self.dirty_since: Optional[float] = None
+        self.disk_stamp: Optional[Tuple[int, int]] = None
+        self.bad_stamp: Optional[Tuple[int, int]] = None
+        self.counters = {"updates": 0, "flushes": 0, "reloads": 0, "flush_errors": 0, "cas_conflicts": 0}
+        self._load_from_disk()
+
+    # --- Disk ---
+
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _load_from_disk(self) -> bool:
+        stamp = self._stamp()
+        if stamp is None:
+            with self.lock:
+                if self.data is None and self.default is not None:
+                    self.data = copy.deepcopy(self.default)
+                    self.text = json.dumps(self.data, indent=4)
+                self.disk_stamp = None
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError as e:
+            logger.warning(f"Could not read state file {self.path}: {e}")
+            return False
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            with self.lock:
+                if self.data is not None:
+                    # Probably caught mid-write by another program: keep the last good state, retry next poll
+                    if stamp != self.bad_stamp:
+                        logger.warning(f"State file {self.path} is not valid JSON ({e}); keeping the last valid state")
+                        self.bad_stamp = stamp
+                    return False
+                logger.warning(f"State file {self.path} is not valid JSON ({e}); serving its raw text")
+                data = copy.deepcopy(self.default) if self.default is not None else None
+        with self.lock:
+            self.disk_stamp = stamp
+            self.data = data
+            self.text = text
+            self.version += 1
+        return True
+
+    def flush(self) -> bool:
+        """Writes pending changes now (temp file + rename). Returns False if the write failed."""
+        with self.flush_lock:
+            with self.lock:
+                if self.dirty_since is None:
+                    return True
+                text = self.text
+                self.dirty_since = None
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                logger.error(f"Could not write state file {self.path}: {e}")
+                with self.lock:
+                    self.counters["flush_errors"] += 1
+                    if self.dirty_since is None:
+                        self.dirty_since = time.monotonic()  # retried on the next background pass
+                return False
+            with self.lock:
+                self.disk_stamp = self._stamp()
+                self.counters["flushes"] += 1
+            return True
+
+    def check_external_change(self) -> bool:
+        """Reloads the file if someone else changed it since it was last read or written."""
+        stamp = self._stamp()
+        with self.lock:
+            if stamp is None or stamp == self.disk_stamp:
+                return False
+            if self.dirty_since is not None:
+                logger.warning(f"{self.path} was edited outside the bot while changes were pending; keeping ours")
+                self.disk_stamp = stamp
+                return False
+        if self._load_from_disk():
+            self.counters["reloads"] += 1
+            logger.info(f"Reloaded externally edited state file {self.path}")
+            return True
+        return False
+
+    # --- In-memory access ---
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """A copy of the state (no I/O)."""
+        with self.lock:
+            return copy.deepcopy(self.data)
+
+    def get_text(self) -> str:
+        """The state as the JSON text written to the file (no I/O)."""
+        return self.text
+
+    def set(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Replaces the state; it is written to disk in the background."""
+        text = json.dumps(data, indent=4)  # fails here, not in the flusher, if data is not serializable
+        with self.lock:
+            self.data = json.loads(text)
+            self.text = text
+            self.version += 1
+            self.counters["updates"] += 1
+            if self.dirty_since is None:
+                self.dirty_since = time.monotonic()
+        _flusher.wake()
+        return copy.deepcopy(self.data)
+
+    def update(self, **fields) -> Dict[str, Any]:
+        """Changes the given top level fields and returns the new state."""
+        with self.lock:
+            data = copy.deepcopy(self.data) if isinstance(self.data, dict) else {}
+            data.update(fields)
+            return self.set(data)
+
+    def transact(self, mutate: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 max_attempts: int = CAS_MAX_ATTEMPTS) -> Tuple[Dict[str, Any], int, int]:
+        """
+        Compare-and-swap update, safe against other threads and other processes using the file.
+
+        mutate gets a copy of the state and returns the new state. It runs without the file lock;
+        the result is written only if the state's "version" field is still the one mutate saw,
+        otherwise the newer state is loaded and mutate runs again right away (no sleeping). The
+        last attempt runs mutate while holding the lock, so the update always goes through.
+        The write is synchronous (temp file + rename) and bumps "version".
+
+        Returns:
+            tuple: The new state, the version it was based on and the number of attempts.
+        """
+        for attempt in range(1, max_attempts + 1):
+            locked_mutate = attempt == max_attempts
+            if not locked_mutate:
+                base = self.get()
+                candidate = mutate(copy.deepcopy(base) if isinstance(base, dict) else {})
+            with file_lock(self.path):
+                current = self._current_locked()
+                if locked_mutate:
+                    base = current
+                    candidate = mutate(copy.deepcopy(current) if isinstance(current, dict) else {})
+                if state_version(current) != state_version(base):
+                    with self.lock:
+                        self.counters["cas_conflicts"] += 1
+                    continue
+                candidate["version"] = state_version(current) + 1
+                self._write_locked(candidate, current)
+                return self.get(), state_version(current), attempt
+        raise RuntimeError("unreachable: the last attempt always writes")
+
+    def _current_locked(self) -> Optional[Dict[str, Any]]:
+        """The newest state while holding the file lock: pending local changes, else the file."""
+        with self.lock:
+            dirty = self.dirty_since is not None
+        if not dirty and self._stamp() != self.disk_stamp:
+            if self._load_from_disk():
+                self.counters["reloads"] += 1
+        return self.get()
+
+    def _write_locked(self, data: Dict[str, Any], previous: Optional[Dict[str, Any]]):
+        text = json.dumps(data, indent=4)
+        with self.lock:
+            self.data = json.loads(text)
+            self.text = text
+            self.version += 1
+            self.counters["updates"] += 1
+            self.dirty_since = time.monotonic()
+        if not self.flush():
+            with self.lock:  # leave the state as the other processes see it
+                self.data = previous
+                self.text = json.dumps(previous, indent=4) if previous is not None else ""
+                self.version += 1
+                self.dirty_since = None
+            raise OSError(f"Could not write state file {self.path}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.counters, version=self.version, dirty=self.dirty_since is not None)
+
+
+class StateFlusher:
+    """Background thread shared by all state stores: flushes dirty stores and polls for external edits."""
+
+    def __init__(self):
+        self.stores: Dict[str, StateStore] = {}
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def register(self, store: StateStore):
+        with self.lock:
+            self.stores[store.path] = store
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="state-flusher", daemon=True)
+                self.thread.start()
+
+    def wake(self):
+        self.event.set()
+
+    def _run(self):
+        last_poll = 0.0
+        while True:
+            with self.lock:
+                stores = list(self.stores.values())
+            now = time.monotonic()
+            pending = [store.dirty_since for store in stores if store.dirty_since is not None]
+            timeout = POLL_INTERVAL_S - (now - last_poll)
+            if pending:
+                timeout = min(timeout, min(pending) + FLUSH_DELAY_S - now)
+            if timeout > 0 and self.event.wait(timeout):
+                self.event.clear()
+                continue
+
+            now = time.monotonic()
+            for store in stores:
+                try:
+                    if store.dirty_since is not None and now - store.dirty_since >= FLUSH_DELAY_S:
+                        store.flush()
+                except Exception as e:
+                    logger.exception(f"State flush failed for {store.path}: {e}")
+            if now - last_poll >= POLL_INTERVAL_S:
+                last_poll = now
+                for store in stores:
+                    try:
+                        store.check_external_change()
+                    except Exception as e:
+                        logger.exception(f"State reload failed for {store.path}: {e}")
+
+    def flush_all(self):
+        with self.lock:
+            stores = list(self.stores.values())
+        for store in stores:
+            store.flush()
+
+
+_flusher = StateFlusher()
+atexit.register(_flusher.flush_all)
+
+
+def get_state_store(path: str, default: Optional[Dict[str, Any]] = None) -> StateStore:
+    """Returns the process wide store for a state file, loading it on first use."""
+    path = os.path.abspath(path)
+    with _flusher.lock:
+        store = _flusher.stores.get(path)
+    if store is None:
+        store = StateStore(path, default)
+        with _flusher.lock:
+            store = _flusher.stores.setdefault(path, store)
+        _flusher.register(store)
+    return store
+
+
+def get_focus_store() -> StateStore:
+    return get_state_store(FOCUS_FILE_PATH)
+
+
+def _naive_increments(path: str, count: int):
+    for _ in range(count):
+        with open(path) as f:
+            data = json.load(f)
+        data["counter"] += 1
+        with open(path + f".{os.getpid()}", "w") as f:
+            json.dump(data, f)
+        os.replace(path + f".{os.getpid()}", path)
+
+
+def _cas_increments(path: str, count: int):
+    store = get_state_store(path)
+    for i in range(count):
+        store.transact(lambda data: dict(data, counter=data["counter"] + 1,
+                                         tasks=merge_union(data["tasks"], [f"{os.getpid()}-{i}"])))
+
+
+def main():
+    """Compares per-turn focus reads and update bursts against reading/writing the file directly."""
+    import tempfile
+
+    focus = {"user_goal": "Write a scraper", "steps_to_achieve_goal": [f"step {i}" for i in range(10)],
+             "current_focus": "step 3", "accomplished": ["step 1", "step 2"], "obtained_data": ["x" * 200] * 5,
+             "additional_info": "", "switch_task": "NO"}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "focus.json")
+        with open(path, "w") as f:
+            json.dump(focus, f, indent=4)
+
+        t0 = time.perf_counter()
+        for _ in range(10_000):
+            with open(path, "r") as f:
+                f.read()
+        print(f"File reads: {(time.perf_counter() - t0) / 10_000 * 1e6:.1f} us/read")
+
+        store = get_state_store(path)
+        t0 = time.perf_counter()
+        for _ in range(10_000):
+            store.get_text()
+        print(f"Store reads: {(time.perf_counter() - t0) / 10_000 * 1e6:.2f} us/read")
+
+        t0 = time.perf_counter()
+        for i in range(100):
+            with open(path, "w") as f:
+                json.dump(dict(focus, current_focus=f"step {i}"), f, indent=4)
+        print(f"Direct writes: {(time.perf_counter() - t0) / 100 * 1e6:.0f} us/update, 100 file writes")
+
+        t0 = time.perf_counter()
+        for i in range(100):
+            store.update(current_focus=f"step {i}")
+        elapsed = time.perf_counter() - t0
+        time.sleep(FLUSH_DELAY_S * 3)
+        print(f"Store updates: {elapsed / 100 * 1e6:.0f} us/update, {store.stats()['flushes']} file writes")
+        with open(path) as f:
+            assert json.load(f)["current_focus"] == "step 99"
+
+        time.sleep(0.05)
+        with open(path, "w") as f:
+            json.dump(dict(focus, current_focus="edited by hand"), f, indent=4)
+        time.sleep(POLL_INTERVAL_S * 2)
+        print(f"External edit picked up: {store.get()['current_focus']!r}, {store.stats()}")
+
+        # 4 processes x 200 increments of the same counter
+        import multiprocessing
+        for name, worker in (("read-modify-write", _naive_increments), ("transact", _cas_increments)):
+            path = os.path.join(tmp, f"{name}.json")
+            with open(path, "w") as f:
+                json.dump({"counter": 0, "tasks": [], "version": 1}, f)
+            t0 = time.perf_counter()
+            processes = [multiprocessing.Process(target=worker, args=(path, 200)) for _ in range(4)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            with open(path) as f:
+                data = json.load(f)
+            print(f"{name}: counter {data['counter']}/800, {len(data.get('tasks', []))} tasks, "
+                  f"{(time.perf_counter() - t0) / 800 * 1e6:.0f} us/update")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,12 @@ tool_tool_update_internal_state_description = """ Updates the focus file with ne
 
 import json
 import os
+import sys
 import logging
 from typing import Dict, List, Any, Optional
-import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from STATE_STORE import get_state_store, merge_dict, merge_replace, merge_union
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s')
@@ -23,6 +26,14 @@ DEFAULT_INTERNAL_STATE = {
     "version": 1
 }
 
+# How a field update is combined with the stored value; fields not listed are replaced.
+# Lists and dicts are merged so concurrent sessions do not drop each other's entries.
+FIELD_MERGES = {
+    "tasks_finished": merge_union,
+    "predictions": merge_dict,
+    "additional": merge_dict,
+}
+
 def tool_update_internal_state(
     internal_state_file_path: str,
     emotions: Optional[str] = None,
@@ -47,78 +58,55 @@ def tool_update_internal_state(
         optimization_goal (Optional[str]): A string describing the current optimization goal    minimize cost ,  maximize accuracy"  "minimize time
         tasks_finished (Optional[List[str]]): A list of strings representing the names or IDs of tasks that have been completed.
         additional (Optional[Dict[str, Any]]): A dictionary for storing any additional relevant information. The structure is flexible.
-        version (Optional[int]): An integer representing the version number of the internal state data. Useful for tracking changes and potential rollbacks.
+        version (Optional[int]): The version of the internal state this update is based on. The version is managed by the tool (bumped on every write); if the state has moved on since, the update is merged into the newer state and the response says so.
 
     Returns:
         dict: A dictionary containing the status "success" or "failure", a message, and if successful the updated internal state data.
     """
-    max_retries = 3
-    retry_delay = 2
-
-    for attempt in range(1, max_retries + 1):
-        try:
-            # Try to load existing internal state
-            try:
-                with open(internal_state_file_path, "r") as f:
-                    internal_state_data = json.load(f)
-            except FileNotFoundError:
-                # File not found, create a new one with default state
-                logger.warning(f"Internal state file not found. Creating a new one: {internal_state_file_path}")
-                internal_state_data = DEFAULT_INTERNAL_STATE.copy()
+    # Input validation
+    if progress is not None and not 0 <= progress <= 1:
+        return {"status": "failure", "message": "Invalid input data: Progress must be between 0 and 1."}
+    if frustration_level is not None and not 0 <= frustration_level <= 1:
+        return {"status": "failure", "message": "Invalid input data: Frustration level must be between 0 and 1."}
+    if task_cost is not None and task_cost < 0:
+        return {"status": "failure", "message": "Invalid input data: Task cost cannot be negative."}
 
-            # Input validation
-            if progress is not None and not 0 <= progress <= 1:
-                raise ValueError("Progress must be between 0 and 1.")
-            if frustration_level is not None and not 0 <= frustration_level <= 1:
-                raise ValueError("Frustration level must be between 0 and 1.")
-            if task_cost is not None and task_cost < 0:
-                raise ValueError("Task cost cannot be negative.")
+    updates = {
+        "emotions": emotions,
+        "progress": progress,
+        "frustration_level": frustration_level,
+        "task_cost": task_cost,
+        "predictions": predictions,
+        "optimization_goal": optimization_goal,
+        "tasks_finished": tasks_finished,
+        "additional": additional,
+    }
+    updates = {key: value for key, value in updates.items() if value is not None}
 
-            # Update data (including new parameters)
-            if emotions is not None:
-                internal_state_data["emotions"] = emotions
-            if progress is not None:
-                internal_state_data["progress"] = progress
-            if frustration_level is not None:
-                internal_state_data["frustration_level"] = frustration_level
-            if task_cost is not None:
-                internal_state_data["task_cost"] = task_cost
-            if predictions is not None:
-                internal_state_data["predictions"] = predictions
-            if optimization_goal is not None:
-                internal_state_data["optimization_goal"] = optimization_goal
-            if tasks_finished is not None:
-                internal_state_data["tasks_finished"] = tasks_finished
-            if additional is not None:
-                internal_state_data["additional"] = additional
-            if version is not None:
-                internal_state_data["version"] = version
+    def apply_updates(state: Dict[str, Any]) -> Dict[str, Any]:
+        for key, value in updates.items():
+            state[key] = FIELD_MERGES.get(key, merge_replace)(state.get(key), value)
+        return state
 
-            # Write updated data back to the file
-            with open(internal_state_file_path, "w") as f:
-                json.dump(internal_state_data, f, indent=4)
+    try:
+        # Compare-and-swap on the "version" field under an advisory file lock: a concurrent
+        # update is merged in and retried at once instead of sleeping and overwriting it.
+        state_store = get_state_store(internal_state_file_path, default=DEFAULT_INTERNAL_STATE)
+        internal_state_data, based_on, attempts = state_store.transact(apply_updates)
 
-            logger.info(f"Internal state updated successfully: {internal_state_data}")
-            return {
-                "status": "success",
-                "message": f"Internal state updated successfully.",
-                "updated_internal_state": internal_state_data,
-            }
+        logger.info(f"Internal state updated successfully (version {internal_state_data['version']}, {attempts} attempt(s)): {internal_state_data}")
+        result = {
+            "status": "success",
+            "message": f"Internal state updated successfully.",
+            "updated_internal_state": internal_state_data,
+        }
+        if version is not None and version != based_on:
+            result["message"] = f"Internal state updated successfully; it was at version {based_on}, not {version}, so the update was merged into it."
+        return result
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON in file: {internal_state_file_path}, error: {e}")
-            return {"status": "failure", "message": f"Invalid JSON in file: {internal_state_file_path}"}
-        except (IOError, OSError, PermissionError) as e:
-            if attempt < max_retries:
-                logger.warning(f"Error updating internal state (attempt {attempt}/{max_retries}): {e}. Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-                retry_delay *= 2
-            else:
-                logger.error(f"Error updating internal state (after {max_retries} retries): {e}")
-                return {"status": "failure", "message": f"Error updating internal state: {e}"}
-        except ValueError as e:
-            logger.error(f"Invalid input data: {e}")
-            return {"status": "failure", "message": f"Invalid input data: {e}"}
-        except Exception as e:
-            logger.exception(f"An unexpected error occurred: {e}")
-            return {"status": "failure", "message": f"An unexpected error occurred: {e}"}
\ No newline at end of file
+    except (TypeError, ValueError) as e:
+        logger.error(f"Invalid input data: {e}")
+        return {"status": "failure", "message": f"Invalid input data: {e}"}
+    except Exception as e:
+        logger.exception(f"An unexpected error occurred: {e}")
+        return {"status": "failure", "message": f"An unexpected error occurred: {e}"}
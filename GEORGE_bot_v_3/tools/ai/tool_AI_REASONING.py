@@ -5,6 +5,11 @@ import time
 import google.generativeai as genai
 import json
 import re  # Import re for regular expressions
+import sys
+import threading
+import concurrent.futures
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 
 
 google_key = os.getenv('google_key')
@@ -14,7 +19,6 @@ genai.configure(api_key=google_key)
 MODEL_NAME = "gemini-1.5-flash"  # Use a valid model name
 SYSTEM_INSTRUCTION = "You are a helpful and informative AI assistant."
 
-dispacher_context = []
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
 safety_settings = {
@@ -37,6 +41,486 @@ class bcolors:
     UNDERLINE = '\033[4m'
 
 
+# --- Plan cost and latency estimation ---
+
+# Per-model pricing (USD per 1M tokens) and latency profile used by the dry-run estimator.
+# first_token_s is the time to the first output token, the rates are tokens per second.
+MODEL_PROFILES = {
+    "gemini-1.5-pro-latest": {
+        "input_usd_per_1m": 3.50, "output_usd_per_1m": 10.50,
+        "first_token_s": 1.5, "input_tokens_per_s": 20000, "output_tokens_per_s": 60,
+        "typical_output_tokens": 1500, "max_output_tokens": 8192,
+    },
+    "gemini-1.5-pro-exp-0801": {
+        "input_usd_per_1m": 3.50, "output_usd_per_1m": 10.50,
+        "first_token_s": 2.0, "input_tokens_per_s": 20000, "output_tokens_per_s": 50,
+        "typical_output_tokens": 1500, "max_output_tokens": 8192,
+    },
+    "gemini-1.5-pro": {
+        "input_usd_per_1m": 3.50, "output_usd_per_1m": 10.50,
+        "first_token_s": 1.5, "input_tokens_per_s": 20000, "output_tokens_per_s": 60,
+        "typical_output_tokens": 1500, "max_output_tokens": 8192,
+    },
+    "gemini-1.5-flash-latest": {
+        "input_usd_per_1m": 0.35, "output_usd_per_1m": 1.05,
+        "first_token_s": 0.6, "input_tokens_per_s": 60000, "output_tokens_per_s": 180,
+        "typical_output_tokens": 1200, "max_output_tokens": 8192,
+    },
+    "gemini-1.5-flash": {
+        "input_usd_per_1m": 0.35, "output_usd_per_1m": 1.05,
+        "first_token_s": 0.6, "input_tokens_per_s": 60000, "output_tokens_per_s": 180,
+        "typical_output_tokens": 1200, "max_output_tokens": 8192,
+    },
+    "gemini-pro": {
+        "input_usd_per_1m": 0.50, "output_usd_per_1m": 1.50,
+        "first_token_s": 1.0, "input_tokens_per_s": 15000, "output_tokens_per_s": 80,
+        "typical_output_tokens": 800, "max_output_tokens": 2048,
+    },
+}
+DEFAULT_MODEL_PROFILE = "gemini-1.5-flash"
+
+# Cheaper model to fall back to when a plan is over budget
+MODEL_DOWNGRADES = {
+    "gemini-1.5-pro-latest": "gemini-1.5-flash-latest",
+    "gemini-1.5-pro-exp-0801": "gemini-1.5-flash-latest",
+    "gemini-1.5-pro": "gemini-1.5-flash",
+}
+
+# Budget a plan must fit in before execute_modelium is allowed to run it
+PLAN_BUDGET = {
+    "max_cost_usd": 0.10,
+    "max_latency_s": 180.0,
+    "max_input_tokens": 500000,
+}
+
+NODE_PACING_S = 1.0  # pause between nodes in execute_modelium
+CHARS_PER_TOKEN = 4
+
+# Upstream context a node may receive, split evenly over its incoming edges unless a rule sets
+# an explicit share with "index:tokens", e.g. "{0:1500, 1***prompt2}[text]"
+NODE_CONTEXT_BUDGET_TOKENS = 6000
+MIN_EDGE_TOKENS = 200  # explicit shares are scaled down so every other edge still gets at least this
+EDGE_SUMMARIZER_MODEL = "gemini-1.5-flash"
+
+
+def estimate_tokens(text) -> int:
+    """Rough offline token count (about 4 characters per token for English text)."""
+    if not text:
+        return 0
+    return max(1, len(str(text)) // CHARS_PER_TOKEN)
+
+
+def get_model_profile(model_name: str) -> dict:
+    """Returns the latency/pricing profile for a model, falling back to the default profile."""
+    name = str(model_name).replace("models/", "")
+    return MODEL_PROFILES.get(name, MODEL_PROFILES[DEFAULT_MODEL_PROFILE])
+
+
+def compile_dataflow(model_design_data: dict, context_budget_tokens: int = NODE_CONTEXT_BUDGET_TOKENS) -> list[dict]:
+    """
+    Compiles the DataFlow rules of a model design into a list of plan nodes.
+
+    Every rule like "{0, 1***userPrompt, prompt2}[text]" becomes a node with the indices of the
+    upstream models it reads from, the prompts it references and whether it gets the user prompt.
+    Each upstream reference is an edge with a max token share: "0:1500" sets it explicitly,
+    otherwise the node's context_budget_tokens are split evenly over edges without one.
+    Explicit shares that leave less than MIN_EDGE_TOKENS for each of those edges (or exceed
+    the budget on their own) are scaled down proportionally, so a node never gets more than
+    context_budget_tokens of upstream context.
+
+    Raises:
+        ValueError: If the lists have different lengths or a rule references a later model.
+    """
+    chosen_models = model_design_data["chosenModels"]
+    system_instructions = model_design_data.get("systemInstructions", [])
+    prompts = model_design_data.get("prompts", [])
+    data_flow = model_design_data.get("DataFlow", [])
+    labels = model_design_data.get("labels", [])
+
+    lengths = [len(chosen_models), len(system_instructions), len(prompts), len(data_flow), len(labels)]
+    if len(set(lengths)) != 1:
+        raise ValueError("Inconsistent lengths in model design data.")
+
+    plan = []
+    for i, rule in enumerate(data_flow):
+        upstream = []
+        edge_budgets = {}
+        prompt_refs = []
+        uses_user_prompt = False
+
+        match = re.match(r"\s*\{(.*?)\}", str(rule))
+        inner = match.group(1) if match else ""
+        for part in inner.replace("***", ",").split(","):
+            part = part.strip()
+            edge_match = re.match(r"(\d+)(?:\s*:\s*(\d+))?$", part)
+            if edge_match:
+                index = int(edge_match.group(1))
+                if index >= i:
+                    raise ValueError(f"DataFlow rule {i} ({rule}) references model {index} which runs later.")
+                if index not in upstream:
+                    upstream.append(index)
+                if edge_match.group(2):
+                    edge_budgets[index] = int(edge_match.group(2))
+            elif part == "userPrompt":
+                uses_user_prompt = True
+            else:
+                prompt_match = re.match(r"prompt(\d+)$", part)
+                if prompt_match:
+                    prompt_index = int(prompt_match.group(1))
+                    if prompt_index < len(prompts) and prompt_index != i and prompt_index not in prompt_refs:
+                        prompt_refs.append(prompt_index)
+
+        explicit_tokens = sum(edge_budgets.values())
+        implicit_edges = [j for j in upstream if j not in edge_budgets]
+        implicit_min = min(MIN_EDGE_TOKENS, context_budget_tokens // len(upstream)) if upstream else 0
+        explicit_room = context_budget_tokens - implicit_min * len(implicit_edges)
+        if explicit_tokens > explicit_room:
+            print(f"{bcolors.WARNING}DataFlow rule {i} ({rule}) asks for {explicit_tokens} explicit tokens, "
+                  f"scaling them to {explicit_room} to stay within {context_budget_tokens}.{bcolors.ENDC}")
+            for j in edge_budgets:
+                edge_budgets[j] = max(1, edge_budgets[j] * explicit_room // explicit_tokens)
+            explicit_tokens = sum(edge_budgets.values())
+        if implicit_edges:
+            share = max(1, (context_budget_tokens - explicit_tokens) // len(implicit_edges))
+            for j in implicit_edges:
+                edge_budgets[j] = share
+
+        plan.append({
+            "index": i,
+            "label": labels[i],
+            "model": chosen_models[i],
+            "system_instruction": system_instructions[i],
+            "prompt": prompts[i],
+            "rule": rule,
+            "upstream": upstream,
+            "edges": [{"source": j, "max_tokens": edge_budgets[j]} for j in upstream],
+            "prompt_refs": prompt_refs,
+            "uses_user_prompt": uses_user_prompt,
+        })
+    return plan
+
+
+def estimate_plan(plan: list[dict], user_prompt: str = "", ensemble: int = 1) -> dict:
+    """
+    Dry-runs a compiled plan: estimates tokens, cost and latency per node without calling any model.
+
+    Input tokens of a node are its own prompt text plus the estimated outputs of every upstream
+    node it reads from, capped by the edge budgets, so fan-in chains are accounted for. With ensemble > 1 the final node is
+    charged for that many samples (they run concurrently, so latency is not multiplied).
+    """
+    nodes = []
+    output_tokens_by_node = {}
+    for node in plan:
+        profile = get_model_profile(node["model"])
+        prompt_tokens = (
+            estimate_tokens(node["system_instruction"])
+            + estimate_tokens(node["prompt"])
+            + sum(estimate_tokens(plan[k]["prompt"]) for k in node["prompt_refs"])
+            + (estimate_tokens(user_prompt) if node["uses_user_prompt"] else 0)
+        )
+        upstream_tokens = sum(min(output_tokens_by_node[e["source"]], e["max_tokens"]) for e in node["edges"])
+        input_tokens = prompt_tokens + upstream_tokens
+        output_tokens = min(profile["typical_output_tokens"], profile["max_output_tokens"])
+        output_tokens_by_node[node["index"]] = output_tokens
+
+        samples = max(1, ensemble) if node is plan[-1] else 1
+        cost_usd = samples * (
+            input_tokens * profile["input_usd_per_1m"] + output_tokens * profile["output_usd_per_1m"]
+        ) / 1_000_000
+        latency_s = (
+            profile["first_token_s"]
+            + input_tokens / profile["input_tokens_per_s"]
+            + output_tokens / profile["output_tokens_per_s"]
+        )
+        nodes.append({
+            "index": node["index"],
+            "label": node["label"],
+            "model": node["model"],
+            "samples": samples,
+            "input_tokens": input_tokens * samples,
+            "upstream_tokens": upstream_tokens,
+            "output_tokens": output_tokens * samples,
+            "cost_usd": round(cost_usd, 6),
+            "latency_s": round(latency_s, 2),
+        })
+
+    # Nodes run one after another in execute_modelium, with a pause before each
+    total_latency_s = sum(n["latency_s"] for n in nodes) + NODE_PACING_S * len(nodes)
+    return {
+        "nodes": nodes,
+        "total_input_tokens": sum(n["input_tokens"] for n in nodes),
+        "total_output_tokens": sum(n["output_tokens"] for n in nodes),
+        "total_cost_usd": round(sum(n["cost_usd"] for n in nodes), 6),
+        "total_latency_s": round(total_latency_s, 2),
+    }
+
+
+def check_plan_budget(estimate: dict, budget: dict) -> list[str]:
+    """Returns the list of budget limits the estimate exceeds (empty when it fits)."""
+    exceeded = []
+    if estimate["total_cost_usd"] > budget.get("max_cost_usd", float("inf")):
+        exceeded.append(f"cost ${estimate['total_cost_usd']:.4f} > ${budget['max_cost_usd']:.4f}")
+    if estimate["total_latency_s"] > budget.get("max_latency_s", float("inf")):
+        exceeded.append(f"latency {estimate['total_latency_s']:.1f}s > {budget['max_latency_s']:.1f}s")
+    if estimate["total_input_tokens"] > budget.get("max_input_tokens", float("inf")):
+        exceeded.append(f"input tokens {estimate['total_input_tokens']} > {budget['max_input_tokens']}")
+    return exceeded
+
+
+def enforce_plan_budget(plan: list[dict], budget: dict = None, user_prompt: str = "", allow_downgrade: bool = True,
+                        ensemble: int = 1):
+    """
+    Checks a compiled plan against the budget before execution.
+
+    Over-budget plans are downgraded node by node (most expensive first) to cheaper models from
+    MODEL_DOWNGRADES. If the plan still does not fit it is rejected.
+
+    Returns:
+        tuple: (plan, estimate, verdict) where verdict is "accepted", "downgraded" or "rejected".
+    """
+    budget = budget or PLAN_BUDGET
+    plan = [dict(node) for node in plan]
+    estimate = estimate_plan(plan, user_prompt, ensemble)
+    if not check_plan_budget(estimate, budget):
+        return plan, estimate, "accepted"
+
+    downgraded = False
+    while allow_downgrade and check_plan_budget(estimate, budget):
+        candidates = [
+            n for n in sorted(estimate["nodes"], key=lambda n: n["cost_usd"], reverse=True)
+            if str(n["model"]).replace("models/", "") in MODEL_DOWNGRADES
+        ]
+        if not candidates:
+            break
+        node = plan[candidates[0]["index"]]
+        cheaper_model = MODEL_DOWNGRADES[str(node["model"]).replace("models/", "")]
+        print(f"{bcolors.WARNING}Plan over budget: downgrading model {node['index'] + 1} "
+              f"{node['model']} -> {cheaper_model}{bcolors.ENDC}")
+        node["model"] = cheaper_model
+        downgraded = True
+        estimate = estimate_plan(plan, user_prompt, ensemble)
+
+    if check_plan_budget(estimate, budget):
+        return plan, estimate, "rejected"
+    return plan, estimate, "downgraded" if downgraded else "accepted"
+
+
+def format_plan_estimate(estimate: dict) -> str:
+    """Formats a plan estimate as a short human readable report."""
+    lines = []
+    for n in estimate["nodes"]:
+        lines.append(
+            f"Model {n['index'] + 1} ({n['model']}, {n['label']}{', x' + str(n['samples']) if n['samples'] > 1 else ''}): "
+            f"~{n['input_tokens']} in ({n['upstream_tokens']} from upstream) / ~{n['output_tokens']} out, "
+            f"${n['cost_usd']:.4f}, ~{n['latency_s']:.1f}s"
+        )
+    lines.append(
+        f"Total: ~{estimate['total_input_tokens']} in / ~{estimate['total_output_tokens']} out, "
+        f"${estimate['total_cost_usd']:.4f}, ~{estimate['total_latency_s']:.1f}s"
+    )
+    return "\n".join(lines)
+
+
+def response_text(response) -> str:
+    """Returns the text of a model response, or the value itself for error strings."""
+    if isinstance(response, str):
+        return response
+    try:
+        return response.candidates[0].content.parts[0].text
+    except (AttributeError, IndexError):
+        return str(response)
+
+
+# --- Self-consistency ensemble ---
+
+ENSEMBLE_MAX_SAMPLES = 8
+ENSEMBLE_TEMPERATURE = 0.9
+ENSEMBLE_AGGREGATOR_MODEL = "gemini-1.5-flash"
+ENSEMBLE_ANSWER_INSTRUCTION = "\nThink it through, then end your reply with one line in the form 'Final answer: <answer>'."
+
+
+class EnsembleCancelled(Exception):
+    """Raised inside a sample that was cancelled while waiting for a slot or while its response streamed in."""
+
+
+class RateLimiter:
+    """Limits model calls to `requests_per_minute`, with at most `max_concurrent` in flight."""
+
+    def __init__(self, requests_per_minute: int = 60, max_concurrent: int = 4):
+        self.min_interval = 60.0 / requests_per_minute
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    @contextmanager
+    def slot(self, cancel_event: threading.Event = None):
+        """Waits for a free slot; raises EnsembleCancelled if cancel_event is set while waiting."""
+        while not self.semaphore.acquire(timeout=0.1):
+            if cancel_event is not None and cancel_event.is_set():
+                raise EnsembleCancelled()
+        try:
+            with self.lock:
+                now = time.monotonic()
+                wait = max(0.0, self.next_slot - now)
+                self.next_slot = max(now, self.next_slot) + self.min_interval
+            if cancel_event is not None:
+                if cancel_event.wait(wait):
+                    raise EnsembleCancelled()
+            elif wait:
+                time.sleep(wait)
+            yield
+        finally:
+            self.semaphore.release()
+
+
+model_rate_limiter = RateLimiter()
+
+
+def extract_answer(text: str) -> str:
+    """Pulls the final answer out of a sample and normalizes it for voting."""
+    text = str(text or "")
+    matches = re.findall(r"(?im)^\W*(?:final\s+)?answer\s*[:\-]\s*(.+)$", text)
+    if matches:
+        answer = matches[-1]
+    else:
+        lines = [line for line in text.splitlines() if line.strip()]
+        answer = lines[-1] if lines else ""
+    answer = re.sub(r"[*_`\"']", "", answer).strip().rstrip(".").lower()
+    return re.sub(r"\s+", " ", answer)
+
+
+def sample_model(node: dict, prompt: str, cancel_event: threading.Event = None) -> str:
+    """
+    Sends one independent, non-chat request for a plan node under the rate limiter.
+
+    With a cancel_event the response is streamed and abandoned at the first chunk after the
+    event is set, so a sample cancelled in flight stops generating instead of finishing its answer.
+    """
+    generation_config = {"temperature": ENSEMBLE_TEMPERATURE}
+    with model_rate_limiter.slot(cancel_event):
+        model = genai.GenerativeModel(
+            model_name=node["model"],
+            safety_settings=safety_settings,
+            system_instruction=node["system_instruction"] or None,
+        )
+        if cancel_event is None:
+            return response_text(model.generate_content(prompt, generation_config=generation_config))
+        chunks = []
+        for chunk in model.generate_content(prompt, generation_config=generation_config, stream=True):
+            if cancel_event.is_set():
+                raise EnsembleCancelled()
+            chunks.append(response_text(chunk))
+    if cancel_event.is_set():
+        raise EnsembleCancelled()  # finished after the vote was decided; not counted
+    return "".join(chunks)
+
+
+def run_ensemble(node: dict, prompt: str, samples: int, aggregation: str = "vote", quorum: int = None):
+    """
+    Runs `samples` concurrent calls of a plan node and aggregates them.
+
+    aggregation="vote" returns as soon as `quorum` samples (default: a majority) agree on the
+    extracted answer and cancels the rest; otherwise the most common answer wins.
+    aggregation="summarize" waits for all samples and lets ENSEMBLE_AGGREGATOR_MODEL merge them.
+
+    Returns:
+        tuple: (text, details) where details lists the answers, votes and cancelled samples.
+    """
+    samples = max(1, min(samples, ENSEMBLE_MAX_SAMPLES))
+    quorum = quorum or samples // 2 + 1
+    if aggregation == "vote":
+        prompt += ENSEMBLE_ANSWER_INSTRUCTION
+
+    cancel_event = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=samples)
+    futures = [executor.submit(sample_model, node, prompt, cancel_event) for _ in range(samples)]
+    texts = []
+    votes = Counter()
+    first_text_for_answer = {}
+    winner = None
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                text = future.result()
+            except EnsembleCancelled:
+                continue
+            except Exception as e:
+                print(f"{bcolors.FAIL}Ensemble sample failed: {e}{bcolors.ENDC}")
+                continue
+            texts.append(text)
+            print(f"{bcolors.OKGREEN}    - Ensemble sample {len(texts)}/{samples} received.{bcolors.ENDC}")
+            if aggregation != "vote":
+                continue
+            answer = extract_answer(text)
+            votes[answer] += 1
+            first_text_for_answer.setdefault(answer, text)
+            if answer and votes[answer] >= quorum:
+                winner = answer
+                break
+    finally:
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    cancelled = samples - len(texts)
+    details = {"samples": samples, "completed": len(texts), "cancelled": cancelled, "quorum": quorum, "votes": dict(votes)}
+    if not texts:
+        return "Error: all ensemble samples failed", details
+
+    if aggregation == "vote":
+        if winner is None:
+            winner = votes.most_common(1)[0][0]
+        details["answer"] = winner
+        print(f"{bcolors.OKGREEN}    - Ensemble vote: {dict(votes)} -> {winner!r} ({cancelled} cancelled){bcolors.ENDC}")
+        return first_text_for_answer[winner], details
+
+    summary_node = {"model": ENSEMBLE_AGGREGATOR_MODEL, "system_instruction": "You merge several candidate answers into one."}
+    summary_prompt = "Candidate answers to the same task:\n\n" + "\n\n---\n\n".join(texts) + \
+        "\n\nWrite the single best answer, keeping what the candidates agree on and resolving disagreements."
+    return sample_model(summary_node, summary_prompt), details
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keeps the start and the end of a text so it fits in max_tokens (estimated), never more."""
+    max_chars = max(0, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    marker = f"\n[... {estimate_tokens(text) - max_tokens} tokens omitted ...]\n"
+    if len(marker) >= max_chars:
+        return text[:max_chars]  # no room for the marker
+    keep = max_chars - len(marker)
+    head = keep * 2 // 3
+    return text[:head] + marker + text[len(text) - (keep - head):]
+
+
+def fit_to_edge_budget(text: str, max_tokens: int, overflow: str = "truncate") -> str:
+    """
+    Makes an upstream output fit its edge budget before it is injected into a prompt.
+
+    overflow="summarize" condenses oversized outputs with EDGE_SUMMARIZER_MODEL and falls back
+    to truncation if that fails; "truncate" keeps the head and tail of the text.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if overflow == "summarize":
+        try:
+            summarizer = {"model": EDGE_SUMMARIZER_MODEL, "system_instruction": "You condense text without losing facts, numbers or code."}
+            summary = sample_model(summarizer, f"Condense the following to at most {max_tokens * 3 // 4} words:\n\n{text}")
+            return truncate_to_tokens(summary, max_tokens)
+        except Exception as e:
+            print(f"{bcolors.WARNING}Edge summarization failed, truncating instead: {e}{bcolors.ENDC}")
+    return truncate_to_tokens(text, max_tokens)
+
+
+def format_context_report(multi_context_history: list[dict]) -> str:
+    """Formats upstream context tokens per node before and after the edge budgets."""
+    lines = []
+    for i, item in enumerate(multi_context_history):
+        tokens = item.get("context_tokens")
+        if tokens and tokens["before"]:
+            lines.append(f"Model {i + 1}: upstream context {tokens['before']} -> {tokens['after']} tokens")
+    return "\n".join(lines)
+
+
 def initialize_mode_WithTools(MODEL_NAME, SYSTEM_INSTRUCTION=None):
     """Initializes a generative AI model with optional system instructions."""
     try:
@@ -203,11 +687,120 @@ def return_models_instructions_prompts_tools(
         DataFlow,
     )
 
-dispacher_context = []
+# --- Dispatcher context ---
+
+DISPATCHER_CONTEXT_MAX_PLANS = 5  # recent plans kept verbatim per session
+DISPATCHER_SUMMARY_MAX_CHARS = 2000  # size cap for the summary of older plans
+DISPATCHER_MAX_SESSIONS = 16
+DISPATCHER_PROMPT_PREVIEW_CHARS = 200
+
 
-def model_dispacher_send_message(prompt: str):
+def _deep_getsizeof(obj, seen=None) -> int:
+    """Approximate memory footprint of an object and everything it references."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_getsizeof(k, seen) + _deep_getsizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(_deep_getsizeof(item, seen) for item in obj)
+    return size
+
+
+class DispatcherContext:
+    """
+    Bounded memory of the plans the dispatcher produced for one session.
+
+    The last `max_plans` plans are kept in a ring buffer. Plans that fall out of it are folded
+    into a compact one-line-per-plan summary capped at `max_summary_chars`, so memory stays flat
+    no matter how long the bot runs.
+    """
+
+    def __init__(self, max_plans: int = DISPATCHER_CONTEXT_MAX_PLANS,
+                 max_summary_chars: int = DISPATCHER_SUMMARY_MAX_CHARS, summarize_older: bool = True):
+        self.recent_plans = deque(maxlen=max_plans)
+        self.max_summary_chars = max_summary_chars
+        self.summarize_older = summarize_older
+        self.summary = ""
+        self.plans_seen = 0
+
+    def add_plan(self, text_response, models, labels, system_instructions, prompts):
+        """Records a dispatcher plan, folding the oldest one into the summary when the buffer is full."""
+        plan = {
+            "text": str(text_response or "")[:DISPATCHER_PROMPT_PREVIEW_CHARS],
+            "models": [str(m) for m in models or []],
+            "labels": [str(l) for l in labels or []],
+            "system_instructions": [str(s)[:DISPATCHER_PROMPT_PREVIEW_CHARS] for s in system_instructions or []],
+            "prompts": [str(p)[:DISPATCHER_PROMPT_PREVIEW_CHARS] for p in prompts or []],
+        }
+        if len(self.recent_plans) == self.recent_plans.maxlen and self.summarize_older:
+            self._fold_into_summary(self.recent_plans[0])
+        self.recent_plans.append(plan)
+        self.plans_seen += 1
+
+    def _fold_into_summary(self, plan: dict):
+        line = f"- {', '.join(plan['labels']) or 'no models'} ({', '.join(sorted(set(plan['models'])))})\n"
+        self.summary += line
+        if len(self.summary) > self.max_summary_chars:
+            # Drop the oldest lines to stay under the cap
+            cut = self.summary.find("\n", len(self.summary) - self.max_summary_chars)
+            self.summary = self.summary[cut + 1:]
+
+    def render(self) -> str:
+        """Renders the context as text for the dispatcher prompt."""
+        if not self.recent_plans and not self.summary:
+            return ""
+        text = "\nPrevious DataFlows you designed in this session:\n"
+        if self.summary:
+            text += f"Older plans (labels and models):\n{self.summary}"
+        for plan in self.recent_plans:
+            text += f"Plan: labels={plan['labels']} models={plan['models']}\n"
+            for label, prompt in zip(plan["labels"], plan["prompts"]):
+                text += f"  {label}: {prompt}\n"
+        return text + "\n"
+
+    def memory_usage(self) -> dict:
+        """Reports the number of stored plans and the approximate bytes held."""
+        return {
+            "plans_kept": len(self.recent_plans),
+            "plans_seen": self.plans_seen,
+            "summary_chars": len(self.summary),
+            "bytes": _deep_getsizeof(self.recent_plans) + _deep_getsizeof(self.summary),
+        }
+
+
+dispatcher_sessions = OrderedDict()  # session id -> DispatcherContext, least recently used first
+
+
+def get_dispatcher_context(session_id: str = "default") -> DispatcherContext:
+    """Returns the context of a session, evicting the least recently used session when over the limit."""
+    context = dispatcher_sessions.get(session_id)
+    if context is None:
+        context = DispatcherContext()
+        dispatcher_sessions[session_id] = context
+        while len(dispatcher_sessions) > DISPATCHER_MAX_SESSIONS:
+            dispatcher_sessions.popitem(last=False)
+    else:
+        dispatcher_sessions.move_to_end(session_id)
+    return context
+
+
+def dispatcher_context_memory_report() -> dict:
+    """Memory used by all dispatcher sessions."""
+    sessions = {session_id: ctx.memory_usage() for session_id, ctx in dispatcher_sessions.items()}
+    return {
+        "sessions": len(sessions),
+        "total_bytes": sum(s["bytes"] for s in sessions.values()),
+        "per_session": sessions,
+    }
+
+
+def model_dispacher_send_message(prompt: str, session_id: str = "default"):
     print(f"{bcolors.OKGREEN} model_dispacher_send_message:    {prompt}{bcolors.ENDC}")
-    global dispacher_context
+    dispatcher_context = get_dispatcher_context(session_id)
 
     MODEL_NAME = "gemini-pro"  # Use a valid model name
     tool_functions = {"return_models_instructions_prompts_tools": return_models_instructions_prompts_tools}
@@ -313,12 +906,8 @@ def model_dispacher_send_message(prompt: str):
     remeber  about  correct  structure of  function call
             """
 
-        final_prompt = ""
-        for entry in dispacher_context:
-            final_prompt += str(entry)
-
         print(f"{bcolors.WARNING}final_prompt:{bcolors.ENDC}")
-        final_prompt = instruction + prompt
+        final_prompt = instruction + dispatcher_context.render() + prompt
         print(f"{bcolors.OKCYAN}{final_prompt}{bcolors.ENDC}")
 
         response = model_chat.send_message(final_prompt)
@@ -338,13 +927,10 @@ def model_dispacher_send_message(prompt: str):
 
         if text_response is None:
             text_response = "..."
-            dispacher_context.append(text_response)
 
         if models is not None:  # Check if models is not None
-            dispacher_context.append(models)
-            dispacher_context.append(labels)
-            dispacher_context.append(system_instructions)
-            dispacher_context.append(prompts)
+            dispatcher_context.add_plan(text_response, models, labels, system_instructions, prompts)
+            print(f"{bcolors.OKCYAN}Dispatcher context: {dispatcher_context.memory_usage()}{bcolors.ENDC}")
 
         return (
             text_response,
@@ -361,111 +947,97 @@ def model_dispacher_send_message(prompt: str):
 
 
 
-def execute_modelium(model_design_data, user_prompt=""):
-    """Executes the multi-model workflow using provided JSON data."""
+def execute_modelium(model_design_data, user_prompt="", plan=None, ensemble=1, ensemble_aggregation="vote",
+                     edge_overflow="truncate"):
+    """Executes the multi-model workflow using provided JSON data.
+
+    Upstream outputs are fitted to their edge budgets (see fit_to_edge_budget) before they are
+    injected. With ensemble > 1 the final model is sampled that many times concurrently (see run_ensemble).
+    """
     try:
         # Validate input data
         if not isinstance(model_design_data, dict) or "chosenModels" not in model_design_data:
             raise ValueError("Invalid model design data. Must be a dictionary with 'chosenModels'.")
 
-        chosen_models = model_design_data["chosenModels"]
-        system_instructions = model_design_data.get("systemInstructions", [])
-        prompts = model_design_data.get("prompts", [])
-        data_flow = model_design_data.get("DataFlow", [])
-        labels = model_design_data.get("labels", [])
-        user_prompt = model_design_data.get("userPrompt", "")  # Get user prompt if available
-
-        # Input Validation: Check for consistent lengths (excluding userPrompt)
-        lengths = [len(chosen_models), len(system_instructions), len(prompts), len(data_flow), len(labels)]
-        if len(set(lengths)) != 1:
-            raise ValueError("Inconsistent lengths in model design data.")
+        user_prompt = model_design_data.get("userPrompt", user_prompt)  # Get user prompt if available
 
+        # Compile the DataFlow rules (validates lengths and references) unless a checked plan is given
+        if plan is None:
+            plan = compile_dataflow(model_design_data)
 
         MODEL_CHATS = []
         # Initialize models
         print(f"{bcolors.OKGREEN}Initializing models...{bcolors.ENDC}")
-        for i in range(len(labels)):
-            label = labels[i]
-            chosen_model = chosen_models[i]
-            system_instruction = system_instructions[i]
-
+        for node in plan:
+            if ensemble > 1 and node is plan[-1]:
+                MODEL_CHATS.append(None)  # sampled by run_ensemble with its own requests, no chat needed
+                continue
             model_chat = initialize_mode_WithTools(
-                MODEL_NAME=chosen_model,
-                SYSTEM_INSTRUCTION=system_instruction
-
+                MODEL_NAME=node["model"],
+                SYSTEM_INSTRUCTION=node["system_instruction"]
             )
             if model_chat:
-                MODEL_CHATS.append(model_chat)
-                print(f"{bcolors.OKGREEN}  - Model {i + 1} initialized: {chosen_model} (Label: {label}){bcolors.ENDC}")
+                print(f"{bcolors.OKGREEN}  - Model {node['index'] + 1} initialized: {node['model']} (Label: {node['label']}){bcolors.ENDC}")
             else:
-                print(f"{bcolors.FAIL}Failed to initialize model {chosen_model}. Skipping.{bcolors.ENDC}")
+                print(f"{bcolors.FAIL}Failed to initialize model {node['model']}. Skipping.{bcolors.ENDC}")
+            MODEL_CHATS.append(model_chat)  # keep indices aligned with the plan
 
         MULTI_CONTEXT_HISTORY = []
         print(f"{bcolors.OKGREEN}\nExecuting models and processing data flow...{bcolors.ENDC}")
-        for i, model_chat in enumerate(MODEL_CHATS):
-            time.sleep(1)
-            rule = data_flow[i]
+        for node, model_chat in zip(plan, MODEL_CHATS):
+            i = node["index"]
+            ensembled = ensemble > 1 and node is plan[-1]
+            if model_chat is None and not ensembled:
+                MULTI_CONTEXT_HISTORY.append({"response": f"Error: model {node['model']} failed to initialize", "model": node["model"]})
+                continue
+            model_name = node["model"] if ensembled else model_chat.model.model_name
+
+            time.sleep(NODE_PACING_S)
             inputs = []
-
-            print(f"{bcolors.OKGREEN}  - Processing Model {i + 1} ({model_chat.model.model_name}) with data flow rule: {rule}{bcolors.ENDC}")
-
-            # Parse the data flow rule (CORRECTED PARSING)
-            if rule.startswith("{"):
-                rule = rule[1:-1]  # Remove curly braces
-                parts = rule.split(", ")  # Split by comma and space
-                for part in parts:
-                    if part.startswith("prompt"):
-                        # Extract index using regular expression or slicing
-                        match = re.match(r"prompt(\d+)", part)
-                        if match:
-                            prompt_index = int(match.group(1))
-                            inputs.append(prompts[prompt_index])
-                            print(f"{bcolors.OKGREEN}    - Using prompt {prompt_index + 1} as input.{bcolors.ENDC}")
-                    elif part.isdigit():
-                        index = int(part)
-                        inputs.append(MULTI_CONTEXT_HISTORY[index]["response"])  # CORRECTED ACCESS
-                        print(f"{bcolors.OKGREEN}    - Using output from Model {index + 1} as input.{bcolors.ENDC}")
-                    elif part.startswith("***"): #Correctly handle this case
-                        parts = part.split("***")
-                        models_to_use = parts[0].strip()
-                        prompt_section = parts[1].strip()
-
-                        temp_inputs = []
-                        if models_to_use:
-                            model_indices = [int(x.strip()) for x in models_to_use.split(",")]
-                            for model_index in model_indices:
-                                temp_inputs.append(MULTI_CONTEXT_HISTORY[model_index]["response"])
-
-                        if prompt_section.startswith('prompt'):
-                            prompt_index = int(prompt_section.split('prompt')[1])
-                            temp_inputs.append(prompts[prompt_index])
-
-                        if prompt_section == 'userPrompt':
-                            temp_inputs.append(user_prompt)
-
-
-                        inputs.extend(temp_inputs)
-                    elif part == "userPrompt":
-                        inputs.append(user_prompt)
-                        print(f"{bcolors.OKGREEN}    - Using user prompt as input.{bcolors.ENDC}")
+            context_tokens = {"before": 0, "after": 0}
+
+            print(f"{bcolors.OKGREEN}  - Processing Model {i + 1} ({model_name}) with data flow rule: {node['rule']}{bcolors.ENDC}")
+
+            for edge in node["edges"]:
+                index = edge["source"]
+                upstream_text = response_text(MULTI_CONTEXT_HISTORY[index]["response"])
+                fitted_text = fit_to_edge_budget(upstream_text, edge["max_tokens"], edge_overflow)
+                context_tokens["before"] += estimate_tokens(upstream_text)
+                context_tokens["after"] += estimate_tokens(fitted_text)
+                inputs.append(fitted_text)
+                print(f"{bcolors.OKGREEN}    - Using output from Model {index + 1} as input "
+                      f"({estimate_tokens(upstream_text)} -> {estimate_tokens(fitted_text)} tokens).{bcolors.ENDC}")
+            if node["uses_user_prompt"]:
+                inputs.append(user_prompt)
+                print(f"{bcolors.OKGREEN}    - Using user prompt as input.{bcolors.ENDC}")
+            for prompt_index in node["prompt_refs"]:
+                inputs.append(plan[prompt_index]["prompt"])
+                print(f"{bcolors.OKGREEN}    - Using prompt {prompt_index + 1} as input.{bcolors.ENDC}")
 
             # Construct the prompt with inputs
-            final_prompt = prompts[i]  # Default to current prompt
+            final_prompt = node["prompt"]  # Default to current prompt
             if inputs:
-                final_prompt = "\n".join(inputs) + "\n" + final_prompt  # Corrected: Add newline between inputs and prompt
+                final_prompt = "\n".join(inputs) + "\n" + final_prompt
                 print(f"{bcolors.OKGREEN}    - Constructed prompt: {final_prompt}{bcolors.ENDC}")
             else:
                 print(f"{bcolors.OKGREEN}    - Using default prompt: {final_prompt}{bcolors.ENDC}")
 
 
             try:
+                if ensembled:
+                    response, details = run_ensemble(node, final_prompt, ensemble, ensemble_aggregation)
+                    MULTI_CONTEXT_HISTORY.append({"response": response, "model": model_name, "ensemble": details,
+                                                  "context_tokens": context_tokens})
+                    continue
                 response = model_chat.send_message(final_prompt)
                 print(response)
-                MULTI_CONTEXT_HISTORY.append({"response": response, "model": model_chat.model.model_name})
+                MULTI_CONTEXT_HISTORY.append({"response": response, "model": model_name,
+                                              "context_tokens": context_tokens})
                 print(f"{bcolors.OKGREEN}    - Response received.{bcolors.ENDC}")
             except Exception as e:
-                print(f"{bcolors.FAIL}Error sending message to model {model_chat.model.model_name}: {e}{bcolors.ENDC}")
-                MULTI_CONTEXT_HISTORY.append({"response": f"Error: {e}", "model": model_chat.model.model_name})
+                print(f"{bcolors.FAIL}Error sending message to model {model_name}: {e}{bcolors.ENDC}")
+                MULTI_CONTEXT_HISTORY.append({"response": f"Error: {e}", "model": model_name,
+                                              "context_tokens": context_tokens})
                 # Consider raising the exception or breaking the loop here if needed
                 #raise e  # Example of re-raising the exception
                 #break # Example of exiting the loop
@@ -477,14 +1049,18 @@ def execute_modelium(model_design_data, user_prompt=""):
     # Print or process the results as needed
     print(f"{bcolors.OKGREEN}\nFinal Results:{bcolors.ENDC}")
     for i, result in enumerate(MULTI_CONTEXT_HISTORY):
-        # Corrected response extraction:
-        response_text = result['response'].candidates[0].content.parts[0].text
-        print(f"{bcolors.OKGREEN}  - Model {i + 1}: {result['model']}, Response: {response_text}{bcolors.ENDC}")
+        response_text_value = response_text(result['response'])
+        print(f"{bcolors.OKGREEN}  - Model {i + 1}: {result['model']}, Response: {response_text_value}{bcolors.ENDC}")
+    context_report = format_context_report(MULTI_CONTEXT_HISTORY)
+    if context_report:
+        print(f"{bcolors.OKCYAN}Context tokens per node (before -> after edge budgets):\n{context_report}{bcolors.ENDC}")
 
     return MULTI_CONTEXT_HISTORY
 
 
-def tool_AI_REASONING(user_input: str, goal: str = "", reasoning_methodology: str = "", additional_info: str = "") -> str:
+def tool_AI_REASONING(user_input: str, goal: str = "", reasoning_methodology: str = "", additional_info: str = "", dry_run: bool = False,
+                      ensemble: int = 1, ensemble_aggregation: str = "vote", edge_overflow: str = "truncate",
+                      session_id: str = "default") -> str:
     """
     Designs and executes a multi-model AI workflow based on user input.
 
@@ -493,6 +1069,11 @@ def tool_AI_REASONING(user_input: str, goal: str = "", reasoning_methodology: st
         goal (str, optional): The desired outcome of the AI workflow. Defaults to "".
         reasoning_methodology (str, optional): The reasoning approach to use. Defaults to "".
         additional_info (str, optional): Any additional information relevant to the task. Defaults to "".
+        dry_run (bool, optional): Only estimate tokens, cost and latency of the designed workflow without running it. Defaults to False.
+        ensemble (int, optional): Number of independent samples of the final model for hard tasks (self-consistency). Defaults to 1.
+        ensemble_aggregation (str, optional): "vote" (majority vote on the final answers) or "summarize". Defaults to "vote".
+        edge_overflow (str, optional): How upstream outputs over their edge budget are shrunk: "truncate" or "summarize". Defaults to "truncate".
+        session_id (str, optional): Conversation the request belongs to; the dispatcher only sees the earlier plans of this session. Defaults to "default".
 
     Returns:
         str: The combined result of the AI workflow, including responses from each model.
@@ -505,7 +1086,7 @@ def tool_AI_REASONING(user_input: str, goal: str = "", reasoning_methodology: st
         system_instructions,
         prompts,
         DataFlow,
-    ) = model_dispacher_send_message(user_input + goal + reasoning_methodology + additional_info)
+    ) = model_dispacher_send_message(user_input + goal + reasoning_methodology + additional_info, session_id=session_id)
 
     # Execute the workflow if models are provided
     if models is not None:
@@ -518,16 +1099,32 @@ def tool_AI_REASONING(user_input: str, goal: str = "", reasoning_methodology: st
                 "labels": labels
             }
 
-            MULTI_CONTEXT_HISTORY = execute_modelium(model_design_data)  # Pass model_design_data
+            # Estimate the plan before running anything and keep it inside PLAN_BUDGET
+            plan = compile_dataflow(model_design_data)
+            ensemble = max(1, min(int(ensemble), ENSEMBLE_MAX_SAMPLES))
+            plan, estimate, verdict = enforce_plan_budget(plan, PLAN_BUDGET, ensemble=ensemble)
+            report = format_plan_estimate(estimate)
+            print(f"{bcolors.OKCYAN}Plan estimate ({verdict}):\n{report}{bcolors.ENDC}")
+            if dry_run:
+                return f"Plan estimate ({verdict}):\n{report}"
+            if verdict == "rejected":
+                exceeded = ", ".join(check_plan_budget(estimate, PLAN_BUDGET))
+                return f"Plan rejected, over budget ({exceeded}):\n{report}"
+
+            MULTI_CONTEXT_HISTORY = execute_modelium(
+                model_design_data, plan=plan, ensemble=ensemble, ensemble_aggregation=ensemble_aggregation,
+                edge_overflow=edge_overflow
+            )
 
             # Combine the responses from the workflow into a single string
             result = ""
             for i, result_item in enumerate(MULTI_CONTEXT_HISTORY):
                 result += f"{bcolors.OKGREEN}Step {i + 1}: {result_item['model']}{bcolors.ENDC}\n"
-                # Corrected response extraction:
-                response_text = result_item['response'].candidates[0].content.parts[0].text
-                result += f"{bcolors.OKGREEN}  Response: {response_text}{bcolors.ENDC}\n\n"
+                result += f"{bcolors.OKGREEN}  Response: {response_text(result_item['response'])}{bcolors.ENDC}\n\n"
 
+            context_report = format_context_report(MULTI_CONTEXT_HISTORY)
+            if context_report:
+                result += f"Context tokens per node (before -> after edge budgets):\n{context_report}\n"
             return result
         except Exception as e:
             print(f"{bcolors.FAIL}Error in execute_modelium: {e}{bcolors.ENDC}")
@@ -536,7 +1133,43 @@ def tool_AI_REASONING(user_input: str, goal: str = "", reasoning_methodology: st
         return text_response # Make sure text_response is returned even if models is None
 
 
+def check_dispatcher_memory(turns: int = 20000, sessions: int = 4, checkpoints: int = 5) -> list[dict]:
+    """
+    Long-running check of the dispatcher context: records `turns` synthetic plans round-robin over
+    `sessions` sessions (the same path model_dispacher_send_message takes after each plan) and
+    reports the memory held at evenly spaced checkpoints. The bytes must stop growing once every
+    session's ring buffer and summary are full.
+    """
+    import tracemalloc
+    dispatcher_sessions.clear()
+    tracemalloc.start()
+    samples = []
+    for turn in range(1, turns + 1):
+        context = get_dispatcher_context(f"session-{turn % sessions}")
+        models = [MODEL_NAME] * 3
+        labels = [f"step {turn}-{n}" for n in range(3)]
+        instructions = [f"Instruction {n} for turn {turn}: " + "x" * 400 for n in range(3)]
+        prompts = [f"Prompt {n} for turn {turn}: " + "y" * 400 for n in range(3)]
+        context.add_plan(f"Plan for turn {turn}", models, labels, instructions, prompts)
+        context.render()
+        if turn % (turns // checkpoints) == 0:
+            report = dispatcher_context_memory_report()
+            samples.append({"turn": turn, "context_bytes": report["total_bytes"],
+                            "traced_bytes": tracemalloc.get_traced_memory()[0]})
+    tracemalloc.stop()
+    dispatcher_sessions.clear()
+    for sample in samples:
+        print(f"turn {sample['turn']:>6}: dispatcher context {sample['context_bytes']:>8} bytes, "
+              f"traced {sample['traced_bytes']:>8} bytes")
+    growth = samples[-1]["context_bytes"] - samples[0]["context_bytes"]
+    print(f"{bcolors.OKCYAN}Context growth from turn {samples[0]['turn']} to {samples[-1]['turn']}: {growth} bytes{bcolors.ENDC}")
+    return samples
+
+
 def main():
+    if "--memory-check" in sys.argv:
+        check_dispatcher_memory()
+        return
     user_input = "Write a poem about a cat"
     result = tool_AI_REASONING(user_input, goal="to write a poem about a cat", reasoning_methodology="using poetic language", additional_info="make it rhyme")
     print(f"{bcolors.OKCYAN}{result}{bcolors.ENDC}")
@@ -0,0 +1,69 @@
+tool_type_for_TOOL_MANAGER = "all"
+tool_rollback_focus_short_description = """restores the focus as it was at an earlier turn or version"""
+tool_get_focus_as_of_short_description = """shows the focus as it was at an earlier turn and the recent focus history"""
+
+import os
+import sys
+import logging
+from typing import Dict, Any
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from FOCUS_JOURNAL import get_focus_journal
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def tool_get_focus_as_of(turn: int = -1) -> Dict[str, Any]:
+    """
+    Returns the focus as it stood at the end of a conversation turn, with the latest focus versions.
+
+    Args:
+        turn (int): The turn to look at. -1 means the current turn.
+
+    Returns:
+        dict: status, the turn, the focus version and its content, and the recent history (version, turn, changed fields).
+    """
+    turn = int(turn)  # function call arguments arrive as floats
+    journal = get_focus_journal()
+    try:
+        turn = journal.turn if turn < 0 else turn
+        version = journal.version_at_turn(turn)
+        focus = journal.state_at(version)
+        if focus is None:
+            return {"status": "failure", "message": f"No focus was recorded at or before turn {turn}."}
+        return {"status": "success", "turn": turn, "version": version, "focus": focus, "history": journal.history(10)}
+    except Exception as e:
+        logger.exception(f"Error reading the focus journal: {e}")
+        return {"status": "failure", "message": f"Error reading the focus journal: {e}"}
+
+
+def tool_rollback_focus(turn: int = -1, version: int = -1) -> Dict[str, Any]:
+    """
+    Restores an earlier focus, for example when the last updates went in the wrong direction.
+
+    The restored focus is recorded as a new version, so a rollback can itself be rolled back.
+
+    Args:
+        turn (int): Restore the focus as it was at the end of this turn.
+        version (int): Restore this focus version instead (takes precedence over turn).
+
+    Returns:
+        dict: status, a message and the restored focus.
+    """
+    turn, version = int(turn), int(version)  # function call arguments arrive as floats
+    journal = get_focus_journal()
+    try:
+        if version < 0:
+            if turn < 0:
+                return {"status": "failure", "message": "Give the turn or the version to roll back to."}
+            version = journal.version_at_turn(turn)
+        head = journal.rollback(version)
+        if head is None:
+            return {"status": "failure", "message": f"Focus version {version} does not exist (latest is {journal.version})."}
+        logger.info(f"Focus rolled back to version {version} (now version {head})")
+        return {"status": "success", "message": f"Focus restored from version {version} as version {head}.",
+                "focus": journal.head}
+    except Exception as e:
+        logger.exception(f"Error rolling back the focus: {e}")
+        return {"status": "failure", "message": f"Error rolling back the focus: {e}"}
@@ -1,8 +1,12 @@
 import json
 import os
+import sys
 import time
 from typing import List, Dict, Any, Optional
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from FOCUS_JOURNAL import get_focus_journal
+
 # Define the schema for the focus file
 focus_schema = {
     "user_goal": str,
@@ -60,18 +64,13 @@ def tool_update_focus(
         "switch_task": switch_task
     }
 
-    focus_file_path = "focus/focus.json"
-
     try:
-        # Write the updated focus data to the file
-        with open(focus_file_path, "w") as f:
-            json.dump(updated_focus_data, f, indent=4)
+        # Update the in-memory focus (focus.json is written atomically in the background) and journal the change
+        version = get_focus_journal().commit(updated_focus_data)
 
-        return {"status": "success", "message": "Focus updated."}
+        return {"status": "success", "message": f"Focus updated (version {version})."}
 
-    except json.JSONDecodeError as e:
-        return {"status": "failure", "message": f"Error decoding JSON: {str(e)}"}
-    except IOError as e:
-        return {"status": "failure", "message": f"Error writing to file: {str(e)}"}
+    except (TypeError, ValueError) as e:
+        return {"status": "failure", "message": f"Error encoding focus as JSON: {str(e)}"}
     except Exception as e:
         return {"status": "failure", "message": f"Unknown error updating focus: {str(e)}"}
\ No newline at end of file
@@ -0,0 +1,39 @@
+tool_type_for_TOOL_MANAGER = "all"
+tool_consolidate_memories_short_description = """merges near-duplicate memory frames into canonical frames"""
+
+import os
+import sys
+import time
+import logging
+from typing import Dict, Any
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from MEMORY_DEDUP import get_deduplicator
+from MEMORY_VECTORS import get_vector_index
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def tool_consolidate_memories() -> Dict[str, Any]:
+    """
+    Runs the near-duplicate consolidation pass over memory frames that have not been checked yet.
+
+    New frames are consolidated as tool_create_memory stores them; this pass covers frames that
+    were indexed before (for example after MemoryStore.rebuild_from_folder).
+
+    Returns:
+        dict: status, how many frames were checked, merged into a canonical frame or kept, and the time taken.
+    """
+    start = time.perf_counter()
+    try:
+        counts = get_deduplicator().consolidate_all(vector_index=get_vector_index())
+    except Exception as e:
+        logger.exception(f"Error consolidating memories: {e}")
+        return {"status": "failure", "message": f"Error consolidating memories: {e}"}
+    return {
+        "status": "success",
+        "message": f"Checked {counts['checked']} memory frames, merged {counts['merged']} near-duplicates.",
+        "counts": counts,
+        "elapsed_s": round(time.perf_counter() - start, 2),
+    }
@@ -1,15 +1,24 @@
 tool_type_for_TOOL_MANAGER = "all"
-tool_create_memory_short_description = """creates memory frame"""
+tool_create_memory_short_description = """queues a conversation loop for background memory frame creation, returns a ticket id"""
+tool_memory_queue_status_short_description = """shows memory creation queue depth, lag and ticket status"""
 
 import time
 import json
 import os
+import sys
 import logging
 import google.generativeai as genai
 from typing import List, Dict, Any
 from datetime import datetime
 import re
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from MEMORY_STORE import get_memory_store, frame_text, frame_id_for
+from MEMORY_TIERS import get_tiered_memory
+from MEMORY_VECTORS import get_vector_index
+from MEMORY_WORKER import MemoryWorker
+from MEMORY_DEDUP import get_deduplicator
+
 # --- Color and Configuration Settings ---
 BLACK = "\033[30m"
 RED = "\033[31m"
@@ -56,7 +65,7 @@ def process_user_input() -> str:
     return user_input
 
 
-def call_interaction_model(user_input: str, timestamp: str) -> genai.GenerateContentResponse:
+def call_interaction_model(user_input: str, timestamp: str) -> genai.types.GenerateContentResponse:
     """Calls the interaction model with the provided user input and timestamp."""
     print(f"\n{CYAN}--- Calling Interaction Model ---{RESET}")
     try:
@@ -74,14 +83,7 @@ def call_interaction_model(user_input: str, timestamp: str) -> genai.GenerateCon
         return None
 
 
-def call_memory_model(loop_conversation: str) -> genai.GenerateContentResponse:
-    """Calls the memory model to analyze and summarize the provided conversation loop."""
-    print(f"\n{CYAN}--- Calling Memory Model ---{RESET}")
-    try:
-        memory_model = genai.GenerativeModel(
-            model_name='gemini-1.5-flash-latest',
-            safety_settings={'HARASSMENT': 'block_none'},
-            system_instruction="""You are a sophisticated AI assistant helping to organize memory. 
+MEMORY_MODEL_INSTRUCTION = """You are a sophisticated AI assistant helping to organize memory. 
             Analyze and summarize the provided conversation, focusing on elements that would be most useful for storing and retrieving this memory later. Don't hallucinate. 
             Use the provided JSON schema for your response and fill in all fields with relevant information.
             You can omit entries if they don't seem appropriate for memory storage and would be empty.
@@ -144,10 +146,59 @@ def call_memory_model(loop_conversation: str) -> genai.GenerateContentResponse:
             * **"folder_path":** The relative path for storing the memory frame (use '/' as the path separator).
             * **"probability":** The strength of probability (from 0 to 10) that the memory frame should be stored in the suggested folder. Use a scale from 0 (least likely) to 10 (most likely) to express your confidence. 
         """
+
+_memory_model = None
+
+
+def get_memory_model() -> genai.GenerativeModel:
+    """Returns the memory model, creating it on first use so batches reuse one client."""
+    global _memory_model
+    if _memory_model is None:
+        _memory_model = genai.GenerativeModel(
+            model_name='gemini-1.5-flash-latest',
+            safety_settings={'HARASSMENT': 'block_none'},
+            system_instruction=MEMORY_MODEL_INSTRUCTION
         )
-        chat = memory_model.start_chat(history=[])
+    return _memory_model
+
+
+def call_memory_model(loop_conversation: str) -> genai.types.GenerateContentResponse:
+    """Calls the memory model to analyze and summarize the provided conversation loop."""
+    print(f"\n{CYAN}--- Calling Memory Model ---{RESET}")
+    try:
         create_memory_prompt = f"Loop {loop_conversation}"
-        response = chat.send_message(create_memory_prompt)
+        response = get_memory_model().generate_content(create_memory_prompt)
+        print(f"Memory Model Response:\n{response.text}")
+        return response
+    except Exception as e:
+        print(f"Error in Memory Model: {e}")
+        return None
+
+
+def call_memory_model_batch(loops: List[str]) -> genai.types.GenerateContentResponse:
+    """
+    Summarizes several conversation loops with a single memory model request.
+
+    Args:
+        loops (List[str]): Conversation loops in queue order.
+
+    Returns:
+        The model response. For more than one loop the model is asked for a JSON list whose
+        entries carry a "loop_index" pointing back into `loops`.
+    """
+    if len(loops) == 1:
+        return call_memory_model(loops[0])
+
+    print(f"\n{CYAN}--- Calling Memory Model (batch of {len(loops)} loops) ---{RESET}")
+    try:
+        numbered = "\n\n".join(f"Loop {i}:\n{loop}" for i, loop in enumerate(loops))
+        create_memory_prompt = (
+            f"You are given {len(loops)} separate conversation loops. Create memory frames for each of them "
+            f"independently and return them as one JSON list inside a ```json block. "
+            f"Add a \"loop_index\" field (the number of the loop, starting at 0) to every memory frame.\n\n"
+            f"{numbered}"
+        )
+        response = get_memory_model().generate_content(create_memory_prompt)
         print(f"Memory Model Response:\n{response.text}")
         return response
     except Exception as e:
@@ -209,7 +260,7 @@ Dict[str, Any]:
         logging.info("Exiting: save_to_file")
 
 
-def interpret_function_calls(response: genai.GenerateContentResponse, available_tools: Dict[str, Any]) -> List[
+def interpret_function_calls(response: genai.types.GenerateContentResponse, available_tools: Dict[str, Any]) -> List[
     Dict[str, Any]]:
     """Interprets function calls within the AI response and executes them."""
     results = []
@@ -238,34 +289,20 @@ def interpret_function_calls(response: genai.GenerateContentResponse, available_
     return results
 
 
-def tool_create_memory(loop_data: str):
+def store_memory_entries(memory_entries: List[Dict[str, Any]], timestamp: str) -> List[Dict[str, Any]]:
     """
-    Processes a conversation loop, extracts memory data, and stores it as a memory frame.
+    Appends memory entries to the memory segment store and indexes them for recall.
 
     Args:
-        loop_data (str): The conversation loop data as a string. This data should be
-                         in a format that the memory model can understand and process.
+        memory_entries (List[Dict[str, Any]]): Entries parsed from the memory model response.
+        timestamp (str): Timestamp recorded in every frame.
 
     Returns:
-        None: This function does not return any values. It directly saves the memory frame
-              to a file if successful.
+        List[Dict[str, Any]]: One save result per entry.
     """
-    timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
-    memories_folder_path = get_memories_folder_path()  # Use the function to get the path
-
-    memory_response = call_memory_model(loop_data)
-    if memory_response is None:
-        print("Error: Memory model call failed. Exiting.")
-        return
-
-    memory_entries = extract_entries_smart(memory_response.text)
-
-    if not memory_entries:
-        print(f"{RED}Warning: No memory entries returned by the memory model. Skipping memory frame storage.{RESET}")
-        return
-
-    available_tools = {"save_to_file": save_to_file}
     session_info = "0000"  # Assuming this is a placeholder, adjust as needed
+    results = []
+    frames = []
     for entry in memory_entries:
         memory_frame_data = {
             "timestamp": timestamp,
@@ -280,36 +317,126 @@ def tool_create_memory(loop_data: str):
         }
 
         try:
-            file_name = entry["naming_suggestion"]["memory_frame_name"].replace(" ", "_") + ".json"
-            folder_path = entry["storage"]["memory_folders_storage"][0]["folder_path"]
-            file_path = os.path.join(memories_folder_path, "NewGeneratedbyAI", folder_path)
-
-            save_args = {
-                "content": json.dumps(memory_frame_data, indent=4),
-                "file_name": file_name,
-                "file_path": file_path,
-                "create_folders": True
-            }
+            # Frames are keyed by their former file path: <folder_path>/<memory_frame_name>.json
+            if not entry["naming_suggestion"]["memory_frame_name"] or not entry["storage"]["memory_folders_storage"][0]["folder_path"]:
+                raise ValueError("empty memory_frame_name or folder_path")
+            frame_id = frame_id_for(memory_frame_data)
+        except (KeyError, IndexError, TypeError, AttributeError, ValueError) as e:
+            print(f"{RED}Error processing memory entry. Check JSON structure: {e}{RESET}")
+            results.append({"status": "failure", "message": f"Invalid memory entry: {e}"})
+            continue
+        frames.append((frame_id, memory_frame_data))
 
-            class DummyCandidate:
-                def __init__(self, args):
-                    self.function_call = DummyFunctionCall(args)
+    try:
+        get_tiered_memory().append_many(frames)
+    except OSError as e:
+        print(f"{RED}Error saving memory frames: {e}{RESET}")
+        return results + [{"status": "failure", "message": f"Failed to save memory frame: {e}"} for _ in frames]
+
+    for frame_id, memory_frame_data in frames:
+        print(f"{GREEN}Memory frame saved successfully: {frame_id}{RESET}")
+        get_memory_store().add_frame(memory_frame_data, frame_id=frame_id)
+        save_result = {"status": "success", "message": f"Memory frame saved: {frame_id}", "frame_id": frame_id}
+        try:
+            consolidation = get_deduplicator().consolidate(memory_frame_data, frame_id, vector_index=get_vector_index())
+        except Exception as e:
+            print(f"{RED}Error checking memory frame {frame_id} for duplicates: {e}{RESET}")
+            consolidation = {"status": "unique"}
+        if consolidation["status"] == "merged":
+            print(f"{YELLOW}Near-duplicate of {consolidation['frame_id']}, merged into it.{RESET}")
+            save_result.update(frame_id=consolidation["frame_id"], merged=True,
+                               message=f"Merged into existing memory frame: {consolidation['frame_id']}")
+            results.append(save_result)
+            continue
+        try:
+            get_vector_index().add([frame_id], [frame_text(memory_frame_data)])
+        except Exception as e:
+            print(f"{RED}Error embedding memory frame {frame_id}: {e}{RESET}")
+        results.append(save_result)
+    return results
 
-            class DummyFunctionCall:
-                def __init__(self, args):
-                    self.name = "save_to_file"
-                    self.args = args
 
-            dummy_response = genai.GenerateContentResponse()
-            dummy_response.candidates = [DummyCandidate(save_args)]
+def process_memory_batch(jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Memory worker callback: turns a batch of queued conversation loops into memory frames.
 
-            save_results = interpret_function_calls(dummy_response, available_tools)
-            if save_results and save_results[0]['status'] == 'success':
-                print(f"{GREEN}Memory frame saved successfully: {save_results[0]['message']}{RESET}")
-            else:
-                print(f"{RED}Error saving memory frame: {save_results[0]['message']}{RESET}")
+    Args:
+        jobs (List[Dict[str, Any]]): Queued jobs; each payload holds "loop_data" and "timestamp".
 
-        except (KeyError, IndexError, TypeError) as e:
-            print(f"{RED}Error processing memory entry. Check JSON structure: {e}{RESET}")
+    Returns:
+        List[Dict[str, Any]]: One result per job, in the same order.
+    """
+    loops = [job["payload"]["loop_data"] for job in jobs]
+    memory_response = call_memory_model_batch(loops)
+    if memory_response is None:
+        return [{"status": "failure", "message": "Memory model call failed."} for _ in jobs]
+
+    entries_per_loop: List[List[Dict[str, Any]]] = [[] for _ in jobs]
+    for entry in extract_entries_smart(memory_response.text):
+        if not isinstance(entry, dict):
             continue
+        try:
+            loop_index = int(entry.pop("loop_index", 0))
+        except (TypeError, ValueError):
+            loop_index = 0
+        if 0 <= loop_index < len(jobs):
+            entries_per_loop[loop_index].append(entry)
+        else:
+            print(f"{RED}Warning: memory entry refers to unknown loop {loop_index}, skipping.{RESET}")
+
+    results = []
+    for job, entries in zip(jobs, entries_per_loop):
+        if not entries:
+            print(f"{RED}Warning: No memory entries returned for ticket {job['ticket_id']}. Skipping memory frame storage.{RESET}")
+            results.append({"status": "failure", "message": "No memory entries returned by the memory model."})
+            continue
+        saved = store_memory_entries(entries, job["payload"]["timestamp"])
+        frames = [r["frame_id"] for r in saved if r["status"] == "success"]
+        if frames:
+            results.append({"status": "success", "message": f"Saved {len(frames)} memory frame(s).", "frames": frames})
+        else:
+            results.append({"status": "failure", "message": "; ".join(r["message"] for r in saved)})
+    return results
+
 
+memory_worker = MemoryWorker(process_memory_batch)
+
+
+def tool_create_memory(loop_data: str):
+    """
+    Queues a conversation loop for memory creation and returns immediately.
+
+    A background worker batches pending loops into one memory model request, saves the resulting
+    memory frames and indexes them for recall.
+
+    Args:
+        loop_data (str): The conversation loop data as a string. This data should be
+                         in a format that the memory model can understand and process.
+
+    Returns:
+        dict: {"status": "queued", "ticket_id": ..., "queue": ...}. Use tool_memory_queue_status
+              with the ticket id to see whether the memory frame was saved.
+    """
+    timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+    ticket_id = memory_worker.submit({"loop_data": loop_data, "timestamp": timestamp})
+    print(f"{CYAN}Memory creation queued (ticket {ticket_id}).{RESET}")
+    return {"status": "queued", "ticket_id": ticket_id, "queue": memory_worker.stats()}
+
+
+def tool_memory_queue_status(ticket_id: str = ""):
+    """
+    Reports the background memory worker's queue depth and lag, and optionally one ticket.
+
+    Args:
+        ticket_id (str, optional): Ticket returned by tool_create_memory.
+
+    Returns:
+        dict: Queue statistics, plus the ticket's status and result when a ticket id is given.
+    """
+    result = {"status": "success", "queue": memory_worker.stats()}
+    if ticket_id:
+        ticket = memory_worker.status(ticket_id)
+        if ticket is None:
+            return {"status": "failure", "message": f"Unknown ticket id: {ticket_id}", "queue": result["queue"]}
+        result["ticket"] = ticket
+    return result
@@ -0,0 +1,50 @@
+tool_type_for_TOOL_MANAGER = "all"
+tool_export_memories_short_description = """exports stored memory frames as readable json files in the memory folder layout"""
+
+import os
+import sys
+import time
+import logging
+from typing import Dict, Any
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from MEMORY_STORE import MEMORY_FOLDER
+from MEMORY_TIERS import get_tiered_memory
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPORT_FOLDER = os.path.join(MEMORY_FOLDER, "export")
+
+
+def tool_export_memories(export_folder: str = "", compact: bool = False) -> Dict[str, Any]:
+    """
+    Writes every memory frame (warm and archived) as a pretty-printed JSON file.
+
+    The export reproduces the old layout, NewGeneratedbyAI/<folder_path>/<memory_frame_name>.json,
+    so frames can be browsed and backed up as plain files.
+
+    Args:
+        export_folder (str): Folder to export into. Defaults to memory/export.
+        compact (bool): If True the memory segments are compacted first, dropping replaced and deleted frames.
+
+    Returns:
+        dict: status, the number of exported frames, the export folder and memory tier statistics.
+    """
+    start = time.perf_counter()
+    export_folder = export_folder or DEFAULT_EXPORT_FOLDER
+    memory = get_tiered_memory()
+    try:
+        if compact:
+            memory.compact()
+        exported = memory.export_folder(os.path.join(export_folder, "NewGeneratedbyAI"))
+    except OSError as e:
+        logger.exception(f"Error exporting memories: {e}")
+        return {"status": "failure", "message": f"Error exporting memories: {e}"}
+    return {
+        "status": "success",
+        "message": f"Exported {exported} memory frames to {export_folder}.",
+        "export_folder": export_folder,
+        "tiers": memory.stats(),
+        "elapsed_s": round(time.perf_counter() - start, 2),
+    }
@@ -0,0 +1,104 @@
+tool_type_for_TOOL_MANAGER = "all"
+tool_recall_memory_short_description = """finds stored memory frames by keywords and time range"""
+
+import os
+import sys
+import time
+import logging
+from typing import Dict, Any
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from MEMORY_STORE import get_memory_store, parse_time
+from MEMORY_VECTORS import get_vector_index
+from MEMORY_TIERS import get_tiered_memory
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CANDIDATES_FACTOR = 4  # extra neighbours fetched so time/importance filters still leave `limit` frames
+
+
+def record_recalls(frames):
+    """Counts the returned frames as recalled, which keeps them in the faster memory tiers."""
+    try:
+        get_tiered_memory().record_recalls([frame["frame_id"] for frame in frames])
+    except Exception as e:
+        logger.warning(f"Could not record memory recalls: {e}")
+
+
+def recall_similar(query: str, since: str, until: str, min_importance: int, limit: int, start: float) -> Dict[str, Any]:
+    """Ranks frames by cosine similarity of their embeddings to the query, then applies the filters."""
+    since_ts = parse_time(since) if since else None
+    until_ts = parse_time(until) if until else None
+    neighbours = get_vector_index().search(query, k=limit * SEMANTIC_CANDIDATES_FACTOR)
+    rows = get_memory_store().get_frames([frame_id for frame_id, _ in neighbours])
+    frames = []
+    for frame_id, score in neighbours:
+        frame = rows.get(frame_id)
+        if frame is None or frame["importance_level"] < min_importance:
+            continue
+        created_at = parse_time(frame["timestamp"]) if frame["timestamp"] else None
+        if created_at is not None and ((since_ts and created_at < since_ts) or (until_ts and created_at > until_ts)):
+            continue
+        frames.append(dict(frame, score=round(score, 4)))
+        if len(frames) == limit:
+            break
+    record_recalls(frames)
+    return {
+        "status": "success",
+        "message": f"Found {len(frames)} similar memory frames.",
+        "frames": frames,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def tool_recall_memory(
+    query: str = "",
+    since: str = "",
+    until: str = "",
+    min_importance: int = 0,
+    limit: int = 10,
+    match_any: bool = False,
+    semantic: bool = False,
+) -> Dict[str, Any]:
+    """
+    Searches the memory frames created by tool_create_memory.
+
+    Args:
+        query (str): Keywords to search for in frame names, interactions, impact and technical details.
+        since (str): Only frames created at or after this time, e.g. "2024-07-01" or "2024-07-01_14-30".
+        until (str): Only frames created at or before this time, same formats as since.
+        min_importance (int): Lowest importance_level (0-100) to return.
+        limit (int): Maximum number of frames to return.
+        match_any (bool): If True a frame matching any keyword is returned, otherwise all keywords must match.
+        semantic (bool): If True frames are ranked by embedding similarity to the query instead of keyword matches.
+
+    Returns:
+        dict: status, the matching frames (id, name, folder, file path, timestamp, importance, snippet) and the query time in ms.
+    """
+    start = time.perf_counter()
+    try:
+        if semantic and query:
+            return recall_similar(query, since, until, int(min_importance), int(limit), start)
+        frames = get_memory_store().search(
+            query=query,
+            since=since,
+            until=until,
+            min_importance=int(min_importance),
+            limit=int(limit),
+            match_any=match_any,
+        )
+    except ValueError as e:
+        return {"status": "failure", "message": f"Invalid query: {e}"}
+    except Exception as e:
+        logger.exception(f"Error recalling memory: {e}")
+        return {"status": "failure", "message": f"Error recalling memory: {e}"}
+
+    record_recalls(frames)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+    return {
+        "status": "success",
+        "message": f"Found {len(frames)} memory frames.",
+        "frames": frames,
+        "elapsed_ms": elapsed_ms,
+    }
@@ -5,6 +5,10 @@ import os
 import logging
 from typing import List, Dict, Any
 import time
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from HTTP_CACHE import get_http_cache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -46,11 +50,12 @@ def tool_display_images(image_paths_or_folder: str, delay: float = 1):
 
             # Check if the image path is a URL
             if image_path.startswith(("http://", "https://")):
-                # Display from URL (using Pillow or OpenCV)
+                # Display from URL (using Pillow or OpenCV), downloaded through the HTTP cache
                 from PIL import Image
-                from io import BytesIO
-                response = requests.get(image_path)
-                img = Image.open(BytesIO(response.content))
+                cached = get_http_cache().get(image_path)
+                if cached["status"] != 200:
+                    raise requests.HTTPError(f"{cached['status']} for url: {image_path}")
+                img = Image.open(cached["path"])
                 img.show()
             else:
                 # Display from local file path (full or relative)
@@ -2,16 +2,22 @@ tool_type_for_TOOL_MANAGER = "web"
 tool_depth_crowler_short_description = "   Crawls web pages, extracts images and links, and optionally saves them to files.  "
 
 import json
+import sys
 import urllib
-import requests
-from requests.exceptions import SSLError
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
 import time
 import re
 import os
 from PIL import Image
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from CRAWL_ENGINE import CrawlEngine
+from CRAWL_SINK import CRAWL_DATA_FOLDER, CrawlSink, export_layers
+from CRAWL_STATE import CrawlState
+from CRAWL_STREAM import CrawlStream
+from CRAWL_PARSER import ParsePool, compile_excluded, link_allowed
+from CRAWL_SCHEDULER import HostScheduler
+from HTTP_CACHE import get_http_cache
+
 # --- Configuration ---
 
 # Set of phrases to exclude from links
@@ -24,6 +30,18 @@ EXCLUDED_PHRASES = {
     "feedback submission", "feedback response"
 }
 
+# All excluded phrases as one regex (checked in a single scan per link)
+EXCLUDED_PATTERN = compile_excluded(EXCLUDED_PHRASES)
+
+# Pages are fetched concurrently: at most 32 requests in flight, 6 per host, 20 s timeout per request.
+# The scheduler keeps each host polite (robots.txt, crawl-delay, backing off on 429/503) and
+# interleaves the hosts so the others keep going while one has to wait. Pages go through the
+# HTTP cache, so a rerun only downloads what changed.
+crawl_engine = CrawlEngine(scheduler=HostScheduler(), cache=get_http_cache())
+
+# Fetched pages are parsed (links, images, link filter) in worker processes, one per spare core
+parse_pool = ParsePool(EXCLUDED_PHRASES)
+
 # --- Helper Functions ---
 
 def sanitize_filename(filename):
@@ -34,153 +52,39 @@ def sanitize_filename(filename):
 
 def filter_link(link):
     """Filters links based on excluded phrases and image extensions."""
-    if any(phrase.lower() in link.lower() for phrase in EXCLUDED_PHRASES):
-        return False
-
-    image_extensions = [".jpeg", ".jpg", ".gif", ".png"]
-    for extension in image_extensions:
-        if link.endswith(extension):
-            return False
-    return True
+    return link_allowed(link, EXCLUDED_PATTERN)
 
 
 # --- Crawler Functions ---
 
-def crawl_links(starting_links, visited_links=None, depth=1, max_depth=3, strategy="depth_first"):
-    """Crawls a set of links recursively, extracting images and links."""
-    if visited_links is None:
-        visited_links = set()
-
-    all_found_links = set()
-    extracted_images = []  # Changed to a list to store image data
-
-    # Depth-First Search (DFS)
-    if strategy == "depth_first":
-        for link in starting_links:
-            if link not in visited_links and depth <= max_depth:
-                try:
-                    response = requests.get(link)
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    new_links = set()
-                    images = []  # Changed to a list to store image data
-
-                    # Extract images with alt descriptions
-                    for tag in soup.find_all('img'):
-                        href = tag.get('src')
-                        if href:
-                            image_url = urljoin(link, href)
-                            alt_description = tag.get('alt', "no alt description")  # Default to "no alt description"
-                            image_source = "img"  # Indicate source as 'img'
-                            images.append(
-                                {
-                                    "url": image_url,
-                                    "alt": alt_description,
-                                    "source": image_source
-                                }
-                            )
-                            print(f"Found image: {image_url}  {alt_description}")
-
-                    # Extract links
-                    for link in soup.find_all('a'):
-                        href = link.get('href')
-                        if href and href.startswith('http'):
-                            if filter_link(href):
-                                new_links.add(href)
-                                if href not in visited_links:
-                                    with open(f"Layer{depth}.txt", "a", encoding="utf-8") as file:
-                                        print(f"Saving link {href} on layer {depth}")
-                                        file.write(href + '\n')
-                        else:
-                            full_link = urljoin(str(link), str(href))
-                            if full_link.startswith('http') and filter_link(full_link):
-                                new_links.add(full_link)
-                                if full_link not in visited_links:
-                                    with open(f"Layer{depth}.txt", "a", encoding="utf-8") as file:
-                                        print(f"Saving link {full_link} on layer {depth}")
-                                        file.write(full_link + '\n')
-
-                    all_found_links.update(new_links)
-                    extracted_images.extend(images)
-
-                    # Recursively crawl new links
-                    all_found_links, visited_links, extracted_images = crawl_links(
-                        new_links, visited_links, depth + 1, max_depth, strategy
-                    )
-
-                except requests.exceptions.RequestException as e:
-                    print(f"Error crawling link: {link}, Reason: {e}")
-                finally:
-                    visited_links.add(link)
-            else:
-                print("Link has already been visited or depth limit reached: Skipping...")
+def crawl_stream(starting_links, max_depth=3, sink=None, state=None):
+    """A CrawlStream over the shared engine and parse pool: iterate it for page records as they finish."""
+    return CrawlStream(starting_links, max_depth=max_depth, engine=crawl_engine, parser=parse_pool, sink=sink, state=state)
 
-    # Breadth-First Search (BFS)
-    elif strategy == "breadth_first":
-        links_to_visit = starting_links.copy()
-        while links_to_visit and depth <= max_depth:
-            current_links = links_to_visit.copy()
-            links_to_visit.clear()
-            for link in current_links:
-                if link not in visited_links:
-                    try:
-                        response = requests.get(link)
-                        soup = BeautifulSoup(response.text, 'html.parser')
-                        new_links = set()
-                        images = []  # Changed to a list to store image data
 
-                        # Extract images with alt descriptions
-                        for tag in soup.find_all('img'):
-                            href = tag.get('src')
-                            if href:
-                                image_url = urljoin(link, href)
-                                alt_description = tag.get('alt', "no alt description")
-                                image_source = "img"
-                                images.append(
-                                    {
-                                        "url": image_url,
-                                        "alt": alt_description,
-                                        "source": image_source
-                                    }
-                                )
-                                print(f"Found image: {image_url}  {alt_description}")
-
-                        # Extract links
-                        for link in soup.find_all('a'):
-                            href = link.get('href')
-                            if href and href.startswith('http'):
-                                if filter_link(href):
-                                    new_links.add(href)
-                                    if href not in visited_links:
-                                        with open(f"Layer{depth}.txt", "a", encoding="utf-8") as file:
-                                            print(f"Saving link {href} on layer {depth}")
-                                            file.write(href + '\n')
-                            else:
-                                full_link = urljoin(str(link), str(href))
-                                if full_link.startswith('http') and filter_link(full_link):
-                                    new_links.add(full_link)
-                                    if full_link not in visited_links:
-                                        with open(f"Layer{depth}.txt", "a", encoding="utf-8") as file:
-                                            print(f"Saving link {full_link} on layer {depth}")
-                                            file.write(full_link + '\n')
-
-                        all_found_links.update(new_links)
-                        extracted_images.extend(images)
-
-                        # Add new links to the list to be visited
-                        links_to_visit.update(new_links)
-
-                    except requests.exceptions.RequestException as e:
-                        print(f"Error crawling link: {link}, Reason: {e}")
-                    finally:
-                        visited_links.add(link)
-                else:
-                    print("Link has already been visited: Skipping...")
-            depth += 1
-    else:
-        print("Depth limit reached: Stopping crawling.")
+def crawl(starting_links, max_depth=3, sink=None, state=None):
+    """
+    Collects a whole crawl (see CrawlStream): the starting links are depth 1, links found on
+    depth d pages are fetched at depth d + 1, up to max_depth, every URL once. A `state` of an
+    earlier run continues it, and its completed pages count towards the results.
 
-    print(f"Processing Layer: {depth}")
-    return all_found_links, visited_links, extracted_images
+    Returns:
+        tuple: (found_links, found_images, fetched, memory). found_links[d - 1] holds the links
+        first discovered on depth d pages, found_images[d - 1] the images of the depth d pages,
+        fetched counts the pages requested and memory is the frontier's memory report.
+        Every fetched page is also written to `sink` (a CrawlSink) if one is given.
+    """
+    found_links = [[] for _ in range(max_depth)]
+    found_images = [[] for _ in range(max_depth)]
+    stream = crawl_stream(starting_links, max_depth=max_depth, sink=sink, state=state)
+    for record in stream:
+        if record["error"]:
+            print(f"Error crawling link: {record['url']}, Reason: {record['error']}")
+        else:
+            print(f"Found {len(record['links'])} links and {len(record['images'])} images on {record['final_url']}")
+        found_links[record["depth"] - 1].extend(record["links"])
+        found_images[record["depth"] - 1].extend(record["images"])
+    return found_links, found_images, stream.fetched, stream.memory
 
 # --- Tool Function ---
 
@@ -193,6 +97,7 @@ def tool_depth_crowler(
     save_folder: str = "scraped_data",
     return_found_links: bool = True,
     return_found_images: bool = True,
+    resume_run_id: str = None,
 ):
     """
     Crawls web pages, extracts images and links, and optionally saves them to files.
@@ -200,63 +105,60 @@ def tool_depth_crowler(
     Args:
         links (list[str]): List of starting URLs to crawl.
         max_depth (int): The maximum depth to crawl.
-        strategy (str): Crawling strategy depth_first" or breadth_first
-        save_images (bool): Whether to save extracted images.
-        save_links (bool): Whether to save extracted links.
-        save_folder (str): The directory to save scraped data.
+        strategy (str): Crawling strategy depth_first" or breadth_first. Kept for compatibility: pages are
+            always crawled layer by layer, so every link is fetched once at its shallowest depth.
+        save_images (bool): Whether to also export the images as Images_Layer{depth}.txt files.
+        save_links (bool): Whether to also export the links as Layer{depth}.txt files.
+        save_folder (str): The directory for those exports.
         return_found_links (bool): Whether to return the list of found links.
         return_found_images (bool): Whether to return the list of found images.
+        resume_run_id (str): Continue an interrupted crawl (the run_id of its response or its folder in
+            crawl_data) instead of starting a new one. Its links and max_depth are used; pages it
+            completed are not fetched again.
 
     Returns:
         dict: A dictionary containing the following keys:
-            - found_links: A list of found links at each depth level
+            - found_links: A list of found links at each depth level (links first discovered on that layer's pages)
             - found_images: A list of found images at each depth level
             - message: A message indicating the completion of crawling.
+            - run_id / output: The crawl run and its page records (gzip JSONL, one record per fetched page).
     """
-    # Create text files for each layer if they don't exist
-    for i in range(1, max_depth + 1):
-        with open(f"Layer{i}.txt", "w") as file:
-            pass
-
-    # Create text files for extracted images from each layer
-    for i in range(1, max_depth + 1):
-        with open(f"Images_Layer{i}.txt", "w") as file:
-            pass
-
-    # Initialize sets to store links and visited links
-    all_found_links = set()
-    visited_links = set()
+    if resume_run_id:
+        if not CrawlState.exists(os.path.join(CRAWL_DATA_FOLDER, resume_run_id)):
+            return {"status": "failure", "message": f"No resumable crawl run '{resume_run_id}' in {CRAWL_DATA_FOLDER}"}
+
+    # Crawl every layer from one frontier; each URL is fetched once, at its shallowest depth.
+    # Every page is recorded in crawl_data/<run_id>/pages.jsonl.gz, the progress in state.db
+    with CrawlSink(run_id=resume_run_id) as sink:
+        state = CrawlState(sink.folder)
+        if resume_run_id:
+            links = state.meta["starting_links"]
+            max_depth = state.meta["max_depth"]
+        layer_links, layer_images, fetched, memory = crawl(links, max_depth=max_depth, sink=sink, state=state)
+    print(f"Frontier memory: {memory}")
+    print(f"Host scheduling: {crawl_engine.scheduler.report()}")
+    print(f"HTTP cache: {crawl_engine.cache.stats()}")
+
+    # The old Layer{depth}.txt / Images_Layer{depth}.txt files are an export of the run
+    if save_links or save_images:
+        export_layers(sink.folder, save_folder, links=save_links, images=save_images)
 
-    # Crawl links recursively through multiple layers
     found_links = []
     found_images = []
     for depth in range(1, max_depth + 1):
-        links, visited_links, extracted_images = crawl_links(
-            links, visited_links, depth=depth, max_depth=max_depth, strategy=strategy
-        )
-
-        # Save links if requested
-        if save_links:
-            os.makedirs(save_folder, exist_ok=True)
-            with open(os.path.join(save_folder, f"Layer{depth}.txt"), "w", encoding="utf-8") as file:
-                for link in links:
-                    file.write(link + "\n")
-
-        # Save images if requested
-        if save_images:
-            os.makedirs(save_folder, exist_ok=True)
-            with open(os.path.join(save_folder, f"Images_Layer{depth}.txt"), "w", encoding="utf-8") as file:
-                for image_data in extracted_images:
-                    file.write(f"{image_data['url']} ****** {image_data['alt']} ****** {image_data['source']}\n")
-
         # Store found links and images for return
         if return_found_links:
-            found_links.append(list(links))
+            found_links.append(list(layer_links[depth - 1]))
         if return_found_images:
-            found_images.append(extracted_images)
+            found_images.append(layer_images[depth - 1])
 
     # Create the response dictionary
-    response = {"message": "Web page crawling and image extraction completed."}
+    response = {
+        "message": f"Web page crawling and image extraction completed ({fetched} pages fetched"
+                   f"{f', continuing run {resume_run_id}' if resume_run_id else ''}).",
+        "run_id": sink.run_id,
+        "output": sink.path,
+    }
 
     # Add found links and images to the response if requested
     if return_found_links:
@@ -3,8 +3,13 @@ tool_save_image_from_url_short_description = "Saves an image from a URL to a spe
 
 import requests
 import os
+import sys
+import shutil
 import logging
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from HTTP_CACHE import get_http_cache
+
 # Set up logging (optional, but recommended)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -22,18 +27,18 @@ def tool_save_image_from_url(image_url: str, save_path: str):
         dict: A dictionary containing the status  success or failure  and a message.
     """
     try:
-        response = requests.get(image_url, stream=True)
-        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+        # Served from the HTTP cache when fresh, revalidated (ETag/Last-Modified) when stale
+        cached = get_http_cache().get(image_url)
+        if cached["status"] != 200:
+            raise requests.HTTPError(f"{cached['status']} Error for url: {image_url}")
 
         # Create directories if they don't exist
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
 
-        with open(save_path, 'wb') as out_file:
-            for chunk in response.iter_content(chunk_size=8192):
-                out_file.write(chunk)
+        shutil.copyfile(cached["path"], save_path)
 
-        logger.info(f"Image saved successfully to: {save_path}")
-        return {"status": "success", "message": f"Image saved successfully to: {save_path}"}
+        logger.info(f"Image saved successfully to: {save_path} ({cached['source']})")
+        return {"status": "success", "message": f"Image saved successfully to: {save_path}", "cache": cached["source"]}
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Error downloading image: {e}")